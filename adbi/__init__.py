@@ -12,23 +12,119 @@ providing the current full set of SQL statements to create the current
 database and a separate file for each version update, ADBI is able to validate
 and perform upgrades from previous versions to the current version.
 '''
+from contextlib import contextmanager
 from pathlib import Path
+import hashlib
+import os
 import re
+import runpy
 import sys
+import threading
+import time
+
+from adbi.backfill import run_backfill
+from adbi.blob import open_blob
+from adbi.bulk import bulk_delete, bulk_update, bulk_upsert
+from adbi.bundle import _schema_file_version, _version_files, build_bundle, load_bundle, squash_schema, squashed_from
+from adbi.deadlines import shared_timer
+from adbi.dialects import dialect_for
+from adbi.export import export_cursor
+from adbi.importing import import_file
+from adbi.incremental import IncrementalQuery
+from adbi.paging import paginate_cursor
+from adbi.scheduler import Scheduler
 
 
 apilevel = '2.0'
 threadsafety = 1
 paramstyle = 'pyformat'
 
+# Leading whitespace, comments and parenthesis that may appear before the
+# first keyword of an operation.
+_LEADING_NOISE_RE = re.compile(r'(?:\s+|--[^\n]*|/\*.*?\*/|\()*', re.S)
+_KEYWORD_RE = re.compile(r'\w+')
+# Keywords that start an operation that only reads from the database.
+_READ_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'SHOW', 'EXPLAIN', 'DESCRIBE')
+# Anything that may turn an otherwise read only operation into a write.
+_WRITE_RE = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE|REPLACE|INTO)\b', re.I)
+# String and numeric literals, ignored when fingerprinting an operation.
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+# The ADBI object of the current worker process, see init_worker.
+_worker_adbi = None
 
-def connect(conn, paramstyle=None):
+
+def connect(conn, paramstyle=None, factory=None):
     '''
     Create a new ADBI connection object.
     :param conn: the connection object to use when connecting to the
-        database.
+        database. May be None if a factory is given.
+    :param factory: optional function returning a new connection, used to
+        reconnect after the process has been forked.
+    '''
+    return ADBI(conn, paramstyle, factory)
+
+
+def init_worker(factory, paramstyle=None, manifest=None):
+    '''
+    Create the ADBI object for the current worker process. This is intended
+    to be used as the initializer of a process pool, such as
+    ProcessPoolExecutor(initializer=adbi.init_worker, initargs=(factory,)).
+    The factory must be picklable when the pool does not fork. Schema checks
+    are left to the parent process. When a warm up manifest is given the new
+    connection is warmed up with it (see ADBI.warm_up).
+    '''
+    global _worker_adbi
+    _worker_adbi = ADBI(None, paramstyle, factory)
+    if manifest is not None:
+        _worker_adbi.warm_up(manifest)
+    return _worker_adbi
+
+
+def worker_connection():
+    '''
+    Return the ADBI object created for the current process by init_worker.
+    '''
+    if _worker_adbi is None:
+        raise SystemError("init_worker has not been called in this process")
+    return _worker_adbi
+
+
+def fingerprint(operation):
+    '''
+    Return a short fingerprint identifying the given operation. Operations
+    differing only in whitespace or literal values share a fingerprint.
+    '''
+    normalized = ' '.join(_LITERAL_RE.sub('?', operation).split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def _translation_key(paramstyle, operation, params):
+    '''
+    Return the key of the translation of the given operation. Translations
+    only depend on the operation and the shape of the parameters.
+    '''
+    if not params:
+        shape = 0
+    elif isinstance(params, dict):
+        shape = 'mapping'
+    else:
+        shape = len(params)
+    return (paramstyle, operation, shape)
+
+
+def _is_read_operation(operation):
+    '''
+    Return True if the given operation only reads from the database. This is
+    conservative, anything that cannot be positively identified as a read
+    (including a SELECT ... FOR UPDATE) is treated as a write.
     '''
-    return ADBI(conn, paramstyle)
+    operation = operation[_LEADING_NOISE_RE.match(operation).end():]
+    keyword = _KEYWORD_RE.match(operation)
+    if not keyword or keyword.group(0).upper() not in _READ_KEYWORDS:
+        return False
+    return not _WRITE_RE.search(operation)
 
 
 class ADBI :
@@ -40,12 +136,32 @@ class ADBI :
     a database is currently at the latest schema version.
     '''
 
-    def __init__(self, conn, paramstyle=None):
+    def __init__(self, conn, paramstyle=None, factory=None):
         '''
         Initialize a DBN object. Optionally provide a connection object to
         antoher database. If the connection object is provided this ADBI object
         will be initalized connected with that connection object.
-        '''
+
+        If a factory function is given it is used to create the connection
+        when none is provided, and to create a new connection when this object
+        is used from a forked child process.
+        '''
+        self._factory = factory
+        self._reconnect_hooks = []
+        self.cursor_pool_size = 4
+        # Translated operations keyed by the operation and parameter shape.
+        self.translation_cache_size = 256
+        self._translations = {}
+        # Translations of the query catalog and of warmed up statements,
+        # which are never evicted.
+        self._prepared = {}
+        self.statement_recorder = None
+        self.queries = QueryCatalog(self)
+        self._pool_lock = threading.Lock()
+        if conn is None:
+            if factory is None:
+                raise ValueError("A connection or a connection factory is required")
+            conn = factory()
         self.connection = conn
         self.wrapped_db_param_style = paramstyle
         if not self.wrapped_db_param_style:
@@ -58,34 +174,418 @@ class ADBI :
                 parts_used -= 1
         if not self.wrapped_db_param_style:
             raise SystemError("Unable to determine a paramstyle for the given connection")
+        self.dialect = dialect_for(conn)
+        self.plan_advisor = None
+        self.retry_policy = None
+        self.tracer = None
+        self.adaptive_fetch = None
+        self.single_flight = None
+        self.scheduler = None
+        # The default timeout in seconds of the statements of the cursors.
+        self.statement_timeout = None
+        self._in_transaction = False
+        self._in_unit = False
         self._schema_directory = None
         self._schema_file_format = "schema-{version}.sql"
 
+    @property
+    def connection(self):
+        '''
+        Return the underlying database connection. When called from a process
+        other than the one that created the connection (after a fork), a new
+        connection is created from the factory. The inherited connection is
+        left untouched as it still belongs to the parent process.
+        '''
+        if self._pid != os.getpid():
+            self._reconnect()
+        return self._connection
+
+    @connection.setter
+    def connection(self, value):
+        '''
+        Set the underlying database connection for the current process.
+        '''
+        self._connection = value
+        self._pid = os.getpid()
+        # Idle cursors belong to the previous connection.
+        self._idle_cursors = []
+        # The arraysize of new cursors, restored when cursors are pooled.
+        self._cursor_arraysize = None
+        # Writes only need to be detected when the driver cannot report
+        # whether a transaction is open, or a subclass acts on them.
+        self._track_writes = (not hasattr(type(value), 'in_transaction')
+            or type(self)._note_write is not ADBI._note_write)
+
+    def add_reconnect_hook(self, hook):
+        '''
+        Register a function called with this object after it has reconnected
+        in a new process. Hooks may be used to re-warm caches.
+        '''
+        self._reconnect_hooks.append(hook)
+
+    def _reconnect(self):
+        '''
+        Replace the connection inherited from the parent process.
+        '''
+        if self._factory is None:
+            raise SystemError("Connection used after fork and no connection factory is available")
+        self.connection = self._factory()
+        for hook in self._reconnect_hooks:
+            hook(self)
+
     def close(self):
         '''
         close the current database connection
         '''
+        with self._pool_lock:
+            idle, self._idle_cursors = self._idle_cursors, []
+        for cursor in idle:
+            cursor.close()
         return self.connection.close()
 
     def commit(self):
         '''
         Commit any pending transaction to the database.
         '''
-        return self.connection.commit()
+        if self.tracer is None:
+            rtn = self.connection.commit()
+        else:
+            with traced(self.tracer, 'commit'):
+                rtn = self.connection.commit()
+        self._end_transaction()
+        return rtn
 
     def rollback(self):
         '''
         Rollback a transaction.
         '''
+        rtn = True
         if hasattr(self.connection, 'rollback'):
-            return self.connection.rollback()
-        return True
+            if self.tracer is None:
+                rtn = self.connection.rollback()
+            else:
+                with traced(self.tracer, 'rollback'):
+                    rtn = self.connection.rollback()
+        self._end_transaction()
+        return rtn
+
+    @property
+    def in_transaction(self):
+        '''
+        Return True if a transaction is currently open. The driver is asked
+        when it provides this information, otherwise a transaction is assumed
+        to be open once a write has been issued until it is committed or
+        rolled back.
+        '''
+        if hasattr(type(self.connection), 'in_transaction'):
+            return self.connection.in_transaction
+        return self._in_transaction
+
+    def _note_write(self):
+        '''
+        Record that a write has been issued through one of our cursors.
+        '''
+        self._in_transaction = True
+
+    def _end_transaction(self):
+        '''
+        Record that the current transaction has been committed or rolled
+        back.
+        '''
+        self._in_transaction = False
+
+    def run_in_transaction(self, func, *args, **kwargs):
+        '''
+        Run func(self, *args, **kwargs) as a single unit of work and commit
+        it. On error the transaction is rolled back. When a retry policy is
+        set, the whole unit is retried after a retryable error, as the
+        statements inside a transaction are not retried on their own.
+        Returns the result of func.
+        '''
+        def unit():
+            try:
+                result = func(self, *args, **kwargs)
+                self.commit()
+            except Exception:
+                self.rollback()
+                raise
+            return result
+        if self.retry_policy is None:
+            return unit()
+        # Statements of the unit are not retried on their own, even before
+        # its first write opens the transaction.
+        in_unit = self._in_unit
+        self._in_unit = True
+        try:
+            return self.retry_policy.run(unit, self.dialect.is_retryable)
+        finally:
+            self._in_unit = in_unit
 
     def cursor(self):
         '''
-        Return a ADBICursor object for this ADBI object.
+        Return a ADBICursor object for this ADBI object. An idle cursor of the
+        underlying database is reused when one is available.
+        '''
+        return ADBICursor(self._acquire_cursor(), self.wrapped_db_param_style, self)
+
+    def _acquire_cursor(self):
+        '''
+        Return an idle cursor of the underlying database from the pool, or a
+        new one when none is available.
+        '''
+        connection = self.connection
+        with self._pool_lock:
+            cursor = self._idle_cursors.pop() if self._idle_cursors else None
+        if cursor is None:
+            cursor = self._new_cursor(connection)
+        return cursor
+
+    def _new_cursor(self, connection):
+        '''
+        Return a new cursor of the given underlying connection, recording
+        the arraysize cursors start with.
+        '''
+        cursor = connection.cursor()
+        if self._cursor_arraysize is None:
+            self._cursor_arraysize = getattr(cursor, 'arraysize', None)
+        return cursor
+
+    def _release_cursor(self, cursor, pending=False):
+        '''
+        Return a cursor of the underlying database to the pool of idle
+        cursors. The cursor is closed instead if the pool is full or the
+        dialect cannot reset it. Cursors are only reset when they may hold
+        rows that were not fetched (pending). The arraysize of new cursors
+        is restored, so that it is not inherited by the next user.
+        '''
+        with self._pool_lock:
+            pooled = len(self._idle_cursors) < self.cursor_pool_size
+        if pooled and pending:
+            try:
+                pooled = self.dialect.reset_cursor(cursor)
+            except Exception:
+                pooled = False
+        if pooled and self._cursor_arraysize is not None:
+            try:
+                cursor.arraysize = self._cursor_arraysize
+            except Exception:
+                pooled = False
+        if not pooled:
+            return cursor.close()
+        with self._pool_lock:
+            self._idle_cursors.append(cursor)
+
+    def execute(self, operation, params=None, timeout=None):
+        '''
+        Execute a single operation using a pooled cursor, returning the
+        rowcount. The transaction is not committed.
+        '''
+        curs = self.cursor()
+        try:
+            curs.execute(operation, params, timeout)
+            return curs.rowcount
+        finally:
+            curs.close()
+
+    def query(self, operation, params=None, timeout=None):
+        '''
+        Execute a single operation using a pooled cursor, returning all of
+        the rows of the result. The timeout (by default the statement_timeout)
+        covers both executing the operation and fetching its rows.
         '''
-        return ADBICursor(self.connection.cursor(), self.wrapped_db_param_style)
+        curs = self.cursor()
+        try:
+            # The deadline also covers fetching the rows.
+            with curs._deadline(timeout):
+                curs.execute(operation, params)
+                return curs.fetchall()
+        finally:
+            curs.close()
+
+    def bulk_delete(self, table, key_column, keys, chunk_size=None, commit_every=10, temp_table_threshold=None):
+        '''
+        Delete the rows of table whose key_column holds one of the given
+        keys, returning the number of rows deleted.
+        :param keys: an iterable of key values, consumed as a stream.
+        :param chunk_size: keys deleted per statement, by default (and at
+            most) the parameter limit of the dialect.
+        :param commit_every: number of statements between commits. The work
+            is always committed once all keys have been processed.
+        :param temp_table_threshold: when more keys than this are given they
+            are loaded into a temporary table and deleted with a single
+            statement joining it.
+        '''
+        return bulk_delete(self, table, key_column, keys, chunk_size, commit_every, temp_table_threshold)
+
+    def bulk_update(self, table, key_column, rows, columns=None, chunk_size=None, commit_every=10,
+            temp_table_threshold=None):
+        '''
+        Update the given columns of the rows of table identified by
+        key_column, returning the number of rows updated.
+        :param rows: an iterable of mappings holding the key and the new
+            column values, or of sequences holding the key followed by the
+            values in the order of columns. Consumed as a stream.
+        :param columns: the columns to update. Defaults to the keys of the
+            first mapping other than key_column.
+        The remaining arguments are as for bulk_delete, chunk_size being the
+        number of rows updated per statement.
+        '''
+        return bulk_update(self, table, key_column, rows, columns, chunk_size, commit_every,
+            temp_table_threshold)
+
+    def bulk_upsert(self, table, key_columns, columns, rows, chunk_size=None, commit_every=10,
+            temp_table_threshold=None):
+        '''
+        Insert rows into table, updating the given columns of the rows whose
+        key already exists. Returns the number of rows upserted.
+        :param key_columns: the column (or columns) of a primary key or unique
+            constraint identifying the rows. Keys must be unique within rows.
+        :param columns: the other columns to insert, and update when the key
+            exists. May be empty to only insert missing rows.
+        :param rows: an iterable of mappings, or of sequences holding the key
+            values followed by the column values. Consumed as a stream.
+        The native upsert of the dialect (such as INSERT ... ON CONFLICT DO
+        UPDATE) is used when available, inserting chunk_size rows per
+        statement, at most as many as the parameter limit allows. Otherwise,
+        or when there are more than temp_table_threshold rows, they are
+        loaded into a temporary table and merged with an UPDATE and an
+        INSERT. The remaining arguments are as for bulk_delete.
+        '''
+        return bulk_upsert(self, table, key_columns, columns, rows, chunk_size, commit_every,
+            temp_table_threshold)
+
+    def parallel_load(self, operation, rows, connections=4, batch_size=1000, commit_every=10, prepare=None,
+            workers=None, queue_size=None, stop_on_error=True):
+        '''
+        Load rows using executemany of operation over several new connections
+        created by the connection factory of this object, see
+        adbi.loader.parallel_load. Returns a LoadStats tuple.
+        '''
+        if self._factory is None:
+            raise SystemError("Parallel loading requires a connection factory")
+        return parallel_load(self._factory, operation, rows, connections, batch_size, commit_every, prepare,
+            workers, self.wrapped_db_param_style, queue_size, stop_on_error)
+
+    def incremental_query(self, operation, watermark, key_columns='id', params=None, name=None, batch_size=1000):
+        '''
+        Return an IncrementalQuery keeping the rows of the given pyformat
+        operation, keyed by key_columns. Each call to its refresh method
+        fetches only the rows whose watermark column is past the last one
+        seen. When named, the position reached is stored in the _schema_info
+        table and used by later IncrementalQuery objects of the same name, and
+        must fit in 128 characters as JSON.
+        '''
+        return IncrementalQuery(self, operation, watermark, key_columns, params, name, batch_size)
+
+    def load_queries(self, path):
+        '''
+        Load the named queries of the given .sql file (or directory of .sql
+        files) into the query catalog of this object. Each query follows a
+        "-- name: <query_name>" line and uses pyformat placeholders, which are
+        validated and translated for the paramstyle of the connection when
+        loaded. Queries are then called through the queries attribute, such
+        as conn.queries.get_user(id=1). Returns the catalog.
+        '''
+        self.queries.load(path)
+        return self.queries
+
+    def record_statements(self, max_statements=1000):
+        '''
+        Start counting the statements executed through the cursors of this
+        object, so that the most frequent can be saved with save_manifest.
+        At most twice max_statements distinct statements are counted, the
+        least frequent are dropped beyond that. Returns the
+        StatementRecorder.
+        '''
+        if self.statement_recorder is None:
+            self.statement_recorder = StatementRecorder(max_statements)
+        return self.statement_recorder
+
+    def save_manifest(self, path, top=100, reads=None):
+        '''
+        Write the top most frequently executed statements to a manifest file
+        for warm_up. Statements must have been recorded (see
+        record_statements).
+        :param reads: (operation, params) pairs to run when warming up, such
+            as reads of frequently used tables.
+        '''
+        if self.statement_recorder is None:
+            raise SystemError("Statements are not being recorded")
+        return save_manifest(self.statement_recorder, path, top, reads)
+
+    def warm_up(self, manifest, reads=True, on_reconnect=False):
+        '''
+        Prepare this object to serve the statements of the given manifest (a
+        path or manifest data) at full speed: their translations are made
+        ahead of time, the cursor pool is filled and, when reads is set, the
+        manifest's warming reads are run. With on_reconnect the warm up is
+        repeated whenever the object reconnects in a new process. Returns
+        the number of statements translated.
+        '''
+        if on_reconnect:
+            self.add_reconnect_hook(lambda adbi: warm_up(adbi, manifest, reads))
+        return warm_up(self, manifest, reads)
+
+    def enable_plan_capture(self, large_table_rows=1000, retry_failed_after=60):
+        '''
+        Capture the query plan of each distinct statement the first time it
+        is executed through a cursor of this object. Plans are gathered
+        through the dialect, statements scanning tables of at least
+        large_table_rows rows in full are flagged with a suggested index.
+        Statements that could not be explained are tried again after
+        retry_failed_after seconds. Returns the PlanAdvisor holding the
+        captured plans and report.
+        '''
+        self.plan_advisor = PlanAdvisor(self, large_table_rows, retry_failed_after)
+        return self.plan_advisor
+
+    def disable_plan_capture(self):
+        '''
+        Stop capturing query plans.
+        '''
+        self.plan_advisor = None
+
+    def import_file(self, table, path, columns=None, format='csv', batch_size=1000, commit_every=10,
+            workers=None, checkpoint=None, rows_per_statement=1, header=True, encoding='utf-8'):
+        '''
+        Stream a CSV or JSON lines file into the given table. The file is
+        read batch_size records at a time and each batch is inserted with
+        executemany, so memory use does not depend on the size of the file.
+
+        :param columns: the columns to insert into. Defaults to the CSV header
+            or the keys of the first JSON object, and is required for CSV
+            files without a header. Values are matched to the columns by
+            name, using the header of CSV files.
+        :param commit_every: number of batches inserted between commits.
+            Batches inserted since the last commit are rolled back when the
+            import fails.
+        :param workers: when given, parse batches on a pool of this many
+            worker processes while inserting on the current one.
+        :param checkpoint: path of a file recording progress at each commit.
+            If the file exists the import resumes from the recorded position,
+            it is removed once the import completes.
+        :param rows_per_statement: number of rows to insert with each
+            multi-row INSERT statement.
+
+        Returns the total number of rows imported, including those imported
+        before resuming from a checkpoint.
+        '''
+        return import_file(self, table, path, columns, format, batch_size, commit_every, workers,
+            checkpoint, rows_per_statement, header, encoding)
+
+    def open_blob(self, table, column, key, readonly=True, key_column='rowid', chunk_size=65536):
+        '''
+        Open a BLOB value for incremental reading (and writing where the
+        driver supports it) so that large values can be processed in bounded
+        memory. The returned object is file like, supporting read, seek, tell
+        and len, and may be used as a context manager.
+
+        The driver's incremental blob I/O (sqlite3's blobopen) is used when
+        available and the row is identified by its rowid. Otherwise the value
+        is read chunk_size bytes at a time with SUBSTR queries, in which case
+        it can only be opened read only.
+        '''
+        return open_blob(self, table, column, key, readonly, key_column, chunk_size)
 
     ## Schema management methods ##
 
@@ -135,21 +635,19 @@ class ADBI :
         '''
         Create the table to hold schema information.
         '''
-        curs = self.cursor()
         try:
             # Attemtp to get the schema_version from the _scheam_info table.
             # If this fails, then the table does not exist. We should then
             # create it.
-            curs.execute("SELECT value FROM _schema_info WHERE variable = 'schema_version'")
+            self.query("SELECT value FROM _schema_info WHERE variable = 'schema_version'")
         except Exception:
             # Create the _schema_info table.
-            curs.execute("""
+            self.execute("""
                 CREATE TABLE _schema_info (
                     variable VARCHAR(64) NOT NULL PRIMARY KEY,
                     value varchar(128) NOT NULL
                 )
             """)
-            curs.close()
             self.commit()
 
     def current_schema_version(self):
@@ -159,34 +657,44 @@ class ADBI :
         self._validate_schema_table()
         # Build the query we are going to use.
         sql = "SELECT value FROM _schema_info WHERE variable = 'schema_version'"
-        curs = self.cursor()
-        curs.execute(sql)
-        row = curs.fetchone()
-        curs.close()
+        rows = self.query(sql)
 
-        if row:
-            return row[0]
+        if rows:
+            return rows[0][0]
         return None
 
+    def _set_schema_info(self, variable, value):
+        '''
+        Set the value of the given variable in the _schema_info table.
+        '''
+        # Match the column sizes of the _schema_info table.
+        if len(variable) > 64:
+            raise ValueError("Schema info variable {0} is longer than 64 characters".format(variable))
+        if len(value) > 128:
+            raise ValueError("Value of schema info variable {0} is longer than 128 characters: {1}".format(
+                variable, value))
+        if not self.execute("UPDATE _schema_info SET value = %s WHERE variable = %s", (value, variable)):
+            self.execute("INSERT INTO _schema_info (variable, value) VALUES (%s, %s)", (variable, value))
+
+    def _schema_file_version(self, path):
+        '''
+        Return the version of the given SQL or Python schema file, or None if
+        the name does not match the schema file format.
+        '''
+        return _schema_file_version(path.name, self.schema_file_format)
+
     def _get_upgrade_path(self):
         '''
         Return an ordered list of the schema files to apply in order to
-        upgrade the database to the current version.
+        upgrade the database to the current version. A version may have an
+        SQL file, a Python file (applied after the SQL file) or both.
         '''
         # Get all of the files in the schema_path, and parse them for version
         # information.
-        version_re = re.compile(self.schema_file_format.format(version='(.*?)'))
-        schema_files = {}
-        latest_version = None
-        for schema_file in sorted(self.schema_dir.iterdir()):
-            match = version_re.match(str(schema_file.name))
-            if match:
-                # Skip the 'current' version.
-                if match.group(1) == 'current':
-                    continue
-                # Append the schema to our schema list.
-                schema_files[match.group(1)] = schema_file
-                latest_version = match.group(1)
+        schema_files = _version_files(self.schema_dir, self.schema_file_format)
+        # Skip the 'current' version.
+        schema_files.pop('current', None)
+        latest_version = max(schema_files) if schema_files else None
 
         # Get our current schema version.
         current_version = self.current_schema_version()
@@ -205,24 +713,171 @@ class ADBI :
             # all that are greater than the current version.
             for schema_version in sorted(schema_files):
                 if schema_version > current_version:
-                    schemas.append(schema_files[schema_version])
+                    for schema in schema_files[schema_version]:
+                        if schema.suffix != '.py':
+                            self._check_squashed(current_version, squashed_from(schema), schema_version)
+                    schemas.extend(schema_files[schema_version])
         return schemas, latest_version
 
-    def update_schema(self):
+    def _check_squashed(self, current_version, first_version, version):
+        '''
+        Raise a SystemError when the current version is within the versions
+        first_version to version squashed into a single file, as the changes
+        of the versions after it cannot be applied on their own.
+        '''
+        if first_version is not None and first_version <= current_version < version:
+            raise SystemError("Schema version {0} is within the squashed versions {1} to {2}".format(
+                current_version, first_version, version))
+
+    def update_schema(self, bundle=None):
         '''
         Upgrade the database to the most schema version. Scan the schema_dir
         for the available schema files. If no current schema exists, use the
         'current' version schema. Otherwise apply the versioned schemas in
         order (textualy sorted) until we reach the current version.
+
+        Alongside an SQL file, a version may have a Python file named using
+        the schema file format with a .py suffix. Its upgrade(conn) function
+        is called with this object, typically to run data backfills. The
+        schema version is recorded as each version is applied, so a failed
+        upgrade resumes from the version that failed.
+
+        When the path of a schema bundle (see build_schema_bundle) is given,
+        the schema files are taken from the bundle instead of the schema_dir.
+        '''
+        if self.tracer is None:
+            return self._update_schema(bundle)
+        with traced(self.tracer, 'update_schema'):
+            self._update_schema(bundle)
+
+    def _upgrade_steps(self, bundle):
+        '''
+        Return the (version, step) pairs to apply in order, and the latest
+        version. Steps are schema file paths or the entries of the bundle.
         '''
-        schemas, latest_version = self._get_upgrade_path()
+        if bundle is None:
+            schemas, latest_version = self._get_upgrade_path()
+            return [(self._schema_file_version(schema), schema) for schema in schemas], latest_version
+        entries = load_bundle(bundle)['entries']
+        versions = sorted(entry['version'] for entry in entries if entry['version'] != 'current')
+        latest_version = versions[-1] if versions else None
+        current_version = self.current_schema_version()
+        if not current_version:
+            steps = [entry for entry in entries if entry['version'] == 'current']
+            if not steps:
+                raise SystemError("Cannot find the current schema in the schema bundle ({0})".format(bundle))
+        else:
+            for entry in entries:
+                self._check_squashed(current_version, entry.get('squashed_from'), entry['version'])
+            steps = [entry for entry in entries
+                if entry['version'] != 'current' and entry['version'] > current_version]
+        return [(entry['version'], entry) for entry in steps], latest_version
+
+    def _update_schema(self, bundle=None):
+        '''
+        Apply the upgrade path to the database.
+        '''
+        steps, latest_version = self._upgrade_steps(bundle)
+        # The version whose SQL was applied before its Python step failed.
+        stored = self.query("SELECT value FROM _schema_info WHERE variable = 'schema_step'")
+        sql_applied = stored[0][0] if stored else None
         curs = self.cursor()
-        for schema in schemas:
-            curs.executefile(schema)
-        curs.execute("UPDATE _schema_info SET value = %s WHERE variable = 'schema_version'", (latest_version,))
-        curs.close()
+        try:
+            for idex, (version, step) in enumerate(steps):
+                python = 'python' in step if isinstance(step, dict) else step.suffix == '.py'
+                if version == sql_applied and not python:
+                    continue
+                if isinstance(step, dict):
+                    # A bundle entry holding pre-split statements or source.
+                    if python:
+                        self._run_schema_script(step['file'], step['python'])
+                    else:
+                        for statement in step['statements']:
+                            curs.execute(statement)
+                elif python:
+                    self._run_schema_script(step)
+                else:
+                    curs.executefile(step)
+                if version == 'current':
+                    continue
+                if idex + 1 == len(steps) or steps[idex + 1][0] != version:
+                    # Record each version once all of its files are applied.
+                    self._set_schema_info('schema_version', version)
+                    self.execute("DELETE FROM _schema_info WHERE variable = 'schema_step'")
+                else:
+                    # Record the SQL as applied, so that a failed Python
+                    # step (such as a backfill) resumes without it.
+                    self._set_schema_info('schema_step', version)
+                self.commit()
+        finally:
+            curs.close()
+        # A schema_dir holding only the current schema has no version.
+        if latest_version is not None:
+            self._set_schema_info('schema_version', latest_version)
         self.commit()
 
+    def _run_schema_script(self, path, source=None):
+        '''
+        Run the upgrade function of the given Python schema file, or of the
+        given source of the file.
+        '''
+        if source is None:
+            namespace = runpy.run_path(str(path))
+        else:
+            namespace = {'__name__': '<schema>', '__file__': str(path)}
+            exec(compile(source, str(path), 'exec'), namespace)
+        upgrade = namespace.get('upgrade')
+        if not callable(upgrade):
+            raise SystemError("Python schema file {0} does not define an upgrade(conn) function".format(path))
+        upgrade(self)
+
+    def build_schema_bundle(self, path):
+        '''
+        Write every schema file of the schema_dir to a single bundle file at
+        path. SQL files are stored split into statements and every file is
+        stored with a checksum, verified when the bundle is loaded by
+        update_schema. Returns the bundle data.
+        '''
+        return build_bundle(self.schema_dir, path, self.schema_file_format)
+
+    def squash_schema(self, first_version, last_version):
+        '''
+        Combine the SQL schema files of versions first_version through
+        last_version into the file of last_version, removing the others.
+        The combined statements are verified against the original files and
+        their checksum recorded in the squashed file. Databases at a version
+        within the range must be upgraded before squashing. Returns the path
+        of the squashed file.
+        '''
+        return squash_schema(self.schema_dir, first_version, last_version, self.schema_file_format)
+
+    def backfill(self, name, table, key_columns, operation=None, function=None, columns=None, where=None,
+            params=None, batch_size=1000, rows_per_sec=None, duty_cycle=None):
+        '''
+        Update the rows of table in batches of batch_size rows, taken in the
+        order of key_columns, committing each batch. Progress is recorded in
+        the _schema_info table under the given name, so that a backfill that
+        was interrupted resumes after the last committed batch. Key values
+        must be JSON serialisable, dates, datetimes or decimals, and fit in
+        128 characters as JSON. Returns the number of rows processed.
+        :param operation: an SQL operation run once per batch with the first
+            and last key of the batch as the start and end parameters, such
+            as "UPDATE foo SET b = a WHERE id BETWEEN %(start)s AND %(end)s",
+            along with the params (which must be a mapping). Only available
+            with a single key column and without a where condition, as the
+            range of a batch also holds the rows excluded by the condition.
+        :param function: called as function(conn, rows) for each batch
+            instead of an operation. Rows hold the key columns followed by
+            any other columns requested.
+        :param where: condition (with optional params) limiting the rows
+            backfilled.
+        :param rows_per_sec: the most rows to process per second.
+        :param duty_cycle: the largest fraction of time to spend running
+            batches, waiting between batches as required.
+        '''
+        return run_backfill(self, name, table, key_columns, operation, function, columns, where, params,
+            batch_size, rows_per_sec, duty_cycle)
+
 
 class ADBICursor:
     '''
@@ -232,25 +887,57 @@ class ADBICursor:
     unified query placehold replacement strategy can be used (pyformat).
     '''
 
-    def __init__(self, cursor, paramstyle):
+    def __init__(self, cursor, paramstyle, adbi=None):
         '''
-        Initlaize a cursor. An exsiting database cursor is required.
+        Initlaize a cursor. An exsiting database cursor is required. The ADBI
+        object that created the cursor may optionally be given.
         '''
         self._cursor = cursor
         self.wrapped_db_param_style = paramstyle
+        self._adbi = adbi
+        # The last operation executed and its fingerprint, once calculated.
+        self._operation = None
+        self._fingerprint = None
+        # The (description, rowcount, rows) result shared through
+        # single-flight and the position of the next row to fetch from it.
+        self._shared = None
+        self._shared_pos = 0
+        # The priority class of the statements of this cursor when the ADBI
+        # object has a scheduler.
+        self.priority = None
+        # The deadline (a time.monotonic value) covering the statement and
+        # the fetching of its rows, and the timer cancelling them.
+        self._deadline_at = None
+        self._deadline_timer = None
+        # Whether the underlying cursor may hold rows not yet fetched.
+        self._pending = False
 
     @property
     def description(self):
         '''
         Return the current description of the cursor.
         '''
+        if self._shared is not None:
+            return self._shared[0]
         return self._cursor.description
 
+    @property
+    def fingerprint(self):
+        '''
+        Return the fingerprint of the last operation executed, or None if
+        nothing has been executed yet.
+        '''
+        if self._fingerprint is None and self._operation is not None:
+            self._fingerprint = fingerprint(self._operation)
+        return self._fingerprint
+
     @property
     def rowcount(self):
         '''
         Return the current rowcount.
         '''
+        if self._shared is not None:
+            return self._shared[1]
         return self._cursor.rowcount
 
     def callproc(self, procname, *params):
@@ -267,9 +954,15 @@ class ADBICursor:
 
     def close(self):
         '''
-        Close the cursor now (rather than whenever __del__ is called).
+        Close the cursor now (rather than whenever __del__ is called). When
+        the cursor was created by an ADBI object, the underlying cursor is
+        returned to its pool for reuse and this cursor can no longer be used.
         '''
-        return self._cursor.close()
+        if self._adbi is None:
+            return self._cursor.close()
+        cursor, self._cursor = self._cursor, None
+        if cursor is not None:
+            return self._adbi._release_cursor(cursor, self._pending)
 
     def _get_operation_parts(self, operation, params):
         '''
@@ -388,49 +1081,253 @@ class ADBICursor:
         elif self.wrapped_db_param_style == 'named':
             return self._format_operation_parts_named(parts)
         elif self.wrapped_db_param_style == 'format':
+            if params:
+                # Formatting the parts removed the escaping of any literal %,
+                # which the driver expects to find.
+                parts = [part.replace('%', '%%') if idex % 2 == 0 else part for idex, part in enumerate(parts)]
             return self._format_operation_parts_char(parts, char='%s')
 
         raise SystemError("An unhandled type of format style has been found: {0}".format(self.wrapped_db_param_style))
 
-    def execute(self, operation, params=None):
+    def _translate(self, operation, params):
+        '''
+        Return the translated operation and parameter mapping. When the
+        cursor belongs to an ADBI object the translation is cached there, as
+        it only depends on the operation and the shape of the parameters.
+        '''
+        cache = self._adbi._translations if self._adbi is not None else None
+        if cache is None:
+            return self._convert_operation_with_params(operation, params)
+        key = _translation_key(self.wrapped_db_param_style, operation, params)
+        if self._adbi.statement_recorder is not None:
+            self._adbi.statement_recorder.record(operation, key[2])
+        translation = self._adbi._prepared.get(key) or cache.get(key)
+        if translation is None:
+            translation = self._convert_operation_with_params(operation, params)
+            if len(cache) >= self._adbi.translation_cache_size:
+                cache.clear()
+            cache[key] = translation
+        return translation
+
+    def execute(self, operation, params=None, timeout=None):
         '''
         Prepare and execute a database operation (query or command).
 
         Parameters may be provided as sequence or mapping and will be bound to
         variables in the operation. Variables are provided as named
         parameters. These are substituted into the operation string using the
-        pyformat formatting method.
+        pyformat formatting method. Parameter values are passed to the
+        underlying database untouched, so buffer objects such as memoryview
+        reach the driver without being copied.
+
+        When a timeout (or the statement_timeout of the ADBI object) is set,
+        the statement is cancelled once it has run for that many seconds,
+        including any time spent waiting for the scheduler, and a
+        TimeoutError is raised. Rows fetched afterwards from this cursor are
+        not covered by the timeout, ADBI.query covers both.
 
         Return values are not defined.
         '''
+        self._operation = operation
+        self._fingerprint = None
+        self._shared = None
         # Adjust our operation and parameters.
-        (operation, mapping) = self._convert_operation_with_params(operation, params)
+        (translated, mapping) = self._translate(operation, params)
         if mapping:
             params = self._map_params(params, mapping)
-        # Now execute the given operation.
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if tracer is None:
+            return self._execute(translated, params, timeout)
+        with traced(tracer, 'execute', operation, translated, self.wrapped_db_param_style) as event:
+            self._execute(translated, params, timeout)
+            event.rows = self.rowcount
+
+    def _execute(self, operation, params, timeout=None):
+        '''
+        Execute the translated operation with the mapped parameters. Reads
+        outside of a transaction share their result with identical concurrent
+        reads when the ADBI object has a single-flight group.
+        '''
+        flight = self._adbi.single_flight if self._adbi is not None else None
+        if flight is not None and _is_read_operation(operation) and not self._adbi.in_transaction:
+            key = flight.key(operation, params)
+            if key is not None:
+                self._shared = flight.do(key, lambda: self._execute_shared(operation, params, timeout))
+                self._shared_pos = 0
+                self._finish_result()
+                return
+        self._execute_direct(operation, params, timeout)
+
+    def _execute_shared(self, operation, params, timeout=None):
+        '''
+        Execute the operation and return its description, rowcount and all of
+        its rows so that they can be shared with other cursors. The timeout
+        covers fetching the rows.
+        '''
+        with self._deadline(timeout):
+            self._execute_direct(operation, params)
+            return (self._cursor.description, self._cursor.rowcount, self._cursor.fetchall())
+
+    def _execute_direct(self, operation, params, timeout=None):
+        '''
+        Execute the operation on the underlying cursor.
+        '''
+        if self._adbi is not None and self._adbi.plan_advisor is not None:
+            self._adbi.plan_advisor.capture(operation, params)
+        # Now execute the given operation, which leaves the cursor to be reset
+        # until its result is known to be exhausted.
+        self._pending = True
         if params:
-            self._cursor.execute(operation, params)
+            self._run(lambda: self._cursor.execute(operation, params), operation, timeout)
         else:
-            self._cursor.execute(operation)
+            self._run(lambda: self._cursor.execute(operation), operation, timeout)
+        self._pending = self._cursor.description is not None
 
-    def executemany(self, operation, seq_of_params):
+    def executemany(self, operation, seq_of_params, timeout=None):
         '''
         Prepare a database operation (query or command) and then execute it
         against all parameter sequences or mappings found in the sequence
-        seq_of_parameters.
+        seq_of_parameters. The timeout applies as for execute.
         '''
-        (operation, mapping) = self._convert_operation_with_params(operation, seq_of_params[0])
+        self._operation = operation
+        self._fingerprint = None
+        self._shared = None
+        (translated, mapping) = self._translate(operation, seq_of_params[0])
         if mapping:
             for idex, params in enumerate(seq_of_params):
                 seq_of_params[idex] = self._map_params(params, mapping)
-        self._cursor.executemany(operation, seq_of_params)
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if tracer is None:
+            return self._run(lambda: self._cursor.executemany(translated, seq_of_params), timeout=timeout)
+        with traced(tracer, 'executemany', operation, translated, self.wrapped_db_param_style) as event:
+            self._run(lambda: self._cursor.executemany(translated, seq_of_params), timeout=timeout)
+            event.rows = self.rowcount
+
+    def _run(self, func, operation=None, timeout=None):
+        '''
+        Run func, which executes the (translated) operation on the underlying
+        cursor, once admitted by the scheduler of the ADBI object if it has
+        one. The timeout (by default the statement timeout of the ADBI object)
+        bounds both the wait for the scheduler and the execution.
+        '''
+        adbi = self._adbi
+        if adbi is None:
+            return func()
+        deadline = self._deadline_at
+        if deadline is None:
+            if timeout is None:
+                timeout = adbi.statement_timeout
+            deadline = time.monotonic() + timeout if timeout is not None else None
+        scheduler = adbi.scheduler
+        if scheduler is None:
+            return self._run_timed(func, operation, deadline)
+        wait = scheduler.queue_timeout
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+            wait = remaining if wait is None else min(wait, remaining)
+        with scheduler.admit(self.priority, wait):
+            return self._run_timed(func, operation, deadline)
+
+    def _schedule_cancel(self, deadline):
+        '''
+        Return the Deadline cancelling the statement of this cursor through
+        the dialect of the ADBI object at the given time.
+        '''
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Statement deadline passed before it could be run")
+        connection = getattr(self._cursor, 'connection', None) or self._adbi.connection
+        dialect = self._adbi.dialect
+        return shared_timer.schedule(remaining, lambda: dialect.cancel(connection))
+
+    @contextmanager
+    def _deadline(self, timeout):
+        '''
+        Apply the timeout (by default the statement timeout of the ADBI
+        object) to everything run within, statements and fetches alike,
+        raising a TimeoutError if they are cancelled.
+        '''
+        if timeout is None and self._adbi is not None:
+            timeout = self._adbi.statement_timeout
+        if timeout is None or self._adbi is None or self._deadline_at is not None:
+            yield
+            return
+        self._deadline_at = time.monotonic() + timeout
+        try:
+            yield
+        except Exception as err:
+            if self._deadline_timer is not None and self._deadline_timer.finish():
+                raise TimeoutError("Statement cancelled after its deadline passed") from err
+            raise
+        finally:
+            if self._deadline_timer is not None:
+                self._deadline_timer.finish()
+            self._deadline_at = None
+            self._deadline_timer = None
+
+    def _run_timed(self, func, operation, deadline):
+        '''
+        Run func, cancelling it through the dialect of the ADBI object if it
+        is still running at the given deadline (a time.monotonic value).
+        Within a _deadline block the cancellation stays scheduled once the
+        statement completes, so that it also covers fetching its rows.
+        '''
+        if deadline is None:
+            return self._run_admitted(func, operation)
+        if self._deadline_at is not None:
+            if self._deadline_timer is None:
+                self._deadline_timer = self._schedule_cancel(deadline)
+            return self._run_admitted(func, operation)
+        timer = self._schedule_cancel(deadline)
+        try:
+            return self._run_admitted(func, operation)
+        except Exception as err:
+            if timer.finish():
+                raise TimeoutError("Statement cancelled after its deadline passed") from err
+            raise
+        finally:
+            timer.finish()
+
+    def _run_admitted(self, func, operation):
+        '''
+        Run func. Writes are recorded on the ADBI object so that it knows a
+        transaction is open. Outside of a transaction func is retried
+        according to the retry policy of the ADBI object, if it has one.
+        '''
+        adbi = self._adbi
+        if adbi is None or (adbi.retry_policy is None and not adbi._track_writes):
+            return func()
+        retry = adbi.retry_policy is not None and not adbi._in_unit and not adbi.in_transaction
+        write = operation is None or not _is_read_operation(operation)
+        if write:
+            adbi._note_write()
+        if not retry:
+            return func()
+
+        def before_retry():
+            adbi.rollback()
+            if write:
+                adbi._note_write()
+        return adbi.retry_policy.run(func, adbi.dialect.is_retryable, before_retry)
 
     def fetchone(self):
         '''
         Fetch the next row of a query result set, returning a single sequence,
         or None when no more data is available.
         '''
-        return self._cursor.fetchone()
+        if self._shared is not None:
+            rows = self._take_shared(1)
+            return rows[0] if rows else None
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if tracer is None:
+            row = self._cursor.fetchone()
+        else:
+            with traced(tracer, 'fetchone') as event:
+                row = self._cursor.fetchone()
+                event.rows = 0 if row is None else 1
+        if row is None:
+            self._finish_result()
+        return row
 
     def fetchmany(self, size=None):
         '''
@@ -438,17 +1335,117 @@ class ADBICursor:
         sequences (e.g. a list of tuples). An empty sequence is returned when
         no more rows are available.
         '''
+        if self._shared is not None:
+            return self._take_shared(size or self._cursor.arraysize)
         if not size:
+            adaptive = self._adbi.adaptive_fetch if self._adbi is not None else None
+            if adaptive is not None and self._operation is not None:
+                # Use and refine the size learned for this statement.
+                key = self.fingerprint
+                start = time.perf_counter()
+                rows = self._fetchmany(adaptive.size_for(key))
+                adaptive.observe(key, rows, time.perf_counter() - start)
+                return rows
             size = self._cursor.arraysize
-        return self._cursor.fetchmany(size)
+        return self._fetchmany(size)
+
+    def _fetchmany(self, size):
+        '''
+        Fetch the given number of rows from the underlying cursor.
+        '''
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if tracer is None:
+            rows = self._cursor.fetchmany(size)
+        else:
+            with traced(tracer, 'fetchmany') as event:
+                rows = self._cursor.fetchmany(size)
+                event.rows = len(rows)
+        # Only pooled cursors need to know when their result is exhausted.
+        if self._adbi is not None and len(rows) < size:
+            self._finish_result()
+        return rows
 
-    def fetchall(self):
+    def fetchall(self, spill_threshold=None, batch_size=1000):
         '''
         Fetch all (remaining) rows of a query result, returning them as a
         sequence of sequences (e.g. a list of tuples). Note that the cursor's
         arraysize attribute can affect the performance of this operation.
+
+        When spill_threshold is given, a SpilledRows sequence is returned
+        instead. Rows are held in memory until they take roughly
+        spill_threshold bytes, the rest are fetched batch_size rows at a time
+        and written to a temporary file. The sequence supports len(),
+        indexing, slicing and iteration and should be closed once no longer
+        needed.
+        '''
+        if self._shared is not None:
+            return self._take_shared(None)
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if spill_threshold is not None:
+            if tracer is None:
+                return spill_cursor(self, spill_threshold, batch_size)
+            with traced(tracer, 'fetchall') as event:
+                rows = spill_cursor(self, spill_threshold, batch_size)
+                event.rows = len(rows)
+            return rows
+        if tracer is None:
+            rows = self._cursor.fetchall()
+        else:
+            with traced(tracer, 'fetchall') as event:
+                rows = self._cursor.fetchall()
+                event.rows = len(rows)
+        self._finish_result()
+        return rows
+
+    def _finish_result(self):
+        '''
+        Record that every row of the result has been fetched, so that the
+        underlying cursor no longer needs to be reset.
+        '''
+        self._pending = False
+
+    def _take_shared(self, size):
+        '''
+        Return up to size rows (all remaining rows if size is None) of the
+        shared result.
+        '''
+        rows = self._shared[2]
+        end = len(rows) if size is None else min(len(rows), self._shared_pos + size)
+        taken = rows[self._shared_pos:end]
+        self._shared_pos = end
+        return taken
+
+    def export(self, dest, format='csv', batch_size=1000, compression=None, header=True,
+            encoding='utf-8'):
         '''
-        return self._cursor.fetchall()
+        Stream the remaining rows of the current result set to dest, a path
+        or file object, as CSV or JSON lines. Rows are fetched batch_size at
+        a time so memory use does not grow with the size of the result.
+
+        CSV headers and JSON keys are taken from the cursor description. The
+        compression may be 'gzip', 'bz2' or 'xz'. When exporting to a path it
+        defaults to the one matching the file suffix.
+
+        Returns an ExportStats tuple of the rows and bytes written, the time
+        taken and the resulting rows per second.
+        '''
+        return export_cursor(self, dest, format, batch_size, compression, header, encoding)
+
+    def paginate(self, operation, params=None, key_columns=('id',), page_size=100, token=None,
+            descending=False):
+        '''
+        Page through the rows of the given pyformat operation using keyset
+        pagination. The operation is wrapped in a sub-query ordered by
+        key_columns, which must be selected by the operation and together be
+        unique, and each page seeks past the last key of the previous one
+        rather than using OFFSET.
+
+        Pages are yielded lazily as Page tuples of the rows and a token. The
+        token resumes pagination after that page when passed back as token,
+        it is None on the last page. The cursor is used to run each page, so
+        it should not be used for anything else while paginating.
+        '''
+        return paginate_cursor(self, operation, params, key_columns, page_size, token, descending)
 
     def nextset(self):
         '''
@@ -501,6 +1498,19 @@ class ADBICursor:
         Execute the given script. Some databases natively support this method
         already. Otherwise do our best to find a suitable alternative.
         '''
+        self._shared = None
+        if self._adbi is not None:
+            self._adbi._note_write()
+        tracer = self._adbi.tracer if self._adbi is not None else None
+        if tracer is None:
+            return self._executescript(script)
+        with traced(tracer, 'executescript', script, script, self.wrapped_db_param_style):
+            self._executescript(script)
+
+    def _executescript(self, script):
+        '''
+        Execute the script using the underlying cursor.
+        '''
         # Is this natively supported?
         if hasattr(self._cursor, 'executescript'):
             self._cursor.executescript(script)
@@ -516,3 +1526,16 @@ class ADBICursor:
             path = Path(path)
         script = path.read_text()
         self.executescript(script)
+
+
+from adbi.adaptive import AdaptiveFetch  # noqa: E402
+from adbi.catalog import Query, QueryCatalog  # noqa: E402
+from adbi.loader import LoadStats, parallel_load  # noqa: E402
+from adbi.plans import PlanAdvisor  # noqa: E402
+from adbi.retry import RetryPolicy  # noqa: E402
+from adbi.routing import RoutingADBI, RoutingADBICursor  # noqa: E402
+from adbi.sharding import ShardedADBI  # noqa: E402
+from adbi.singleflight import SingleFlight  # noqa: E402
+from adbi.spill import SpilledRows, spill_cursor  # noqa: E402
+from adbi.tracing import InMemoryTracer, Tracer, TraceEvent, traced  # noqa: E402
+from adbi.warmup import StatementRecorder, save_manifest, warm_up  # noqa: E402
@@ -0,0 +1,89 @@
+'''
+Adaptive batch sizes for fetchmany.
+
+When an AdaptiveFetch object is assigned to ADBI.adaptive_fetch, calls to
+fetchmany without an explicit size use a batch size learned for the statement
+being fetched. The size is adjusted after each fetch from the observed row
+width and fetch latency, aiming for batches of about target_bytes that take
+about target_latency seconds to fetch. Learned sizes are shared by all of the
+cursors of the ADBI object.
+'''
+import threading
+
+
+def _row_width(row):
+    '''
+    Return a rough estimate of the number of bytes held by the given row.
+    '''
+    width = 0
+    for value in row:
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            width += len(value)
+        else:
+            width += 8
+    return width or 1
+
+
+class AdaptiveFetch:
+    '''
+    Learns a fetchmany batch size per statement fingerprint.
+    '''
+
+    def __init__(self, target_bytes=1 << 20, target_latency=0.05, initial_size=100, min_size=1,
+            max_size=10000, smoothing=0.5):
+        '''
+        Initialize the learner.
+        :param target_bytes: approximate memory budget of a single batch.
+        :param target_latency: approximate time a single fetch should take.
+        :param initial_size: batch size used for unseen statements.
+        :param smoothing: weight of the newest observation when averaging
+            row widths and per row latencies.
+        '''
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.initial_size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.smoothing = smoothing
+        # Fingerprint to [size, bytes per row, seconds per row].
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def size_for(self, key):
+        '''
+        Return the batch size to use for the statement with the given
+        fingerprint.
+        '''
+        state = self._statements.get(key)
+        return state[0] if state else self.initial_size
+
+    def sizes(self):
+        '''
+        Return a mapping of fingerprints to their learned batch size.
+        '''
+        with self._lock:
+            return {key: state[0] for key, state in self._statements.items()}
+
+    def observe(self, key, rows, seconds):
+        '''
+        Record a fetch of the given rows that took the given number of
+        seconds, and adjust the batch size of the statement.
+        '''
+        if not rows:
+            return
+        width = _row_width(rows[0])
+        latency = seconds / len(rows)
+        with self._lock:
+            state = self._statements.get(key)
+            if state is None:
+                state = [self.initial_size, width, latency]
+                self._statements[key] = state
+            else:
+                state[1] += self.smoothing * (width - state[1])
+                state[2] += self.smoothing * (latency - state[2])
+            size = self.target_bytes / state[1]
+            if state[2] > 0:
+                size = min(size, self.target_latency / state[2])
+            # Grow gradually so that a single fast fetch does not overshoot.
+            size = min(size, state[0] * 4)
+            state[0] = int(max(self.min_size, min(self.max_size, size)))
@@ -0,0 +1,94 @@
+'''
+Batched, throttled data backfills.
+
+A backfill walks the rows of a table in key order, a batch at a time, and
+applies an SQL operation or a Python function to each batch. Every batch is
+committed along with the last key processed, which is stored in the
+_schema_info table, so an interrupted backfill resumes after the last
+committed batch when run again. Batches may be throttled to a number of rows
+per second, or to a duty cycle (the fraction of time spent running batches),
+so that large data migrations can run while the database is in use.
+
+Backfills are typically run from Python schema files (such as
+schema-1.1.0.py) which define an upgrade(conn) function, see
+ADBI.update_schema.
+'''
+import json
+import time
+
+from adbi.paging import _decode_value, _encode_value, _seek_operation
+
+
+def throttle_delay(rows, seconds, rows_per_sec=None, duty_cycle=None):
+    '''
+    Return the number of seconds to wait after a batch of rows that took the
+    given number of seconds so as not to exceed rows_per_sec, or a database
+    busy fraction of duty_cycle.
+    '''
+    delay = 0
+    if rows_per_sec:
+        delay = max(delay, rows / rows_per_sec - seconds)
+    if duty_cycle:
+        delay = max(delay, seconds * (1 - duty_cycle) / duty_cycle)
+    return delay
+
+
+def run_backfill(conn, name, table, key_columns, operation=None, function=None, columns=None, where=None,
+        params=None, batch_size=1000, rows_per_sec=None, duty_cycle=None):
+    '''
+    Run the named backfill over table. See ADBI.backfill for a description of
+    the arguments.
+    '''
+    if (operation is None) == (function is None):
+        raise ValueError("Either an operation or a function is required")
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    key_columns = list(key_columns)
+    if operation is not None and len(key_columns) != 1:
+        raise ValueError("An operation can only be used with a single key column")
+    if operation is not None and where:
+        # The range of a batch also holds the rows excluded by the condition.
+        raise ValueError("An operation cannot be used with a where condition, use a function instead")
+    if operation is not None and params and not isinstance(params, dict):
+        raise ValueError("The params of an operation must be a mapping")
+    if duty_cycle is not None and not 0 < duty_cycle <= 1:
+        raise ValueError("The duty cycle must be greater than 0 and at most 1")
+    selected = key_columns + [column for column in columns or [] if column not in key_columns]
+    select = "SELECT {0} FROM {1}".format(', '.join(selected), table)
+    if where:
+        select += " WHERE " + where
+
+    variable = 'backfill:{0}'.format(name)
+    conn._validate_schema_table()
+    stored = conn.query("SELECT value FROM _schema_info WHERE variable = %s", (variable,))
+    key = [_decode_value(value) for value in json.loads(stored[0][0])] if stored else None
+
+    processed = 0
+    while True:
+        start = time.monotonic()
+        batch_operation, batch_params = _seek_operation(select, params, key_columns, key, batch_size, False)
+        rows = conn.query(batch_operation, batch_params)
+        if not rows:
+            break
+        try:
+            if operation is not None:
+                batch_params = dict(params or {}, start=rows[0][0], end=rows[-1][0])
+                conn.execute(operation, batch_params)
+            else:
+                function(conn, rows)
+            key = list(rows[-1][:len(key_columns)])
+            conn._set_schema_info(variable, json.dumps([_encode_value(value) for value in key]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        processed += len(rows)
+        if len(rows) < batch_size:
+            break
+        delay = throttle_delay(len(rows), time.monotonic() - start, rows_per_sec, duty_cycle)
+        if delay > 0:
+            time.sleep(delay)
+
+    conn.execute("DELETE FROM _schema_info WHERE variable = %s", (variable,))
+    conn.commit()
+    return processed
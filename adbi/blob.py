@@ -0,0 +1,95 @@
+'''
+Incremental access to large BLOB values.
+
+Where the driver supports incremental BLOB I/O (sqlite3 connections provide
+blobopen from Python 3.11) the driver's blob object is used directly. Other
+drivers fall back to ChunkedBlob which reads the value a chunk at a time using
+SUBSTR queries, so a value never has to be held in memory as a whole.
+'''
+import io
+
+
+class ChunkedBlob(io.RawIOBase):
+    '''
+    A read only, seekable file like object reading a BLOB value in chunks.
+    Positions are byte offsets from the start of the value.
+    '''
+
+    def __init__(self, adbi, table, column, key, key_column='rowid', chunk_size=65536):
+        '''
+        Initialize the blob reader. The length of the value is read
+        immediately, a SystemError is raised if the row does not exist.
+        '''
+        super().__init__()
+        self._adbi = adbi
+        self._chunk_size = chunk_size
+        self._key = key
+        self._position = 0
+        self._read_operation = "SELECT SUBSTR({0}, %s, %s) FROM {1} WHERE {2} = %s".format(
+            column, table, key_column)
+        curs = adbi.cursor()
+        try:
+            curs.execute("SELECT LENGTH({0}) FROM {1} WHERE {2} = %s".format(column, table, key_column), (key,))
+            row = curs.fetchone()
+        finally:
+            curs.close()
+        if row is None:
+            raise SystemError("No row found for the given key: {0}".format(key))
+        self._length = row[0] or 0
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        if offset < 0:
+            raise ValueError("Cannot seek before the start of the blob")
+        self._position = offset
+        return self._position
+
+    def readinto(self, buf):
+        '''
+        Read up to len(buf) bytes (at most one chunk) into buf, returning the
+        number of bytes read.
+        '''
+        size = min(len(buf), self._chunk_size, self._length - self._position)
+        if size <= 0:
+            return 0
+        curs = self._adbi.cursor()
+        try:
+            # SQL string positions start at 1.
+            curs.execute(self._read_operation, (self._position + 1, size, self._key))
+            data = curs.fetchone()[0]
+        finally:
+            curs.close()
+        size = len(data)
+        memoryview(buf)[:size] = data
+        self._position += size
+        return size
+
+    def write(self, data):
+        raise SystemError("Writing is only supported by drivers with incremental blob I/O")
+
+
+def open_blob(adbi, table, column, key, readonly=True, key_column='rowid', chunk_size=65536):
+    '''
+    Open the given BLOB value. See ADBI.open_blob for a description of the
+    arguments.
+    '''
+    if key_column == 'rowid' and hasattr(adbi.connection, 'blobopen'):
+        return adbi.connection.blobopen(table, column, key, readonly=readonly)
+    if not readonly:
+        raise SystemError("Writing is only supported by drivers with incremental blob I/O")
+    return ChunkedBlob(adbi, table, column, key, key_column, chunk_size)
@@ -0,0 +1,220 @@
+'''
+Chunked deletes, updates and upserts of rows identified by their key.
+
+Keys (or rows) are consumed as a stream and grouped into chunks sized to the
+parameter limit of the dialect, each chunk being applied with a single
+statement. Statements are built once per chunk size, so every full chunk
+reuses the same operation (and its cached translation). Very large sets may
+instead be loaded into a temporary table and applied with statements joining
+it, which is also how rows are upserted when the dialect has no native
+upsert.
+'''
+from collections.abc import Mapping
+from itertools import chain, islice
+
+
+TEMP_TABLE = '_adbi_bulk'
+
+
+def _chunks(iterator, size):
+    '''
+    Yield lists of up to size items taken from the iterator.
+    '''
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _chunk_size(conn, chunk_size, params_per_item):
+    '''
+    Return the number of items per chunk that keeps statements within the
+    parameter limit of the dialect.
+    '''
+    limit = max(1, conn.dialect.max_params // params_per_item)
+    return min(chunk_size, limit) if chunk_size else limit
+
+
+def _split_temp(iterator, temp_table_threshold):
+    '''
+    Return whether a temporary table should be used, along with an iterator
+    over all of the items.
+    '''
+    if temp_table_threshold is None:
+        return False, iterator
+    head = list(islice(iterator, temp_table_threshold + 1))
+    return len(head) > temp_table_threshold, chain(head, iterator)
+
+
+def _apply_chunks(conn, chunks, operation_for, params_for, commit_every):
+    '''
+    Execute one operation per chunk, committing every commit_every chunks
+    and once done. Returns the total number of rows affected.
+    '''
+    operations = {}
+    affected = 0
+    curs = conn.cursor()
+    try:
+        for count, chunk in enumerate(chunks, 1):
+            size = len(chunk)
+            if size not in operations:
+                operations[size] = operation_for(size)
+            curs.execute(operations[size], params_for(chunk))
+            affected += max(curs.rowcount, 0)
+            if commit_every and count % commit_every == 0:
+                conn.commit()
+        conn.commit()
+    finally:
+        curs.close()
+    return affected
+
+
+def _apply_temp_table(conn, table, key_columns, columns, rows, batch_size, operations):
+    '''
+    Load the rows (sequences of the key and column values) into a temporary
+    table, run the operations joining it and commit. Returns the number of
+    rows affected by the operations.
+    '''
+    names = key_columns + columns
+    curs = conn.cursor()
+    try:
+        curs.execute("CREATE TEMPORARY TABLE {0} AS SELECT {1} FROM {2} WHERE 1 = 0".format(
+            TEMP_TABLE, ', '.join(names), table))
+        insert = "INSERT INTO {0} ({1}) VALUES ({2})".format(
+            TEMP_TABLE, ', '.join(names), ', '.join(['%s'] * len(names)))
+        for chunk in _chunks(rows, batch_size):
+            curs.executemany(insert, chunk)
+        # Index once loaded, which is quicker than maintaining it.
+        curs.execute("CREATE INDEX {0}_key ON {0} ({1})".format(TEMP_TABLE, ', '.join(key_columns)))
+        affected = 0
+        for operation in operations:
+            curs.execute(operation)
+            affected += max(curs.rowcount, 0)
+        curs.execute("DROP TABLE {0}".format(TEMP_TABLE))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        try:
+            curs.execute("DROP TABLE {0}".format(TEMP_TABLE))
+        except Exception:
+            pass
+        raise
+    finally:
+        curs.close()
+    return affected
+
+
+def bulk_delete(conn, table, key_column, keys, chunk_size=None, commit_every=10, temp_table_threshold=None):
+    '''
+    Delete the rows of table with the given keys. See ADBI.bulk_delete for a
+    description of the arguments.
+    '''
+    size = _chunk_size(conn, chunk_size, 1)
+    use_temp, keys = _split_temp(iter(keys), temp_table_threshold)
+    if use_temp:
+        return _apply_temp_table(conn, table, [key_column], [], ([key] for key in keys), size,
+            ["DELETE FROM {0} WHERE {1} IN (SELECT {1} FROM {2})".format(table, key_column, TEMP_TABLE)])
+
+    def operation_for(count):
+        return "DELETE FROM {0} WHERE {1} IN ({2})".format(table, key_column, ', '.join(['%s'] * count))
+    return _apply_chunks(conn, _chunks(keys, size), operation_for, lambda chunk: chunk, commit_every)
+
+
+def _row_values(row, key_column, columns):
+    '''
+    Return the key followed by the column values of the given row.
+    '''
+    if isinstance(row, Mapping):
+        return [row[key_column]] + [row[column] for column in columns]
+    values = list(row)
+    if len(values) != len(columns) + 1:
+        raise ValueError("Expected the key and {0} values, got: {1}".format(len(columns), row))
+    return values
+
+
+def bulk_update(conn, table, key_column, rows, columns=None, chunk_size=None, commit_every=10,
+        temp_table_threshold=None):
+    '''
+    Update the rows of table identified by their key. See ADBI.bulk_update
+    for a description of the arguments.
+    '''
+    rows = iter(rows)
+    if columns is None:
+        first = next(rows, None)
+        if first is None:
+            return 0
+        if not isinstance(first, Mapping):
+            raise ValueError("Columns are required unless rows are mappings")
+        columns = [column for column in first if column != key_column]
+        rows = chain([first], rows)
+    columns = list(columns)
+    if not columns:
+        raise ValueError("At least one column to update is required")
+    rows = (_row_values(row, key_column, columns) for row in rows)
+
+    size = _chunk_size(conn, chunk_size, 2 * len(columns) + 1)
+    use_temp, rows = _split_temp(rows, temp_table_threshold)
+    if use_temp:
+        return _apply_temp_table(conn, table, [key_column], columns, rows, size,
+            [conn.dialect.temp_update_operation(table, TEMP_TABLE, [key_column], columns)])
+
+    def operation_for(count):
+        case = 'CASE {0} {1} END'.format(key_column, ' '.join(['WHEN %s THEN %s'] * count))
+        return "UPDATE {0} SET {1} WHERE {2} IN ({3})".format(
+            table, ', '.join('{0} = {1}'.format(column, case) for column in columns),
+            key_column, ', '.join(['%s'] * count))
+
+    def params_for(chunk):
+        params = []
+        for idex in range(len(columns)):
+            for values in chunk:
+                params.extend((values[0], values[idex + 1]))
+        params.extend(values[0] for values in chunk)
+        return params
+    return _apply_chunks(conn, _chunks(rows, size), operation_for, params_for, commit_every)
+
+
+def _named_values(row, names):
+    '''
+    Return the values of the named columns of the given row.
+    '''
+    if isinstance(row, Mapping):
+        return [row[name] for name in names]
+    values = list(row)
+    if len(values) != len(names):
+        raise ValueError("Expected {0} values, got: {1}".format(len(names), row))
+    return values
+
+
+def bulk_upsert(conn, table, key_columns, columns, rows, chunk_size=None, commit_every=10,
+        temp_table_threshold=None):
+    '''
+    Insert the rows into table, updating those whose key already exists. See
+    ADBI.bulk_upsert for a description of the arguments.
+    '''
+    key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+    columns = list(columns)
+    if not key_columns:
+        raise ValueError("At least one key column is required")
+    names = key_columns + columns
+    counted = [0]
+
+    def counting(rows):
+        for row in rows:
+            counted[0] += 1
+            yield _named_values(row, names)
+
+    rows = counting(rows)
+    size = _chunk_size(conn, chunk_size, len(names))
+    use_temp, rows = _split_temp(rows, temp_table_threshold)
+    if use_temp or conn.dialect.upsert_operation(table, key_columns, columns, 1) is None:
+        _apply_temp_table(conn, table, key_columns, columns, rows, size,
+            conn.dialect.temp_upsert_operations(table, TEMP_TABLE, key_columns, columns))
+        return counted[0]
+
+    def operation_for(count):
+        return conn.dialect.upsert_operation(table, key_columns, columns, count)
+    _apply_chunks(conn, _chunks(rows, size), operation_for, lambda chunk: list(chain(*chunk)),
+        commit_every)
+    return counted[0]
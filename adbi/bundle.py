@@ -0,0 +1,241 @@
+'''
+Squashed migrations and precompiled schema bundles.
+
+A schema bundle holds every schema file of a schema directory in a single
+JSON file. SQL files are stored already split into statements, Python files
+as source, each with a checksum that is verified when the bundle is loaded.
+ADBI.update_schema(bundle=...) applies the bundle without scanning or
+parsing the schema directory.
+
+squash_schema combines a contiguous range of versioned SQL files into the
+file of the last version of the range, removing the others. The squashed
+file records the range and a checksum of its statements.
+'''
+from pathlib import Path
+import hashlib
+import json
+import re
+
+
+BUNDLE_FORMAT = 1
+
+_squashed_re = re.compile(r'^-- adbi squashed (\S+) (\S+) sha256=([0-9a-f]{64})\n')
+_trigger_re = re.compile(r'^\s*CREATE\s+(?:TEMP\w*\s+)?TRIGGER\b', re.IGNORECASE)
+_dollar_re = re.compile(r'\$\w*\$')
+_word_re = re.compile(r'\w+')
+# Keywords opening and closing the blocks of a trigger body.
+_block_words = {'BEGIN': 1, 'CASE': 1, 'END': -1}
+
+
+def split_statements(script):
+    '''
+    Split an SQL script into its statements, without the trailing semicolon.
+    Quoted strings and identifiers, comments, PostgreSQL dollar quoting and
+    the bodies of triggers are taken into account. Comments are kept as part
+    of the statement that follows them.
+    '''
+    statements = []
+    start = 0
+    idex = 0
+    # The nesting of BEGIN and CASE blocks within the current statement.
+    depth = 0
+    length = len(script)
+    while idex < length:
+        char = script[idex]
+        if char in ('"', "'", '`'):
+            end = script.find(char, idex + 1)
+            # Doubled quotes are escapes, skipping them is the same as
+            # ending and restarting the quoted part.
+            if end < 0:
+                raise ValueError("Unterminated quoted string in script")
+            idex = end + 1
+        elif script.startswith('--', idex):
+            end = script.find('\n', idex)
+            idex = length if end < 0 else end + 1
+        elif script.startswith('/*', idex):
+            end = script.find('*/', idex + 2)
+            if end < 0:
+                raise ValueError("Unterminated comment in script")
+            idex = end + 2
+        elif char == '$' and _dollar_re.match(script, idex):
+            tag = _dollar_re.match(script, idex).group(0)
+            end = script.find(tag, idex + len(tag))
+            if end < 0:
+                raise ValueError("Unterminated dollar quoted string in script")
+            idex = end + len(tag)
+        elif char == ';':
+            idex += 1
+            statement = script[start:idex]
+            # Semicolons within a trigger body do not end the statement.
+            if depth > 0 and _trigger_re.match(_strip_comments(statement)):
+                continue
+            statements.append(statement[:-1].strip())
+            start = idex
+            depth = 0
+        elif char.isalnum() or char == '_':
+            word = _word_re.match(script, idex)
+            depth += _block_words.get(word.group(0).upper(), 0)
+            idex = word.end()
+        else:
+            idex += 1
+    statements.append(script[start:].strip())
+    return [statement for statement in statements if _strip_comments(statement)]
+
+
+def _strip_comments(statement):
+    '''
+    Return the statement without leading comments and whitespace.
+    '''
+    while True:
+        statement = statement.lstrip()
+        if statement.startswith('--'):
+            end = statement.find('\n')
+            statement = '' if end < 0 else statement[end + 1:]
+        elif statement.startswith('/*'):
+            end = statement.find('*/')
+            statement = '' if end < 0 else statement[end + 2:]
+        else:
+            return statement
+
+
+def checksum(statements):
+    '''
+    Return the checksum of the given statements (or Python source).
+    '''
+    if isinstance(statements, str):
+        statements = [statements]
+    digest = hashlib.sha256()
+    for statement in statements:
+        digest.update(statement.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _join_statements(statements):
+    '''
+    Return a script running the given statements.
+    '''
+    return ''.join(statement + ';\n' for statement in statements)
+
+
+def squashed_from(path):
+    '''
+    Return the first version squashed into the given SQL file, or None if
+    it is not a squashed file.
+    '''
+    with open(path) as schema_file:
+        match = _squashed_re.match(schema_file.readline())
+    return match.group(1) if match else None
+
+
+def read_schema_file(path):
+    '''
+    Return the statements of the given SQL file. The checksum of squashed
+    files is verified.
+    '''
+    text = Path(path).read_text()
+    match = _squashed_re.match(text)
+    statements = split_statements(text[match.end():] if match else text)
+    if match and checksum(statements) != match.group(3):
+        raise ValueError("Squashed schema file {0} has been modified".format(path))
+    return statements
+
+
+def _schema_file_version(name, schema_file_format):
+    '''
+    Return the version of the SQL or Python schema file with the given name,
+    or None if the name does not match schema_file_format. The Python format
+    is tried first as a format without a suffix would match it too.
+    '''
+    for file_format in (str(Path(schema_file_format).with_suffix('.py')), schema_file_format):
+        match = re.compile(file_format.format(version='(.*?)')).fullmatch(name)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _version_files(schema_dir, schema_file_format):
+    '''
+    Return a mapping of the versions found in schema_dir to their SQL and
+    Python files (in that order).
+    '''
+    versions = {}
+    for path in sorted(Path(schema_dir).iterdir()):
+        version = _schema_file_version(path.name, schema_file_format)
+        if version is not None:
+            versions.setdefault(version, []).append(path)
+    for paths in versions.values():
+        paths.sort(key=lambda path: path.suffix == '.py')
+    return versions
+
+
+def squash_schema(schema_dir, first_version, last_version, schema_file_format='schema-{version}.sql'):
+    '''
+    Combine the SQL files of every version from first_version to
+    last_version (inclusive) into the file of last_version and remove the
+    others. Ranges including Python files cannot be squashed. The combined
+    statements are verified against those of the original files before
+    anything is written. Databases at a version within the range must be
+    upgraded before squashing. Returns the path of the squashed file.
+    '''
+    versions = _version_files(schema_dir, schema_file_format)
+    selected = [version for version in sorted(versions)
+        if version != 'current' and first_version <= version <= last_version]
+    if not selected or selected[0] != first_version or selected[-1] != last_version:
+        raise ValueError("No schema files for versions {0} to {1}".format(first_version, last_version))
+    statements = []
+    paths = []
+    for version in selected:
+        for path in versions[version]:
+            if path.suffix == '.py':
+                raise ValueError("Python schema file {0} cannot be squashed".format(path))
+            statements.extend(read_schema_file(path))
+            paths.append(path)
+
+    body = _join_statements(statements)
+    if split_statements(body) != statements:
+        raise ValueError("Squashed statements do not match those of the original files")
+    text = '-- adbi squashed {0} {1} sha256={2}\n'.format(first_version, last_version, checksum(statements))
+    target = Path(schema_dir, schema_file_format.format(version=last_version))
+    target.write_text(text + body)
+    for path in paths:
+        if path != target:
+            path.unlink()
+    return target
+
+
+def build_bundle(schema_dir, path, schema_file_format='schema-{version}.sql'):
+    '''
+    Write a bundle of every schema file found in schema_dir to path. Returns
+    the bundle data.
+    '''
+    entries = []
+    for version, paths in sorted(_version_files(schema_dir, schema_file_format).items()):
+        for schema_file in paths:
+            entry = {'version': version, 'file': schema_file.name}
+            if schema_file.suffix == '.py':
+                source = schema_file.read_text()
+                entry.update(python=source, checksum=checksum(source))
+            else:
+                statements = read_schema_file(schema_file)
+                entry.update(statements=statements, checksum=checksum(statements))
+                match = _squashed_re.match(schema_file.read_text())
+                if match:
+                    entry['squashed_from'] = match.group(1)
+            entries.append(entry)
+    bundle = {'format': BUNDLE_FORMAT, 'schema_file_format': schema_file_format, 'entries': entries}
+    Path(path).write_text(json.dumps(bundle, indent=1))
+    return bundle
+
+
+def load_bundle(path):
+    '''
+    Load and verify the bundle written to path.
+    '''
+    bundle = json.loads(Path(path).read_text())
+    if bundle.get('format') != BUNDLE_FORMAT:
+        raise ValueError("Unsupported schema bundle format: {0}".format(bundle.get('format')))
+    for entry in bundle['entries']:
+        if checksum(entry.get('python', entry.get('statements'))) != entry['checksum']:
+            raise ValueError("Checksum mismatch for {0} in schema bundle {1}".format(entry['file'], path))
+    return bundle
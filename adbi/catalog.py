@@ -0,0 +1,201 @@
+'''
+A catalog of named queries.
+
+Queries are read from .sql files in which each query is preceded by a
+"-- name: <query_name>" line, optionally followed by comment lines describing
+it:
+
+    -- name: get_user
+    -- Return the user with the given id.
+    SELECT id, name FROM users WHERE id = %(id)s
+
+Queries use pyformat placeholders like any other operation. Placeholders are
+validated when the file is loaded and each query is translated once for the
+paramstyle of the connection. Loaded queries are available as callables on
+ADBI.queries, for example conn.queries.get_user(id=1).
+'''
+from pathlib import Path
+import re
+
+from adbi import ADBICursor, _is_read_operation, _translation_key
+
+
+_name_re = re.compile(r'^--\s*name:\s*(\S+)\s*$')
+_placeholder_re = re.compile(r'%(?:\((?P<name>[^)]*)\))?(?P<conversion>.?)', re.DOTALL)
+
+
+def parse_queries(text, source='<string>'):
+    '''
+    Return a list of (name, doc, operation) tuples for the queries found in
+    the given text.
+    '''
+    queries = []
+    current = None
+    for line in text.splitlines():
+        match = _name_re.match(line.strip())
+        if match:
+            current = [match.group(1), [], []]
+            queries.append(current)
+        elif current is None:
+            if line.strip() and not line.strip().startswith('--'):
+                raise ValueError("SQL found before the first query name in {0}".format(source))
+        elif line.strip().startswith('--') and not current[2]:
+            current[1].append(line.strip()[2:].strip())
+        else:
+            current[2].append(line)
+    result = []
+    for name, doc, lines in queries:
+        operation = '\n'.join(lines).strip().rstrip(';').strip()
+        if not operation:
+            raise ValueError("Query {0} in {1} has no SQL".format(name, source))
+        result.append((name, '\n'.join(doc), operation))
+    return result
+
+
+def placeholders(operation):
+    '''
+    Return the placeholder names used by the given pyformat operation, or the
+    number of positional placeholders. Raises a ValueError if the
+    placeholders are invalid or named and positional placeholders are mixed.
+    Operations without placeholders are executed as is, so they may hold a
+    literal % without escaping it.
+    '''
+    names = []
+    positional = 0
+    invalid = None
+    for match in _placeholder_re.finditer(operation):
+        name, conversion = match.group('name'), match.group('conversion')
+        if name is None and conversion == '%':
+            continue
+        if conversion != 's':
+            invalid = invalid or match.group(0)
+        elif name is None:
+            positional += 1
+        elif not name.isidentifier():
+            raise ValueError("Invalid placeholder name: {0!r}".format(name))
+        elif name not in names:
+            names.append(name)
+    if invalid and (names or positional):
+        raise ValueError("Invalid placeholder {0!r} (a literal % must be written as %%)".format(invalid))
+    if names and positional:
+        raise ValueError("Named and positional placeholders cannot be mixed")
+    return names if names else positional
+
+
+class Query:
+    '''
+    A named query, called with its parameters to run it on a pooled cursor.
+    Queries only reading from the database return all of the rows of the
+    result, others return the rowcount.
+    '''
+    __slots__ = ('name', 'operation', 'params', 'doc', 'read', '_adbi')
+
+    def __init__(self, adbi, name, operation, doc=''):
+        self._adbi = adbi
+        self.name = name
+        self.operation = operation
+        self.doc = doc
+        self.read = _is_read_operation(operation)
+        self.params = placeholders(operation)
+
+    def _bind(self, args, kwargs):
+        '''
+        Return the parameters to execute the query with.
+        '''
+        if isinstance(self.params, list):
+            if args:
+                raise TypeError("{0}() only takes keyword arguments".format(self.name))
+            missing = [name for name in self.params if name not in kwargs]
+            unknown = [name for name in kwargs if name not in self.params]
+            if missing or unknown:
+                raise TypeError("{0}() missing arguments {1}, unexpected arguments {2}".format(
+                    self.name, missing, unknown))
+            return kwargs
+        if kwargs:
+            raise TypeError("{0}() only takes positional arguments".format(self.name))
+        if len(args) != self.params:
+            raise TypeError("{0}() takes {1} arguments but {2} were given".format(
+                self.name, self.params, len(args)))
+        return args or None
+
+    def sample_params(self):
+        '''
+        Return parameters of the shape expected by the query.
+        '''
+        if isinstance(self.params, list):
+            return {name: None for name in self.params}
+        return [None] * self.params
+
+    def __call__(self, *args, **kwargs):
+        params = self._bind(args, kwargs)
+        if self.read:
+            return self._adbi.query(self.operation, params)
+        return self._adbi.execute(self.operation, params)
+
+    def __repr__(self):
+        return '<Query {0}>'.format(self.name)
+
+
+class QueryCatalog:
+    '''
+    The named queries loaded for an ADBI object, available as attributes.
+    '''
+
+    def __init__(self, adbi):
+        self._adbi = adbi
+        self._queries = {}
+
+    def load(self, path):
+        '''
+        Load the queries of the given .sql file, or of every .sql file in the
+        given directory. Returns the names of the queries loaded.
+        '''
+        path = Path(path)
+        paths = sorted(path.glob('*.sql')) if path.is_dir() else [path]
+        queries = {}
+        for query_file in paths:
+            for name, doc, operation in parse_queries(query_file.read_text(), query_file):
+                if not name.isidentifier() or name.startswith('_') or hasattr(type(self), name):
+                    raise ValueError("Invalid query name {0} in {1}".format(name, query_file))
+                if name in queries or name in self._queries:
+                    raise ValueError("Duplicate query name {0} in {1}".format(name, query_file))
+                queries[name] = Query(self._adbi, name, operation, doc)
+        for query in queries.values():
+            self._prepare(query)
+        self._queries.update(queries)
+        return list(queries)
+
+    def _prepare(self, query):
+        '''
+        Translate the query for the paramstyle of the connection.
+        '''
+        paramstyle = self._adbi.wrapped_db_param_style
+        params = query.sample_params()
+        translation = ADBICursor(None, paramstyle)._convert_operation_with_params(query.operation, params)
+        self._adbi._prepared[_translation_key(paramstyle, query.operation, params)] = translation
+
+    def names(self):
+        '''
+        Return the names of the loaded queries.
+        '''
+        return list(self._queries)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._queries[name]
+        except KeyError:
+            raise AttributeError("No query named {0}".format(name))
+
+    def __getitem__(self, name):
+        return self._queries[name]
+
+    def __contains__(self, name):
+        return name in self._queries
+
+    def __iter__(self):
+        return iter(self._queries.values())
+
+    def __len__(self):
+        return len(self._queries)
@@ -0,0 +1,125 @@
+'''
+Statement deadlines enforced by a shared timer thread.
+
+Each statement run with a timeout schedules the cancellation of its
+connection on a single timer thread shared by every connection of the
+process, rather than starting a thread per statement. If the statement is
+still running when its deadline passes, it is cancelled through the dialect
+of the connection (Dialect.cancel), which makes the driver raise an error in
+the thread running it. Statements completing in time remove their deadline.
+'''
+import heapq
+import itertools
+import os
+import threading
+import time
+
+
+class Deadline:
+    '''
+    The deadline of a single statement.
+    '''
+    __slots__ = ('when', 'callback', 'fired', 'done', '_lock')
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.fired = False
+        self.done = False
+        self._lock = threading.Lock()
+
+    def _fire(self):
+        '''
+        Run the callback unless the statement has already finished.
+        '''
+        with self._lock:
+            if self.done:
+                return
+            self.fired = True
+            try:
+                self.callback()
+            except Exception:
+                pass
+
+    def finish(self):
+        '''
+        Mark the statement as finished, so that it is no longer cancelled.
+        Returns True if the deadline had already passed and the statement
+        was cancelled.
+        '''
+        with self._lock:
+            self.done = True
+            return self.fired
+
+
+class DeadlineTimer:
+    '''
+    Runs the callbacks of deadlines when they pass, on a single thread
+    started when first needed.
+    '''
+    # Finished deadlines are left in the heap until it has grown to twice
+    # its size after the last removal of finished deadlines, and to at least
+    # this size.
+    _compact_after = 64
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._compacted_size = 0
+        self._thread = None
+
+    def schedule(self, seconds, callback):
+        '''
+        Call callback on the timer thread in the given number of seconds,
+        unless the returned Deadline is finished first.
+        '''
+        if self._pid != os.getpid():
+            # The timer thread of the parent process does not exist here.
+            self._reset()
+        deadline = Deadline(time.monotonic() + seconds, callback)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='adbi-deadlines', daemon=True)
+                self._thread.start()
+            if len(self._heap) >= max(self._compact_after, 2 * self._compacted_size):
+                self._compact()
+            heapq.heappush(self._heap, (deadline.when, next(self._counter), deadline))
+            if self._heap[0][2] is deadline:
+                self._cond.notify()
+        return deadline
+
+    def _compact(self):
+        '''
+        Remove finished deadlines from the heap, holding the lock.
+        '''
+        self._heap = [entry for entry in self._heap if not entry[2].done]
+        heapq.heapify(self._heap)
+        self._compacted_size = len(self._heap)
+
+    def _loop(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while True:
+                    if not self._heap:
+                        cond.wait()
+                        continue
+                    when, count, deadline = self._heap[0]
+                    if deadline.done:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = when - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    cond.wait(delay)
+            deadline._fire()
+
+
+# The timer shared by all connections.
+shared_timer = DeadlineTimer()
@@ -0,0 +1,301 @@
+'''
+Database specific behaviour that cannot be expressed in standard SQL.
+
+A Dialect object is selected for each ADBI object based on the module of the
+wrapped connection, in the same way the paramstyle is determined. Additional
+dialects may be added with register_dialect, or assigned directly to the
+dialect attribute of an ADBI object.
+'''
+import re
+import sqlite3
+
+
+def _key_match(key_columns, left, right):
+    '''
+    Return the condition matching the keys of the left and right tables.
+    '''
+    return ' AND '.join('{0}.{2} = {1}.{2}'.format(left, right, column) for column in key_columns)
+
+
+class Dialect:
+    '''
+    The generic dialect. Features that have no portable implementation are
+    reported as unsupported.
+    '''
+    name = 'generic'
+    # The most parameters that may be bound to a single statement.
+    max_params = 999
+    # Error messages indicating a failure due to lock contention.
+    _retryable_messages = ('deadlock', 'lock wait timeout', 'could not serialize', 'database is locked')
+
+    @classmethod
+    def for_connection(cls, conn):
+        '''
+        Return the dialect object to use for the given connection. Dialects
+        depending on the settings of the connection override this.
+        '''
+        return cls()
+
+    def is_retryable(self, error):
+        '''
+        Return True if the given error was caused by contention (locks,
+        deadlocks or serialization failures) so that the operation may
+        succeed if retried.
+        '''
+        message = str(error).lower()
+        return any(part in message for part in self._retryable_messages)
+
+    def explain(self, cursor, operation, params):
+        '''
+        Return the query plan for the given (already translated) operation as
+        a list of strings, or None if plans are not supported. The given
+        cursor is a cursor of the underlying database.
+        '''
+        return None
+
+    def full_scans(self, plan):
+        '''
+        Return the names (tables or aliases) that the given plan scans in
+        full.
+        '''
+        return []
+
+    def table_rows(self, cursor, table):
+        '''
+        Return the number of rows held in the given table.
+        '''
+        cursor.execute("SELECT COUNT(*) FROM {0}".format(table))
+        return cursor.fetchone()[0]
+
+    def reset_cursor(self, cursor):
+        '''
+        Prepare a cursor of the underlying database for reuse, returning
+        False if it cannot be reused. Executing the next operation discards
+        any previous result for most drivers, so nothing is done by default.
+        '''
+        return True
+
+    def cancel(self, connection):
+        '''
+        Cancel the statement running on the given connection of the
+        underlying database, called from another thread. Returns False if
+        statements cannot be cancelled. Drivers providing a cancel method on
+        their connections (such as psycopg2) are supported by default.
+        '''
+        if hasattr(connection, 'cancel'):
+            connection.cancel()
+            return True
+        return False
+
+    def upsert_operation(self, table, key_columns, columns, count):
+        '''
+        Return a pyformat operation inserting count rows of the key columns
+        followed by the columns into table, updating the columns of the rows
+        whose key already exists. Returns None if the database has no native
+        upsert, in which case rows are merged through a temporary table.
+        '''
+        return None
+
+    def temp_update_operation(self, table, temp_table, key_columns, columns):
+        '''
+        Return an UPDATE setting the columns of the rows of table to those of
+        the rows of temp_table (a temporary table) with the same key.
+        '''
+        match = _key_match(key_columns, temp_table, table)
+        assignments = ', '.join('{0} = (SELECT {0} FROM {1} WHERE {2})'.format(column, temp_table, match)
+            for column in columns)
+        return "UPDATE {0} SET {1} WHERE EXISTS (SELECT 1 FROM {2} WHERE {3})".format(
+            table, assignments, temp_table, match)
+
+    def temp_upsert_operations(self, table, temp_table, key_columns, columns):
+        '''
+        Return the operations inserting the rows of temp_table (a temporary
+        table) into table, updating the columns of the rows whose key
+        already exists.
+        '''
+        names = ', '.join(list(key_columns) + list(columns))
+        operations = [self.temp_update_operation(table, temp_table, key_columns, columns)] if columns else []
+        operations.append(
+            "INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE NOT EXISTS (SELECT 1 FROM {0} WHERE {3})".format(
+                table, names, temp_table, _key_match(key_columns, table, temp_table)))
+        return operations
+
+    def _values(self, table, names, count):
+        '''
+        Return an INSERT of count rows of the given columns.
+        '''
+        row = '({0})'.format(', '.join(['%s'] * len(names)))
+        return "INSERT INTO {0} ({1}) VALUES {2}".format(table, ', '.join(names), ', '.join([row] * count))
+
+    def _on_conflict(self, table, key_columns, columns, count):
+        '''
+        Return an INSERT ... ON CONFLICT DO UPDATE operation, as used by
+        PostgreSQL and sqlite.
+        '''
+        if not columns:
+            action = 'NOTHING'
+        else:
+            action = 'UPDATE SET ' + ', '.join('{0} = excluded.{0}'.format(column) for column in columns)
+        return "{0} ON CONFLICT ({1}) DO {2}".format(
+            self._values(table, list(key_columns) + list(columns), count), ', '.join(key_columns), action)
+
+
+class SQLiteDialect(Dialect):
+    '''
+    Dialect for the sqlite3 module.
+    '''
+    name = 'sqlite'
+    # The default limit of sqlite versions before 3.32.
+    max_params = 999
+    # Versions before 3.36 print SCAN TABLE followed by the name.
+    _scan_re = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+    def is_retryable(self, error):
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+    def explain(self, cursor, operation, params):
+        if params:
+            cursor.execute('EXPLAIN QUERY PLAN ' + operation, params)
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + operation)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def reset_cursor(self, cursor):
+        # A partially fetched statement keeps its read lock until it is
+        # reset, which happens when the cursor executes another statement.
+        cursor.execute('SELECT NULL WHERE 0')
+        return True
+
+    def cancel(self, connection):
+        connection.interrupt()
+        return True
+
+    def upsert_operation(self, table, key_columns, columns, count):
+        # Upserts were added in sqlite 3.24.
+        if sqlite3.sqlite_version_info < (3, 24, 0):
+            return None
+        return self._on_conflict(table, key_columns, columns, count)
+
+    def full_scans(self, plan):
+        scans = []
+        for detail in plan:
+            match = self._scan_re.match(detail)
+            if match and match.group(1) != 'CONSTANT':
+                scans.append(match.group(1))
+        return scans
+
+
+class PostgreSQLDialect(Dialect):
+    '''
+    Dialect for PostgreSQL drivers (psycopg2 and psycopg).
+    '''
+    name = 'postgresql'
+    max_params = 32767
+    _scan_re = re.compile(r'Seq Scan on (\w+)(?: (\w+))?')
+    # Serialization failure, deadlock detected and lock not available.
+    _retryable_states = ('40001', '40P01', '55P03')
+
+    def is_retryable(self, error):
+        state = getattr(error, 'pgcode', None) or getattr(error, 'sqlstate', None)
+        return state in self._retryable_states
+
+    def explain(self, cursor, operation, params):
+        if params:
+            cursor.execute('EXPLAIN ' + operation, params)
+        else:
+            cursor.execute('EXPLAIN ' + operation)
+        return [row[0] for row in cursor.fetchall()]
+
+    def upsert_operation(self, table, key_columns, columns, count):
+        return self._on_conflict(table, key_columns, columns, count)
+
+    def full_scans(self, plan):
+        scans = []
+        for line in plan:
+            match = self._scan_re.search(line)
+            if match:
+                scans.append(match.group(2) or match.group(1))
+        return scans
+
+
+class MySQLDialect(Dialect):
+    '''
+    Dialect for MySQL drivers (MySQLdb, pymysql and mysql.connector).
+    '''
+    name = 'mysql'
+    max_params = 65535
+    # Lock wait timeout and deadlock found.
+    _retryable_codes = (1205, 1213)
+
+    def is_retryable(self, error):
+        return bool(error.args) and error.args[0] in self._retryable_codes
+
+    def explain(self, cursor, operation, params):
+        if params:
+            cursor.execute('EXPLAIN ' + operation, params)
+        else:
+            cursor.execute('EXPLAIN ' + operation)
+        names = [column[0] for column in cursor.description]
+        return [
+            '{0}: {1}'.format(row[names.index('table')], row[names.index('type')])
+            for row in cursor.fetchall()
+        ]
+
+    def full_scans(self, plan):
+        return [line.split(':')[0] for line in plan if line.endswith(': ALL')]
+
+    def temp_update_operation(self, table, temp_table, key_columns, columns):
+        # A temporary table may only be opened once per statement.
+        return "UPDATE {0} JOIN {1} ON {2} SET {3}".format(table, temp_table,
+            _key_match(key_columns, temp_table, table),
+            ', '.join('{0}.{2} = {1}.{2}'.format(table, temp_table, column) for column in columns))
+
+    def temp_upsert_operations(self, table, temp_table, key_columns, columns):
+        names = ', '.join(list(key_columns) + list(columns))
+        return ["INSERT INTO {0} ({1}) SELECT {1} FROM {2} {3}".format(
+            table, names, temp_table, self._on_duplicate(key_columns, columns))]
+
+    def upsert_operation(self, table, key_columns, columns, count):
+        return "{0} {1}".format(self._values(table, list(key_columns) + list(columns), count),
+            self._on_duplicate(key_columns, columns))
+
+    def _on_duplicate(self, key_columns, columns):
+        '''
+        Return the ON DUPLICATE KEY UPDATE clause of an upsert.
+        '''
+        # Setting a key column to itself leaves existing rows unchanged.
+        updates = columns or key_columns[:1]
+        return "ON DUPLICATE KEY UPDATE {0}".format(', '.join('{0} = VALUES({0})'.format(column) for column in updates))
+
+
+# Driver module name to the dialect used for its connections.
+DIALECTS = {
+    'sqlite3': SQLiteDialect,
+    'psycopg2': PostgreSQLDialect,
+    'psycopg': PostgreSQLDialect,
+    'MySQLdb': MySQLDialect,
+    'pymysql': MySQLDialect,
+    'mysql.connector': MySQLDialect,
+}
+
+
+def register_dialect(module_name, dialect_class):
+    '''
+    Use the given Dialect class for connections created by the named driver
+    module.
+    '''
+    DIALECTS[module_name] = dialect_class
+
+
+def dialect_for(conn):
+    '''
+    Return a Dialect object for the given connection. The module of the
+    connection class and each of its parent modules are checked in turn.
+    '''
+    parts = conn.__class__.__module__.split('.')
+    for parts_used in range(len(parts), 0, -1):
+        module_name = '.'.join(parts[:parts_used])
+        if module_name in DIALECTS:
+            return DIALECTS[module_name].for_connection(conn)
+    return Dialect()
@@ -0,0 +1,145 @@
+'''
+Streaming export of query results to CSV or JSON lines files.
+
+Rows are pulled from the cursor in fetchmany sized batches, serialised into a
+single buffer per batch and written out with one bulk write, so the memory
+used is bounded by the batch size rather than the size of the result set.
+'''
+from collections import namedtuple
+from pathlib import Path
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import time
+
+
+FORMATS = ('csv', 'jsonl')
+
+# Compression name to the function wrapping a binary file object.
+COMPRESSORS = {
+    'gzip': lambda fileobj: gzip.GzipFile(fileobj=fileobj, mode='wb'),
+    'bz2': lambda fileobj: bz2.BZ2File(fileobj, mode='wb'),
+    'xz': lambda fileobj: lzma.LZMAFile(fileobj, mode='wb'),
+}
+
+# File suffixes used to pick a compression when exporting to a path.
+SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+ExportStats = namedtuple('ExportStats', ['rows', 'bytes', 'seconds', 'rows_per_sec'])
+
+
+class _CountingWriter(io.RawIOBase):
+    '''
+    A binary writer counting the bytes passed through to the wrapped file
+    object.
+    '''
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.count = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._fileobj.write(data)
+        self.count += len(data)
+        return len(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+def _format_csv(names, rows):
+    '''
+    Return the CSV text for the given batch of rows.
+    '''
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+
+def _format_jsonl(names, rows):
+    '''
+    Return the JSON lines text for the given batch of rows. Each row is
+    written as an object keyed by column name.
+    '''
+    return ''.join(
+        json.dumps(dict(zip(names, row)), default=str) + '\n' for row in rows
+    )
+
+
+def export_cursor(curs, dest, format='csv', batch_size=1000, compression=None, header=True,
+        encoding='utf-8'):
+    '''
+    Stream the remaining rows of the given cursor to dest. See
+    ADBICursor.export for a description of the arguments.
+    '''
+    if format not in FORMATS:
+        raise ValueError("Unknown export format: {0}".format(format))
+    if curs.description is None:
+        raise SystemError("The cursor does not have a result set to export")
+    names = [column[0] for column in curs.description]
+    formatter = _format_csv if format == 'csv' else _format_jsonl
+
+    if compression and compression not in COMPRESSORS:
+        raise ValueError("Unknown compression: {0}".format(compression))
+
+    close = []
+    if isinstance(dest, (str, Path)):
+        dest = Path(dest)
+        if compression is None:
+            compression = SUFFIXES.get(dest.suffix)
+        dest = open(dest, 'wb')
+        close.append(dest)
+
+    if isinstance(dest, io.TextIOBase):
+        if compression:
+            raise ValueError("Compression requires a binary destination")
+        counter = None
+        out = dest
+    else:
+        counter = _CountingWriter(dest)
+        # Closed before the destination, so that it is not flushed once the
+        # destination has been closed.
+        close.insert(0, counter)
+        out = counter
+        if compression:
+            out = COMPRESSORS[compression](counter)
+            close.insert(0, out)
+
+    start = time.perf_counter()
+    rows = 0
+    written = 0
+
+    def write(data):
+        nonlocal written
+        if counter is None:
+            out.write(data)
+            written += len(data.encode(encoding))
+        else:
+            out.write(data.encode(encoding))
+
+    try:
+        # Only CSV files carry a header, JSON lines are keyed by name.
+        if header and format == 'csv':
+            write(_format_csv(names, [names]))
+        while True:
+            batch = curs.fetchmany(batch_size)
+            if not batch:
+                break
+            rows += len(batch)
+            write(formatter(names, batch))
+        out.flush()
+    finally:
+        for fileobj in close:
+            fileobj.close()
+    if counter is not None:
+        written = counter.count
+
+    seconds = time.perf_counter() - start
+    return ExportStats(rows, written, seconds, rows / seconds if seconds else 0.0)
@@ -0,0 +1,189 @@
+'''
+Streaming import of CSV and JSON lines files into a table.
+
+The file is read in chunks of whole records which are parsed (optionally on a
+pool of worker processes) and inserted with executemany. Work is committed
+periodically and the file offset of the last commit may be recorded in a
+checkpoint file so that an interrupted import can be resumed.
+'''
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import csv
+import io
+import json
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+def _parse_chunk(format, data, columns, encoding, positions=None):
+    '''
+    Parse a chunk of raw records into a list of row tuples. CSV values are
+    taken from the given positions when the columns are ordered differently
+    in the file. This is a module level function so that it can be sent to
+    worker processes.
+    '''
+    text = data.decode(encoding)
+    if format == 'csv':
+        if positions is None:
+            return [tuple(row) for row in csv.reader(io.StringIO(text)) if row]
+        return [tuple(row[idex] for idex in positions) for row in csv.reader(io.StringIO(text)) if row]
+    rows = []
+    for line in text.splitlines():
+        if line.strip():
+            record = json.loads(line)
+            rows.append(tuple(record.get(column) for column in columns))
+    return rows
+
+
+def _read_record(import_file):
+    '''
+    Read a single record from the file. CSV records may span several lines
+    when a quoted value holds a new line, this is detected by an unbalanced
+    number of quote characters.
+    '''
+    record = import_file.readline()
+    while record and record.count(b'"') % 2:
+        line = import_file.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def _read_chunks(import_file, batch_size):
+    '''
+    Yield (end_offset, data) tuples holding batch_size records each.
+    '''
+    while True:
+        records = []
+        while len(records) < batch_size:
+            record = _read_record(import_file)
+            if not record:
+                break
+            records.append(record)
+        if not records:
+            return
+        yield import_file.tell(), b''.join(records)
+
+
+def _insert_operation(table, columns, rows_per_statement):
+    '''
+    Return a pyformat INSERT operation for the given number of rows.
+    '''
+    values = '({0})'.format(', '.join(['%s'] * len(columns)))
+    return 'INSERT INTO {0} ({1}) VALUES {2}'.format(
+        table, ', '.join(columns), ', '.join([values] * rows_per_statement))
+
+
+def _insert_rows(curs, table, columns, rows, rows_per_statement):
+    '''
+    Insert the given rows, grouping rows_per_statement rows into each
+    multi-row INSERT statement.
+    '''
+    if rows_per_statement <= 1:
+        curs.executemany(_insert_operation(table, columns, 1), rows)
+        return
+    full = len(rows) - len(rows) % rows_per_statement
+    if full:
+        groups = [
+            [value for row in rows[idex:idex + rows_per_statement] for value in row]
+            for idex in range(0, full, rows_per_statement)
+        ]
+        curs.executemany(_insert_operation(table, columns, rows_per_statement), groups)
+    if full < len(rows):
+        remaining = rows[full:]
+        curs.execute(_insert_operation(table, columns, len(remaining)),
+            [value for row in remaining for value in row])
+
+
+def import_file(conn, table, path, columns=None, format='csv', batch_size=1000, commit_every=10,
+        workers=None, checkpoint=None, rows_per_statement=1, header=True, encoding='utf-8'):
+    '''
+    Import the given file into table. See ADBI.import_file for a description
+    of the arguments.
+    '''
+    if format not in FORMATS:
+        raise ValueError("Unknown import format: {0}".format(format))
+    path = Path(path)
+    checkpoint = Path(checkpoint) if checkpoint else None
+
+    positions = None
+    with open(path, 'rb') as import_file:
+        # Determine the columns and where the data starts.
+        if format == 'csv' and header:
+            names = _parse_chunk(format, _read_record(import_file), None, encoding)
+            if columns is None and names:
+                columns = list(names[0])
+            elif columns is not None and names and list(names[0]) != list(columns):
+                # Values are matched to the columns by their header name.
+                missing = [column for column in columns if column not in names[0]]
+                if missing:
+                    raise ValueError("Columns {0} are not in the CSV header".format(missing))
+                positions = [names[0].index(column) for column in columns]
+        elif format == 'csv' and columns is None:
+            raise ValueError("The columns are required to import a CSV file without a header")
+        elif columns is None:
+            first = import_file.readline()
+            if first.strip():
+                columns = list(json.loads(first.decode(encoding)))
+            import_file.seek(0)
+        if not columns:
+            raise ValueError("Unable to determine the columns to import")
+
+        imported = 0
+        if checkpoint and checkpoint.exists():
+            state = json.loads(checkpoint.read_text())
+            import_file.seek(state['offset'])
+            imported = state['rows']
+
+        executor = ProcessPoolExecutor(workers) if workers else None
+        # Parsed (or pending) chunks, bounded so that memory use is capped.
+        pending = deque()
+        batches = 0
+        curs = conn.cursor()
+        try:
+            chunks = _read_chunks(import_file, batch_size)
+            while True:
+                while len(pending) < (2 * workers if workers else 1):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    offset, data = chunk
+                    if executor:
+                        pending.append((offset, executor.submit(_parse_chunk, format, data, columns, encoding,
+                            positions)))
+                    else:
+                        pending.append((offset, _parse_chunk(format, data, columns, encoding, positions)))
+                if not pending:
+                    break
+
+                offset, rows = pending.popleft()
+                if executor:
+                    rows = rows.result()
+                if rows:
+                    _insert_rows(curs, table, columns, rows, rows_per_statement)
+                imported += len(rows)
+                batches += 1
+                if batches % commit_every == 0:
+                    conn.commit()
+                    if checkpoint:
+                        checkpoint.write_text(json.dumps({'offset': offset, 'rows': imported}))
+            conn.commit()
+        except BaseException:
+            # Batches inserted since the last commit are imported again when
+            # resuming from the checkpoint.
+            conn.rollback()
+            raise
+        finally:
+            curs.close()
+            if executor:
+                # Chunks not yet parsed are not needed anymore.
+                for offset, future in pending:
+                    future.cancel()
+                executor.shutdown()
+
+    if checkpoint and checkpoint.exists():
+        checkpoint.unlink()
+    return imported
@@ -0,0 +1,148 @@
+'''
+Incremental refreshing of query results using a watermark column.
+
+An IncrementalQuery keeps the rows of a query in memory, keyed by their key
+columns. Rather than running the whole query again, each refresh only fetches
+the rows whose watermark (a column such as updated_at or a row id that is
+increased whenever a row is inserted or changed) is past the last one seen,
+merging them into the result. Changes are fetched in batches, in watermark
+order, so that catching up on many changes does not need a single large
+result.
+
+When named, the position reached is stored in the _schema_info table so that
+a new process (such as a downstream sync job) continues from where the last
+one stopped. The in memory result then only holds the rows changed since.
+'''
+import json
+
+from adbi.paging import _decode_value, _encode_value, _seek_operation
+
+
+class IncrementalQuery:
+    '''
+    The rows of a query, refreshed incrementally using a watermark column.
+    Rows are available by key, and iterating over the object yields every
+    row.
+    '''
+
+    def __init__(self, conn, operation, watermark, key_columns='id', params=None, name=None, batch_size=1000):
+        '''
+        :param conn: the ADBI object used to run the query.
+        :param operation: the pyformat query, with optional params.
+        :param watermark: the column of the result increased whenever a row
+            is inserted or changed. Values must be assigned in commit order,
+            rows committed with a watermark below one already seen are
+            missed.
+        :param key_columns: the column (or columns) identifying the rows.
+        :param name: the name under which the position reached is stored,
+            or None to keep it in memory only.
+        :param batch_size: the most rows fetched per statement.
+        '''
+        self._conn = conn
+        self.operation = operation
+        self.params = params
+        self.watermark = watermark
+        self.key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+        self.name = name
+        self.batch_size = batch_size
+        # Rows are ordered by the watermark then the key, so that rows
+        # sharing a watermark are never skipped between batches.
+        self._seek_columns = [watermark] + [column for column in self.key_columns if column != watermark]
+        self._indexes = None
+        self.rows = {}
+        self.position = None
+        if name is not None:
+            conn._validate_schema_table()
+            stored = conn.query("SELECT value FROM _schema_info WHERE variable = %s", (self._variable,))
+            if stored:
+                self.position = [_decode_value(value) for value in json.loads(stored[0][0])]
+
+    @property
+    def _variable(self):
+        return 'incremental:{0}'.format(self.name)
+
+    @property
+    def last_watermark(self):
+        '''
+        The watermark of the last row fetched, or None.
+        '''
+        return self.position[0] if self.position else None
+
+    def _find_indexes(self, description):
+        '''
+        Return the indexes of the seek and key columns in the result.
+        '''
+        # The query has already been ordered by these columns, so they are
+        # known to be part of the result.
+        names = [column[0].lower() for column in description]
+        return ([names.index(column.lower()) for column in self._seek_columns],
+            [names.index(column.lower()) for column in self.key_columns])
+
+    def _key(self, row):
+        '''
+        Return the key of the given row.
+        '''
+        key_indexes = self._indexes[1]
+        if len(key_indexes) == 1:
+            return row[key_indexes[0]]
+        return tuple(row[idex] for idex in key_indexes)
+
+    def refresh(self):
+        '''
+        Fetch the rows inserted or changed since the last refresh, merging
+        them into the result. Returns the rows fetched, in watermark order.
+        Rows deleted from the database are not detected, so deletions should
+        be recorded by changing a column of the row instead.
+        '''
+        conn = self._conn
+        in_transaction = conn.in_transaction
+        changed = []
+        curs = conn.cursor()
+        try:
+            while True:
+                operation, params = _seek_operation(self.operation, self.params, self._seek_columns,
+                    self.position, self.batch_size, False)
+                curs.execute(operation, params)
+                if self._indexes is None:
+                    self._indexes = self._find_indexes(curs.description)
+                rows = curs.fetchall()
+                for row in rows:
+                    self.rows[self._key(row)] = row
+                changed.extend(rows)
+                if rows:
+                    self.position = [rows[-1][idex] for idex in self._indexes[0]]
+                if len(rows) < self.batch_size:
+                    break
+        finally:
+            curs.close()
+
+        if self.name is not None and changed:
+            conn._set_schema_info(self._variable, json.dumps([_encode_value(value) for value in self.position]))
+            if not in_transaction:
+                conn.commit()
+        return changed
+
+    def reset(self):
+        '''
+        Forget the rows and the position reached, including any stored
+        position, so that the next refresh fetches every row.
+        '''
+        self.rows.clear()
+        self.position = None
+        if self.name is not None:
+            in_transaction = self._conn.in_transaction
+            self._conn.execute("DELETE FROM _schema_info WHERE variable = %s", (self._variable,))
+            if not in_transaction:
+                self._conn.commit()
+
+    def __getitem__(self, key):
+        return self.rows[key]
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.rows.values())
+
+    def __len__(self):
+        return len(self.rows)
@@ -0,0 +1,174 @@
+'''
+Parallel loading of rows over several connections.
+
+The input rows are split into numbered batches which are spread over a number
+of connections, each used by its own thread to executemany the batches it is
+given and commit periodically. An optional prepare function converts each
+input row into its parameters, on a pool of worker processes when workers is
+given, so that CPU bound preparation is not limited to a single core.
+
+Batches are handed over through a bounded queue, so the input is only read as
+fast as the connections can load it. Failed batches are reported in batch
+order, every other batch is kept.
+'''
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+import queue
+import threading
+import time
+
+from adbi import ADBI
+
+
+LoadStats = namedtuple('LoadStats', ['rows', 'batches', 'seconds', 'rows_per_sec', 'errors'])
+
+# Marker telling a loading thread that no more batches will be queued.
+_DONE = object()
+
+
+def _prepare_batch(prepare, batch):
+    '''
+    Return the parameters for each of the rows of the batch.
+    '''
+    return [prepare(row) for row in batch]
+
+
+class _Loader:
+    '''
+    The state shared by the loading threads.
+    '''
+
+    def __init__(self, factory, operation, paramstyle, commit_every, stop_on_error):
+        self.factory = factory
+        self.operation = operation
+        self.paramstyle = paramstyle
+        self.commit_every = commit_every
+        self.stop_on_error = stop_on_error
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.batches = 0
+        self.errors = []
+
+    def _fail(self, index, error):
+        with self.lock:
+            self.errors.append((index, error))
+        if self.stop_on_error:
+            self.stop.set()
+
+    def _commit(self, conn, pending):
+        '''
+        Commit the pending batches, counting them as loaded.
+        '''
+        conn.commit()
+        with self.lock:
+            self.rows += sum(len(batch) for batch in pending)
+            self.batches += len(pending)
+        pending.clear()
+
+    def run(self, work):
+        '''
+        Load the batches taken from the work queue on a new connection.
+        '''
+        conn = None
+        pending = []
+        try:
+            conn = ADBI(self.factory(), self.paramstyle)
+            curs = conn.cursor()
+            while True:
+                item = work.get()
+                if item is _DONE:
+                    break
+                index, batch = item
+                if self.stop.is_set():
+                    continue
+                try:
+                    if isinstance(batch, Future):
+                        batch = batch.result()
+                    if batch:
+                        curs.executemany(self.operation, list(batch))
+                except Exception as err:
+                    self._fail(index, err)
+                    # Replay the batches lost by rolling back the failed one.
+                    conn.rollback()
+                    for done in pending:
+                        curs.executemany(self.operation, list(done))
+                    continue
+                pending.append(batch)
+                if len(pending) >= self.commit_every:
+                    self._commit(conn, pending)
+            if pending:
+                self._commit(conn, pending)
+            curs.close()
+        except Exception as err:
+            # The connection itself failed, which is reported before the
+            # errors of any batch.
+            self._fail(-1, err)
+            self.stop.set()
+            # Keep draining so that the producer is never blocked.
+            while work.get() is not _DONE:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def parallel_load(factory, operation, rows, connections=4, batch_size=1000, commit_every=10, prepare=None,
+        workers=None, paramstyle=None, queue_size=None, stop_on_error=True):
+    '''
+    Load rows using executemany of the given pyformat operation over several
+    connections.
+    :param factory: function returning a new database connection, called
+        once per loading thread.
+    :param rows: an iterable of rows, consumed as a stream.
+    :param connections: the number of connections (and threads) loading.
+    :param commit_every: number of batches each connection loads between
+        commits.
+    :param prepare: function converting an input row to its parameters. It
+        must be picklable when workers is given.
+    :param workers: number of processes used to run prepare.
+    :param queue_size: the most batches read ahead of the connections.
+        Defaults to two per connection.
+    :param stop_on_error: stop at the first failed batch and raise the error
+        of the earliest failed batch once every connection has stopped.
+        Otherwise loading continues and the errors are returned.
+    Returns a LoadStats tuple of the rows and batches loaded, the time taken,
+    the resulting rows per second and a list of (batch index, error) tuples
+    in batch order.
+    '''
+    if connections < 1:
+        raise ValueError("At least one connection is required")
+    start = time.perf_counter()
+    loader = _Loader(factory, operation, paramstyle, commit_every, stop_on_error)
+    work = queue.Queue(maxsize=queue_size or 2 * connections)
+    threads = [threading.Thread(target=loader.run, args=(work,), daemon=True) for count in range(connections)]
+    for thread in threads:
+        thread.start()
+    executor = ProcessPoolExecutor(workers) if prepare and workers else None
+    try:
+        iterator = iter(rows)
+        index = 0
+        while not loader.stop.is_set():
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            if executor:
+                batch = executor.submit(_prepare_batch, prepare, batch)
+            elif prepare:
+                batch = _prepare_batch(prepare, batch)
+            work.put((index, batch))
+            index += 1
+    finally:
+        for thread in threads:
+            work.put(_DONE)
+        for thread in threads:
+            thread.join()
+        if executor:
+            executor.shutdown()
+
+    seconds = time.perf_counter() - start
+    errors = sorted(loader.errors, key=lambda error: error[0])
+    if errors and stop_on_error:
+        raise errors[0][1]
+    return LoadStats(loader.rows, loader.batches, seconds, loader.rows / seconds if seconds else 0.0, errors)
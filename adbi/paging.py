@@ -0,0 +1,153 @@
+'''
+Keyset (seek) pagination of query results.
+
+The query is wrapped in a sub-query, ordered by the key columns and limited
+to a page of rows. Instead of skipping rows with OFFSET, every following page
+selects only the rows sorting after the last key of the previous page, so
+each page costs the same as the first when the key is indexed. The last key
+of a page is also returned as an opaque token that can be used to resume
+pagination later.
+'''
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+import base64
+import json
+
+
+Page = namedtuple('Page', ['rows', 'token'])
+
+
+def _encode_value(value):
+    '''
+    Return a JSON serialisable form of a key or watermark value.
+    '''
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    return value
+
+
+def _parse_datetime(text):
+    '''
+    Return the datetime written by datetime.isoformat. The UTC offset is
+    written with a colon, which strptime only accepts from Python 3.7.
+    '''
+    offset = ''
+    if len(text) > 19 and text[-6] in '+-':
+        text, offset = text[:-6], text[-6:].replace(':', '')
+    date_format = '%Y-%m-%dT%H:%M:%S' + ('.%f' if '.' in text else '') + ('%z' if offset else '')
+    return datetime.strptime(text + offset, date_format)
+
+
+def _decode_value(value):
+    '''
+    Return the key or watermark value encoded by _encode_value.
+    '''
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return _parse_datetime(value['datetime'])
+        if 'decimal' in value:
+            return Decimal(value['decimal'])
+        return datetime.strptime(value['date'], '%Y-%m-%d').date()
+    return value
+
+
+def encode_token(key):
+    '''
+    Return the token resuming pagination after the given key values.
+    '''
+    data = json.dumps([_encode_value(value) for value in key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_token(token):
+    '''
+    Return the key values held by the given token.
+    '''
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        if not isinstance(key, list):
+            raise ValueError()
+        return [_decode_value(value) for value in key]
+    except (ArithmeticError, KeyError, ValueError):
+        raise ValueError("Invalid pagination token: {0}".format(token))
+
+
+def _seek_operation(operation, params, key_columns, key, page_size, descending):
+    '''
+    Return the operation and parameters selecting the page following the
+    given key values (or the first page if key is None).
+    '''
+    order = ' DESC' if descending else ''
+    compare = '<' if descending else '>'
+    if not params and key is not None:
+        # A literal % is only escaped by the caller when passing params.
+        operation = operation.replace('%', '%%')
+    named = isinstance(params, dict)
+    params = dict(params) if named else list(params or ())
+    where = ''
+    if key is not None:
+        placeholders = []
+        for idex, value in enumerate(key):
+            if named:
+                name = '_page_key{0}'.format(idex)
+                params[name] = value
+                placeholders.append('%({0})s'.format(name))
+            else:
+                placeholders.append('%s')
+        # Expand (a, b) > (x, y) as a > x OR (a = x AND b > y) which every
+        # database supports.
+        terms = []
+        for idex, column in enumerate(key_columns):
+            parts = ['{0} = {1}'.format(key_columns[prev], placeholders[prev]) for prev in range(idex)]
+            parts.append('{0} {1} {2}'.format(column, compare, placeholders[idex]))
+            terms.append('(' + ' AND '.join(parts) + ')')
+        where = ' WHERE ' + ' OR '.join(terms)
+        if not named:
+            for idex in range(len(key_columns)):
+                params.extend(key[:idex + 1])
+    operation = 'SELECT * FROM ({0}) _page{1} ORDER BY {2} LIMIT {3}'.format(
+        operation.strip().rstrip(';'), where,
+        ', '.join(column + order for column in key_columns), int(page_size))
+    return operation, params
+
+
+def paginate_cursor(cursor, operation, params, key_columns, page_size, token=None, descending=False):
+    '''
+    Yield Page tuples of the rows of operation using the given cursor, see
+    ADBICursor.paginate.
+    '''
+    if isinstance(key_columns, str):
+        key_columns = [key_columns]
+    # Outside of the sub-query columns are only known by their own name.
+    key_columns = [column.split('.')[-1] for column in key_columns]
+    if not key_columns:
+        raise ValueError("At least one key column is required")
+    if page_size < 1:
+        raise ValueError("The page size must be at least 1")
+    key = decode_token(token) if token is not None else None
+    if key is not None and len(key) != len(key_columns):
+        raise ValueError("Pagination token does not match the key columns")
+    positions = None
+    while True:
+        page_operation, page_params = _seek_operation(
+            operation, params, key_columns, key, page_size, descending)
+        cursor.execute(page_operation, page_params)
+        if positions is None:
+            names = [column[0].lower() for column in cursor.description]
+            try:
+                positions = [names.index(column.lower()) for column in key_columns]
+            except ValueError:
+                raise ValueError("Key columns {0} must be selected by the operation".format(key_columns))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        key = [rows[-1][position] for position in positions]
+        if len(rows) < page_size:
+            yield Page(rows, None)
+            return
+        yield Page(rows, encode_token(key))
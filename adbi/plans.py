@@ -0,0 +1,160 @@
+'''
+Query plan capture and a simple missing index advisor.
+
+When plan capture is enabled on an ADBI object, the plan of each distinct
+statement is captured through the connection's dialect the first time it is
+executed. Plans that scan large tables in full are flagged and an index on the
+columns used by the WHERE clause is suggested, so that missing indexes show up
+while testing rather than in production.
+'''
+from collections import namedtuple
+import re
+import threading
+import time
+
+from adbi import fingerprint
+
+
+PlanEntry = namedtuple('PlanEntry', ['fingerprint', 'operation', 'plan', 'full_scans', 'suggestions'])
+
+# Tables (and optional aliases) referenced by an operation.
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+([\w.]+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+# Words that may follow a table name but are not an alias.
+_NOT_ALIAS = {
+    'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'OUTER', 'NATURAL', 'ON', 'USING',
+    'SET', 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'UNION', 'VALUES', 'SELECT', 'DEFAULT',
+}
+_WHERE_RE = re.compile(r'\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|$)', re.I | re.S)
+_PREDICATE_RE = re.compile(
+    r'(?:(\w+)\.)?([A-Za-z_]\w*)\s*(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)', re.I)
+
+
+def _table_aliases(operation):
+    '''
+    Return a mapping of the names used to refer to tables in the operation to
+    the table names.
+    '''
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(operation):
+        aliases[table] = table
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def _where_columns(operation, name, table, single_table):
+    '''
+    Return the columns of the given table compared in the WHERE clause, in
+    the order they first appear.
+    '''
+    match = _WHERE_RE.search(operation)
+    if not match:
+        return []
+    columns = []
+    for prefix, column in _PREDICATE_RE.findall(match.group(1)):
+        if prefix in (name, table) or (not prefix and single_table):
+            if column.upper() not in ('AND', 'OR', 'NOT') and column not in columns:
+                columns.append(column)
+    return columns
+
+
+class PlanAdvisor:
+    '''
+    Captures and caches the plans of statements executed through an ADBI
+    object, keyed by statement fingerprint.
+    '''
+
+    def __init__(self, adbi, large_table_rows=1000, retry_failed_after=60):
+        '''
+        Initialize the advisor.
+        :param large_table_rows: tables holding at least this many rows are
+            considered large, full scans of smaller tables are not flagged.
+        :param retry_failed_after: seconds after which the plan of a
+            statement that could not be explained is captured again, for
+            instance once the tables it uses have been created.
+        '''
+        self._adbi = adbi
+        self.large_table_rows = large_table_rows
+        self.retry_failed_after = retry_failed_after
+        self.plans = {}
+        self._table_rows = {}
+        # The time at which each statement that could not be explained was
+        # last tried.
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _is_large(self, cursor, table):
+        '''
+        Return True if the given table holds at least large_table_rows rows.
+        Table sizes are only read once they could be read.
+        '''
+        if table not in self._table_rows:
+            try:
+                self._table_rows[table] = self._adbi.dialect.table_rows(cursor, table)
+            except Exception:
+                return False
+        return self._table_rows[table] >= self.large_table_rows
+
+    def capture(self, operation, params=None):
+        '''
+        Capture the plan for the given translated operation unless a plan
+        with the same fingerprint has already been captured. Statements that
+        could not be explained are tried again after retry_failed_after
+        seconds. Returns the PlanEntry for the operation.
+        '''
+        key = fingerprint(operation)
+        with self._lock:
+            if key in self.plans and (key not in self._failed
+                    or time.monotonic() - self._failed[key] < self.retry_failed_after):
+                return self.plans[key]
+
+            cursor = self._adbi.connection.cursor()
+            try:
+                plan = self._adbi.dialect.explain(cursor, operation, params)
+            except Exception:
+                # The statement may not be explainable (yet), executing it
+                # will report any real problem.
+                plan = None
+            full_scans = []
+            suggestions = []
+            try:
+                if plan:
+                    aliases = _table_aliases(operation)
+                    for name in self._adbi.dialect.full_scans(plan):
+                        table = aliases.get(name, name)
+                        if table in full_scans or not self._is_large(cursor, table):
+                            continue
+                        full_scans.append(table)
+                        columns = _where_columns(operation, name, table, len(set(aliases.values())) == 1)
+                        if columns:
+                            suggestions.append('CREATE INDEX ix_{0}_{1} ON {0} ({2})'.format(
+                                table, '_'.join(columns), ', '.join(columns)))
+            finally:
+                cursor.close()
+
+            entry = PlanEntry(key, operation, plan, full_scans, suggestions)
+            self.plans[key] = entry
+            if plan is None:
+                self._failed[key] = time.monotonic()
+            else:
+                self._failed.pop(key, None)
+            return entry
+
+    def findings(self):
+        '''
+        Return the captured plans that scan a large table in full.
+        '''
+        return [entry for entry in self.plans.values() if entry.full_scans]
+
+    def report(self):
+        '''
+        Return a human readable report of the flagged statements and the
+        suggested indexes.
+        '''
+        lines = []
+        for entry in self.findings():
+            lines.append('[{0}] {1}'.format(entry.fingerprint, ' '.join(entry.operation.split())))
+            lines.append('    full scan of: {0}'.format(', '.join(entry.full_scans)))
+            for suggestion in entry.suggestions:
+                lines.append('    suggested: {0}'.format(suggestion))
+        return '\n'.join(lines)
@@ -0,0 +1,84 @@
+'''
+Retrying operations that fail because of lock contention.
+
+A RetryPolicy assigned to an ADBI object retries statements executed outside
+of a transaction when the dialect classifies the error as retryable (such as
+sqlite's "database is locked"). Statements inside a transaction are never
+retried on their own, the whole unit of work should be retried instead using
+ADBI.run_in_transaction.
+'''
+import random
+import threading
+import time
+
+
+class RetryPolicy:
+    '''
+    Exponential backoff with jitter. The delay before retry n is
+    base_delay * 2 ** (n - 1), capped at max_delay, of which a random fraction
+    of up to jitter is removed. Retrying stops after the given number of
+    attempts, or when the next attempt would start after deadline seconds.
+    '''
+
+    def __init__(self, attempts=5, base_delay=0.01, max_delay=1.0, jitter=1.0, deadline=None):
+        if attempts < 1:
+            raise ValueError("At least one attempt is required")
+        if not 0 <= jitter <= 1:
+            raise ValueError("Jitter must be between 0 and 1")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._stats = {'retries': 0, 'recovered': 0, 'exhausted': 0}
+
+    def delay(self, attempt):
+        '''
+        Return the delay to wait before the given retry (starting at 1).
+        '''
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def stats(self):
+        '''
+        Return the retry counters: the number of retries made, the number of
+        operations that succeeded after retrying and the number that failed
+        after exhausting their retries.
+        '''
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def run(self, func, is_retryable, before_retry=None):
+        '''
+        Call func until it succeeds, it raises an error for which
+        is_retryable returns False, or the policy is exhausted. The
+        before_retry function is called after each retryable failure, before
+        waiting, to return the connection to a usable state.
+        '''
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                result = func()
+            except Exception as err:
+                if not is_retryable(err):
+                    raise
+                attempt += 1
+                delay = self.delay(attempt)
+                if attempt >= self.attempts or (
+                        self.deadline is not None and time.monotonic() - start + delay > self.deadline):
+                    self._count('exhausted')
+                    raise
+                self._count('retries')
+                if before_retry:
+                    before_retry()
+                time.sleep(delay)
+                continue
+            if attempt:
+                self._count('recovered')
+            return result
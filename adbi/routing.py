@@ -0,0 +1,241 @@
+'''
+Read/write routing for a primary database with one or more read replicas.
+
+The RoutingADBI object behaves like a regular ADBI object wrapped around the
+primary (writer) connection. Cursors created from it send operations that only
+read from the database to one of the reader connections, while writes and
+anything issued inside a transaction stay on the primary. Schema management
+(update_schema and current_schema_version) always uses the primary.
+'''
+from contextlib import contextmanager
+import threading
+import time
+
+from adbi import ADBI, ADBICursor, _is_read_operation
+
+
+class RoutingADBI(ADBI):
+    '''
+    An ADBI object holding one writer connection and any number of reader
+    connections. Readers may be plain connections or any pool like object
+    providing a cursor() method.
+
+    Readers are selected using the given policy, either 'round_robin' or
+    'least_busy'. After a write has been committed, reads are kept on the
+    writer for read_your_writes seconds so that the caller does not see stale
+    data from a lagging replica.
+    '''
+
+    POLICIES = ('round_robin', 'least_busy')
+
+    def __init__(self, writer, readers, paramstyle=None, policy='round_robin', read_your_writes=0):
+        '''
+        Initialize the routing object.
+        :param writer: the connection to the primary database.
+        :param readers: a sequence of reader connections (or pools).
+        :param policy: how a reader is selected, see POLICIES.
+        :param read_your_writes: seconds after a write during which reads
+            are kept on the writer.
+        '''
+        super().__init__(writer, paramstyle)
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown routing policy: {0}".format(policy))
+        self.readers = list(readers)
+        self.policy = policy
+        self.read_your_writes = read_your_writes
+        self._lock = threading.Lock()
+        self._reader_load = [0] * len(self.readers)
+        self._next_reader = 0
+        self._last_write = None
+        self._writer_only = 0
+
+    def close(self):
+        '''
+        Close the writer and all of the reader connections.
+        '''
+        for reader in self.readers:
+            if hasattr(reader, 'close'):
+                reader.close()
+        return super().close()
+
+    def cursor(self):
+        '''
+        Return a RoutingADBICursor object for this RoutingADBI object.
+        '''
+        return RoutingADBICursor(self)
+
+    @contextmanager
+    def use_writer(self):
+        '''
+        Send every read issued within the body to the writer.
+        '''
+        with self._lock:
+            self._writer_only += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writer_only -= 1
+
+    def _validate_schema_table(self):
+        '''
+        Create the table to hold schema information on the writer.
+        '''
+        with self.use_writer():
+            return super()._validate_schema_table()
+
+    def current_schema_version(self):
+        '''
+        Returns the current schema version of the writer, as replicas may lag
+        behind it.
+        '''
+        with self.use_writer():
+            return super().current_schema_version()
+
+    def update_schema(self, bundle=None):
+        '''
+        Upgrade the writer to the most recent schema version, see
+        ADBI.update_schema.
+        '''
+        with self.use_writer():
+            return super().update_schema(bundle)
+
+    def _note_write(self):
+        '''
+        Record that a write has been issued on the writer connection.
+        '''
+        with self._lock:
+            super()._note_write()
+            self._last_write = time.monotonic()
+
+    def _end_transaction(self):
+        '''
+        Record the end of the current transaction. The read-your-writes
+        window starts from this point.
+        '''
+        with self._lock:
+            if self._in_transaction:
+                self._last_write = time.monotonic()
+            super()._end_transaction()
+
+    def _acquire_reader(self):
+        '''
+        Return the index of the reader that should be used for the next read,
+        or None if the read must be sent to the writer.
+        '''
+        with self._lock:
+            if not self.readers or self._writer_only or self.in_transaction:
+                return None
+            if (self._last_write is not None
+                    and time.monotonic() - self._last_write < self.read_your_writes):
+                return None
+            if self.policy == 'least_busy':
+                idex = min(range(len(self.readers)), key=lambda idex: (
+                    self._reader_load[idex], (idex - self._next_reader) % len(self.readers)))
+            else:
+                idex = self._next_reader
+            self._next_reader = (idex + 1) % len(self.readers)
+            self._reader_load[idex] += 1
+            return idex
+
+    def _release_reader(self, idex):
+        '''
+        Release a reader previously returned by _acquire_reader.
+        '''
+        with self._lock:
+            self._reader_load[idex] -= 1
+
+
+class RoutingADBICursor(ADBICursor):
+    '''
+    A cursor that sends reads to a reader connection and everything else to
+    the writer. Results are fetched from whichever connection ran the last
+    operation. A reader counts as busy for the least_busy policy until the
+    result of the read has been fetched.
+    '''
+
+    def __init__(self, adbi):
+        '''
+        Initialize a cursor for the given RoutingADBI object. The writer
+        cursor is taken from the cursor pool of the RoutingADBI object, driver
+        cursors for the readers are only created when first used.
+        '''
+        super().__init__(adbi._acquire_cursor(), adbi.wrapped_db_param_style, adbi)
+        self._writer_cursor = self._cursor
+        self._writer_pending = False
+        self._reader_cursors = {}
+        self._reader = None
+        self._busy_reader = None
+
+    def _bind(self, reader):
+        '''
+        Point this cursor at the given reader index, or at the writer when
+        reader is None.
+        '''
+        self._release_busy_reader()
+        if self._reader is None:
+            self._writer_pending = self._pending
+        self._reader = reader
+        self._busy_reader = reader
+        if reader is None:
+            self._cursor = self._writer_cursor
+            self._pending = self._writer_pending
+            return
+        if reader not in self._reader_cursors:
+            self._reader_cursors[reader] = self._adbi.readers[reader].cursor()
+        self._cursor = self._reader_cursors[reader]
+
+    def _release_busy_reader(self):
+        '''
+        Release the reader this cursor counts as busy, if any.
+        '''
+        if self._busy_reader is not None:
+            self._adbi._release_reader(self._busy_reader)
+            self._busy_reader = None
+
+    def _finish_result(self):
+        '''
+        Record that the result has been fetched, which leaves the reader that
+        produced it idle.
+        '''
+        super()._finish_result()
+        self._release_busy_reader()
+
+    def execute(self, operation, params=None, timeout=None):
+        '''
+        Execute the operation on a reader if it only reads from the database,
+        otherwise execute it on the writer.
+        '''
+        if _is_read_operation(operation):
+            self._bind(self._adbi._acquire_reader())
+        else:
+            self._bind(None)
+        return super().execute(operation, params, timeout)
+
+    def executemany(self, operation, seq_of_params, timeout=None):
+        '''
+        Execute the operation against all parameters on the writer.
+        '''
+        self._bind(None)
+        return super().executemany(operation, seq_of_params, timeout)
+
+    def executescript(self, script):
+        '''
+        Execute the script on the writer.
+        '''
+        self._bind(None)
+        return super().executescript(script)
+
+    def close(self):
+        '''
+        Close any reader cursors that were created, and return the writer
+        cursor to the pool.
+        '''
+        if self._writer_cursor is None:
+            return
+        self._bind(None)
+        for cursor in self._reader_cursors.values():
+            cursor.close()
+        self._reader_cursors = {}
+        self._writer_cursor = None
+        return super().close()
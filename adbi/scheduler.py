@@ -0,0 +1,196 @@
+'''
+Priority aware admission control of statements.
+
+When a Scheduler is assigned to ADBI.scheduler, every statement executed
+through the cursors of the ADBI object must first be admitted. At most
+max_concurrent statements run at once, the others wait in a queue per
+priority class. Free slots are given to the classes in proportion to their
+weights (weighted fair queueing), so a backlog of batch statements cannot
+starve interactive ones, and batch statements still make progress. The same
+Scheduler may be assigned to several ADBI objects to limit a group of
+connections together.
+
+The priority of a statement is that of its cursor (ADBICursor.priority),
+otherwise the one set for the current thread with Scheduler.priority, and
+otherwise the default priority of the scheduler. Statements queued for longer
+than the queue timeout raise a TimeoutError without being run.
+'''
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+
+
+# The number of recent waits per class used for percentiles.
+_RECENT_WAITS = 1024
+
+
+class _Waiter:
+    '''
+    A statement waiting to be admitted.
+    '''
+    __slots__ = ('event', 'admitted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.admitted = False
+
+
+class Scheduler:
+    '''
+    Limits the number of statements in flight, admitting queued statements
+    by weighted priority.
+    '''
+
+    def __init__(self, max_concurrent=4, weights=None, default_priority='interactive', queue_timeout=None):
+        '''
+        Initialize the scheduler.
+        :param max_concurrent: the most statements running at once.
+        :param weights: mapping of the priority class names to their share
+            of the slots. Defaults to interactive statements getting four
+            slots for every one given to batch statements.
+        :param queue_timeout: the most seconds a statement may wait to be
+            admitted, or None to wait for as long as needed.
+        '''
+        if max_concurrent < 1:
+            raise ValueError("At least one concurrent statement is required")
+        self.weights = dict(weights or {'interactive': 4, 'batch': 1})
+        if default_priority not in self.weights:
+            raise ValueError("Unknown default priority: {0}".format(default_priority))
+        if any(weight <= 0 for weight in self.weights.values()):
+            raise ValueError("Priority weights must be positive")
+        self.max_concurrent = max_concurrent
+        self.default_priority = default_priority
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._running = 0
+        self._queues = {name: deque() for name in self.weights}
+        # The virtual time at which each class is next served, and that of
+        # the last admission.
+        self._pass = {name: 0.0 for name in self.weights}
+        self._vtime = 0.0
+        self._stats = {name: {'admitted': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for name in self.weights}
+        self._waits = {name: deque(maxlen=_RECENT_WAITS) for name in self.weights}
+
+    @contextmanager
+    def priority(self, name):
+        '''
+        Use the given priority for the statements of the current thread
+        whose cursor has no priority of its own.
+        '''
+        if name not in self.weights:
+            raise ValueError("Unknown priority: {0}".format(name))
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = name
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def _resolve(self, priority):
+        '''
+        Return the priority class to use for a statement.
+        '''
+        priority = priority or getattr(self._local, 'priority', None) or self.default_priority
+        if priority not in self.weights:
+            raise ValueError("Unknown priority: {0}".format(priority))
+        return priority
+
+    def _charge(self, priority):
+        '''
+        Account for the admission of a statement of the given class.
+        '''
+        self._running += 1
+        self._vtime = self._pass[priority]
+        self._pass[priority] += 1.0 / self.weights[priority]
+
+    def _record(self, priority, wait):
+        stats = self._stats[priority]
+        stats['admitted'] += 1
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+        self._waits[priority].append(wait)
+
+    def _dispatch(self):
+        '''
+        Admit queued statements while slots are free, serving the class with
+        the lowest virtual time first. Must be called holding the lock.
+        '''
+        while self._running < self.max_concurrent:
+            waiting = [name for name, queue in self._queues.items() if queue]
+            if not waiting:
+                return
+            priority = min(waiting, key=lambda name: self._pass[name])
+            waiter = self._queues[priority].popleft()
+            self._charge(priority)
+            waiter.admitted = True
+            waiter.event.set()
+
+    def acquire(self, priority=None, timeout=None):
+        '''
+        Wait until a statement of the given priority is admitted, returning
+        the seconds spent waiting. Raises a TimeoutError when not admitted
+        within timeout seconds (by default the queue timeout).
+        '''
+        priority = self._resolve(priority)
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self._lock:
+            if self._running < self.max_concurrent and not any(self._queues.values()):
+                self._charge(priority)
+                self._record(priority, 0.0)
+                return 0.0
+            waiter = _Waiter()
+            if not self._queues[priority]:
+                # An idle class does not build up credit while idle.
+                self._pass[priority] = max(self._pass[priority], self._vtime)
+            self._queues[priority].append(waiter)
+
+        waiter.event.wait(timeout)
+        wait = time.monotonic() - start
+        with self._lock:
+            if not waiter.admitted:
+                self._queues[priority].remove(waiter)
+                self._stats[priority]['timeouts'] += 1
+                raise TimeoutError("Statement not admitted after {0:.3f} seconds in the {1} queue".format(
+                    wait, priority))
+            self._record(priority, wait)
+        return wait
+
+    def release(self):
+        '''
+        Release the slot of a statement that has finished.
+        '''
+        with self._lock:
+            self._running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, priority=None, timeout=None):
+        '''
+        Run the body once admitted, see acquire.
+        '''
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        '''
+        Return the number of statements running and queued, and for each
+        priority class the statements queued, admitted and timed out along
+        with the total, mean, largest and 99th percentile (of recent
+        statements) seconds spent waiting.
+        '''
+        with self._lock:
+            classes = {}
+            for name, stats in self._stats.items():
+                waits = sorted(self._waits[name])
+                classes[name] = dict(stats, queued=len(self._queues[name]),
+                    wait_mean=stats['wait_total'] / stats['admitted'] if stats['admitted'] else 0.0,
+                    wait_p99=waits[int(len(waits) * 0.99)] if waits else 0.0)
+            return {'running': self._running, 'queued': sum(len(queue) for queue in self._queues.values()),
+                'classes': classes}
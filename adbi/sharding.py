@@ -0,0 +1,241 @@
+'''
+Hash sharding across several ADBI connections.
+
+The ShardedADBI object routes operations for a single shard key to the shard
+owning that key, and fans operations without a shard key out to every shard in
+parallel, merging the results as they are streamed back.
+
+Shards are used from worker threads, the underlying connections must allow
+this (for sqlite3 connect with check_same_thread=False).
+'''
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import queue
+import threading
+import zlib
+
+
+# Marker placed on a shard's result queue once all of its rows are queued.
+_DONE = object()
+
+
+class ShardedADBI:
+    '''
+    A collection of ADBI objects holding horizontally partitioned data. The
+    shard_key function maps a key (such as a customer id) onto a value that is
+    hashed to pick the shard. By default the key itself is hashed.
+    '''
+
+    def __init__(self, shards, shard_key=None, max_workers=None):
+        '''
+        Initialize a sharded connection.
+        :param shards: a sequence of ADBI objects, one per shard. The order of
+            the shards must be stable as it defines the key placement.
+        :param shard_key: optional function mapping a key to the value used
+            for shard selection.
+        :param max_workers: size of the thread pool used to fan out
+            execute_all, commit, rollback and schema upgrades. Defaults to
+            one thread per shard. Queries always use a thread per shard.
+        '''
+        self.shards = list(shards)
+        if not self.shards:
+            raise ValueError("At least one shard is required")
+        self.shard_key = shard_key
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards))
+
+    def _shard_index(self, key):
+        '''
+        Return the index of the shard holding the given key. The hash used is
+        stable between processes.
+        '''
+        if self.shard_key:
+            key = self.shard_key(key)
+        if isinstance(key, int):
+            value = key
+        else:
+            if not isinstance(key, bytes):
+                key = str(key).encode('utf-8')
+            value = zlib.crc32(key)
+        return value % len(self.shards)
+
+    def shard_for(self, key):
+        '''
+        Return the ADBI object for the shard holding the given key.
+        '''
+        return self.shards[self._shard_index(key)]
+
+    def cursor(self, key):
+        '''
+        Return a cursor on the shard holding the given key.
+        '''
+        return self.shard_for(key).cursor()
+
+    def execute(self, key, operation, params=None):
+        '''
+        Execute the operation on the shard holding the given key and return
+        the cursor so that results may be fetched.
+        '''
+        curs = self.cursor(key)
+        curs.execute(operation, params)
+        return curs
+
+    def _map(self, func):
+        '''
+        Call func with each shard in parallel. Returns the list of results in
+        shard order once all calls have completed, raising the first error
+        encountered.
+        '''
+        futures = [self._executor.submit(func, shard) for shard in self.shards]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def execute_all(self, operation, params=None):
+        '''
+        Execute the operation on every shard in parallel. Returns the
+        rowcount from each shard in shard order.
+        '''
+        def run(shard):
+            curs = shard.cursor()
+            try:
+                curs.execute(operation, params)
+                return curs.rowcount
+            finally:
+                curs.close()
+        return self._map(run)
+
+    def _produce(self, shard, operation, params, batch_size, results, stop):
+        '''
+        Worker executing the operation on a single shard and queuing batches
+        of rows until exhausted or told to stop.
+        '''
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            curs = shard.cursor()
+            try:
+                curs.execute(operation, params)
+                while True:
+                    rows = curs.fetchmany(batch_size)
+                    if not rows or not put(rows):
+                        break
+            finally:
+                curs.close()
+        except Exception as err:
+            put(err)
+        put(_DONE)
+
+    def _consume(self, results):
+        '''
+        Yield the rows queued by a single shard worker.
+        '''
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+
+    def query(self, operation, params=None, order_by=None, reverse=False, batch_size=500, queue_size=4):
+        '''
+        Execute a read operation on every shard in parallel and yield the
+        combined rows as they arrive. Without order_by the results of each
+        shard are concatenated in shard order. When order_by is given, it is
+        used as the sort key of a k-way merge. Each shard must then return its
+        rows sorted (for example with an ORDER BY clause) on the same key.
+        order_by may be a function or a sequence of column indexes.
+        :param batch_size: number of rows fetched from a shard at a time.
+        :param queue_size: number of batches buffered per shard.
+        '''
+        if order_by is not None and not callable(order_by):
+            columns = tuple(order_by)
+            order_by = lambda row: tuple(row[idex] for idex in columns)
+
+        stop = threading.Event()
+        streams = []
+        # Producers block on their bounded queues until the rows are
+        # consumed, so each query needs its own thread per shard. Sharing the
+        # pool would leave the producers of some shards waiting for a worker
+        # while the merge waits on their rows.
+        for shard in self.shards:
+            results = queue.Queue(maxsize=queue_size)
+            threading.Thread(target=self._produce, args=(shard, operation, params, batch_size, results, stop),
+                daemon=True).start()
+            streams.append(self._consume(results))
+        try:
+            if order_by is None:
+                for stream in streams:
+                    yield from stream
+            else:
+                yield from heapq.merge(*streams, key=order_by, reverse=reverse)
+        finally:
+            stop.set()
+
+    def commit(self):
+        '''
+        Commit any pending transaction on every shard.
+        '''
+        return self._map(lambda shard: shard.commit())
+
+    def rollback(self):
+        '''
+        Rollback the current transaction on every shard.
+        '''
+        return self._map(lambda shard: shard.rollback())
+
+    def close(self):
+        '''
+        Close every shard connection and the worker pool.
+        '''
+        try:
+            return self._map(lambda shard: shard.close())
+        finally:
+            self._executor.shutdown()
+
+    ## Schema management methods ##
+
+    @property
+    def schema_dir(self):
+        '''
+        Return the schema directory used by the shards.
+        '''
+        return self.shards[0].schema_dir
+
+    @schema_dir.setter
+    def schema_dir(self, value):
+        '''
+        Set the schema directory on every shard.
+        '''
+        for shard in self.shards:
+            shard.schema_dir = value
+
+    @property
+    def schema_file_format(self):
+        '''
+        Return the schema file format used by the shards.
+        '''
+        return self.shards[0].schema_file_format
+
+    @schema_file_format.setter
+    def schema_file_format(self, value):
+        '''
+        Set the schema file format on every shard.
+        '''
+        for shard in self.shards:
+            shard.schema_file_format = value
+
+    def update_schema(self, bundle=None):
+        '''
+        Upgrade every shard to the latest schema version concurrently.
+        '''
+        return self._map(lambda shard: shard.update_schema(bundle))
@@ -0,0 +1,116 @@
+'''
+Single-flight coalescing of identical reads.
+
+When a SingleFlight object is assigned to ADBI.single_flight, identical read
+operations (same translated operation and parameters) executed concurrently
+through the cursors of the ADBI object share a single execution. The first
+caller runs the query and fetches all of its rows, the others wait for and
+reuse the result. A completed result may also be reused for up to
+max_staleness seconds.
+'''
+import threading
+import time
+
+
+class _Call:
+    '''
+    An execution in flight or recently completed.
+    '''
+    __slots__ = ('event', 'result', 'error', 'finished')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = None
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls sharing the same key.
+    '''
+
+    def __init__(self, max_staleness=0.0):
+        '''
+        Initialize the single-flight group.
+        :param max_staleness: seconds a completed result may be reused for.
+            With the default of 0 only calls overlapping an execution share
+            its result.
+        '''
+        self.max_staleness = max_staleness
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'executed': 0, 'shared': 0}
+
+    @staticmethod
+    def key(operation, params):
+        '''
+        Return the key identifying the given operation and parameters, or
+        None if the parameters cannot be used as part of a key.
+        '''
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif params is not None:
+            params = tuple(params)
+        key = (operation, params)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def stats(self):
+        '''
+        Return the number of executions made and the number of calls that
+        shared the result of another.
+        '''
+        with self._lock:
+            return dict(self._stats)
+
+    def _is_fresh(self, call, now):
+        '''
+        Return True if the given call may be shared.
+        '''
+        if call.finished is None:
+            return True
+        return call.error is None and now - call.finished <= self.max_staleness
+
+    def do(self, key, func):
+        '''
+        Return the result of func, sharing it with any other caller using
+        the same key while it runs (and for max_staleness seconds after).
+        Errors raised by func are raised to every caller sharing the call,
+        but are not kept once the call completes.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None or not self._is_fresh(call, now)
+            if leader:
+                # Drop any results that can no longer be shared.
+                for stale in [stale for stale, item in self._calls.items() if not self._is_fresh(item, now)]:
+                    del self._calls[stale]
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            call.event.wait()
+        else:
+            try:
+                call.result = func()
+            except BaseException as err:
+                call.error = err
+            finally:
+                call.finished = time.monotonic()
+                if call.error is not None or self.max_staleness <= 0:
+                    with self._lock:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                call.event.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
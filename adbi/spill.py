@@ -0,0 +1,154 @@
+'''
+Result sets that spill to disk.
+
+ADBICursor.fetchall(spill_threshold=...) returns a SpilledRows sequence. Rows
+are kept in memory until their estimated size reaches spill_threshold bytes,
+after which the remaining rows are pickled in batches to a temporary file
+that is memory mapped once fetching completes. An index of the batch offsets
+allows len(), indexing, slicing and iteration without loading the spilled
+rows back into memory.
+'''
+from bisect import bisect_right
+from collections.abc import Sequence
+import mmap
+import pickle
+import tempfile
+
+from adbi.adaptive import _row_width
+
+
+class SpilledRows(Sequence):
+    '''
+    A read only sequence of rows, partly held in a temporary file. Only the
+    most recently used batch of spilled rows is kept decoded in memory. Call
+    close (or use it as a context manager) to release the file.
+    '''
+
+    def __init__(self, spill_threshold, batch_size=1000):
+        '''
+        Create an empty sequence.
+        :param spill_threshold: approximate number of bytes of rows kept in
+            memory before spilling.
+        :param batch_size: number of rows written to the file together.
+        '''
+        self.spill_threshold = spill_threshold
+        self.batch_size = batch_size
+        self._rows = []
+        self._memory = 0
+        self._pending = []
+        self._file = None
+        self._mmap = None
+        # Index of the first row, file offset and length of each batch.
+        self._starts = []
+        self._offsets = []
+        self._length = 0
+        self._cached = (None, None)
+
+    @property
+    def spilled(self):
+        '''
+        Return True if any of the rows are held on disk.
+        '''
+        return self._file is not None
+
+    def extend(self, rows):
+        '''
+        Append the given rows. Must not be called after finish.
+        '''
+        for row in rows:
+            self._length += 1
+            if self._file is None and self._memory < self.spill_threshold:
+                self._rows.append(row)
+                self._memory += _row_width(row)
+            else:
+                self._pending.append(row)
+                if len(self._pending) >= self.batch_size:
+                    self._spill()
+
+    def finish(self):
+        '''
+        Write any remaining rows and map the file for reading.
+        '''
+        if self._pending:
+            self._spill()
+        if self._file is not None and self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _spill(self):
+        '''
+        Write the pending rows to the file as a single batch.
+        '''
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        data = pickle.dumps(self._pending, pickle.HIGHEST_PROTOCOL)
+        self._starts.append(self._length - len(self._pending))
+        self._offsets.append((self._file.tell(), len(data)))
+        self._file.write(data)
+        self._pending = []
+
+    def _batch(self, idex):
+        '''
+        Return the decoded rows of the given batch.
+        '''
+        if self._cached[0] != idex:
+            offset, length = self._offsets[idex]
+            self._cached = (idex, pickle.loads(self._mmap[offset:offset + length]))
+        return self._cached[1]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idex] for idex in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Row index out of range")
+        if index < len(self._rows):
+            return self._rows[index]
+        batch = bisect_right(self._starts, index) - 1
+        return self._batch(batch)[index - self._starts[batch]]
+
+    def __iter__(self):
+        yield from self._rows
+        for idex in range(len(self._offsets)):
+            yield from self._batch(idex)
+
+    def close(self):
+        '''
+        Release the temporary file. Spilled rows can no longer be read.
+        '''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+        self._cached = (None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+
+def spill_cursor(cursor, spill_threshold, batch_size=1000):
+    '''
+    Fetch the remaining rows of the cursor into a SpilledRows sequence,
+    batch_size rows at a time.
+    '''
+    rows = SpilledRows(spill_threshold, batch_size)
+    try:
+        while True:
+            batch = cursor._fetchmany(batch_size)
+            if not batch:
+                break
+            rows.extend(batch)
+        rows.finish()
+    except BaseException:
+        rows.close()
+        raise
+    return rows
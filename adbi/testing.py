@@ -0,0 +1,352 @@
+'''
+A DB-API 2.0 driver simulating a database server, for performance tests.
+
+The driver wraps sqlite3 but behaves like a driver talking to a remote
+server: each round trip is charged a fixed latency, plus a cost per row and
+per byte transferred, on a virtual clock. Round trips, bytes, rows and
+statements are counted so that the effect of batching, pooling and caching
+can be measured and asserted deterministically, without a server.
+
+The paramstyle, the most parameters per statement, whether executemany is
+sent as a single round trip and how many rows each fetch round trip
+transfers are configurable per connection. The module paramstyle is qmark,
+so the paramstyle must be given to adbi.connect when using another. ADBI
+objects wrapping a simulated connection use its parameter limit.
+'''
+import re
+import sqlite3
+import threading
+import time
+
+from adbi.adaptive import _row_width
+from adbi.dialects import SQLiteDialect, register_dialect
+
+
+apilevel = '2.0'
+threadsafety = 1
+paramstyle = 'qmark'
+PARAMSTYLES = ('qmark', 'numeric', 'named', 'format', 'pyformat')
+
+Warning = sqlite3.Warning
+Error = sqlite3.Error
+InterfaceError = sqlite3.InterfaceError
+DatabaseError = sqlite3.DatabaseError
+DataError = sqlite3.DataError
+OperationalError = sqlite3.OperationalError
+IntegrityError = sqlite3.IntegrityError
+InternalError = sqlite3.InternalError
+ProgrammingError = sqlite3.ProgrammingError
+NotSupportedError = sqlite3.NotSupportedError
+
+# Quoted strings are matched so that numeric placeholders within them are
+# left alone. As with other drivers, format placeholders are replaced
+# everywhere, so a literal % must always be escaped.
+_PLACEHOLDER_RES = {
+    'numeric': re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|:(\d+)"),
+    'format': re.compile(r"%(%|s)"),
+    'pyformat': re.compile(r"%(%|s|\((\w+)\)s)"),
+}
+
+
+def _to_sqlite(style, operation):
+    '''
+    Return the operation with its placeholders in the given paramstyle
+    replaced by those understood by sqlite.
+    '''
+    if style in ('qmark', 'named'):
+        return operation
+
+    def replace(match):
+        if match.group(1) is None:
+            return match.group(0)
+        if style == 'numeric':
+            return '?{0}'.format(int(match.group(1)) + 1)
+        if match.group(1) == '%':
+            return '%'
+        if style == 'pyformat' and match.group(2):
+            return ':' + match.group(2)
+        return '?'
+    return _PLACEHOLDER_RES[style].sub(replace, operation)
+
+
+def _param_count(params):
+    '''
+    Return the number of parameters bound to a statement.
+    '''
+    return len(params) if params else 0
+
+
+class VirtualClock:
+    '''
+    A clock advanced by the simulated latency instead of waiting for it.
+    When realtime is set the latency is also slept, for tests that depend on
+    wall clock timing.
+    '''
+
+    def __init__(self, realtime=False):
+        self.now = 0.0
+        self.realtime = realtime
+        self._lock = threading.Lock()
+
+    def advance(self, seconds):
+        '''
+        Advance the clock by the given number of seconds.
+        '''
+        with self._lock:
+            self.now += seconds
+        if self.realtime and seconds > 0:
+            time.sleep(seconds)
+
+
+class SimulatedConnection:
+    '''
+    A connection to a simulated database server backed by sqlite3.
+    '''
+
+    def __init__(self, database=':memory:', paramstyle='qmark', latency=0.001, row_cost=0.0, byte_cost=0.0,
+            max_params=None, native_executemany=True, fetch_size=None, clock=None, **kwargs):
+        '''
+        Open the sqlite3 database, passing it any other keyword arguments.
+        :param latency: seconds charged for each round trip.
+        :param row_cost: seconds charged for each row transferred.
+        :param byte_cost: seconds charged for each byte transferred.
+        :param max_params: the most parameters a statement may bind.
+        :param native_executemany: whether executemany is sent in a single
+            round trip, otherwise one round trip is made per parameter set.
+        :param fetch_size: rows transferred per fetch round trip. When None
+            the whole result is transferred with the execute round trip.
+        :param clock: the VirtualClock to advance, which may be shared by
+            several connections.
+        '''
+        if paramstyle not in PARAMSTYLES:
+            raise ValueError("Unknown paramstyle: {0}".format(paramstyle))
+        self._conn = sqlite3.connect(database, **kwargs)
+        self.paramstyle = paramstyle
+        self.latency = latency
+        self.row_cost = row_cost
+        self.byte_cost = byte_cost
+        self.max_params = max_params
+        self.native_executemany = native_executemany
+        self.fetch_size = fetch_size
+        self.clock = clock if clock is not None else VirtualClock()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        '''
+        Reset the counters.
+        '''
+        with self._lock:
+            self._stats = {'round_trips': 0, 'statements': 0, 'rows': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                'elapsed': 0.0}
+
+    def stats(self):
+        '''
+        Return the counters: round trips, statements executed, rows and bytes
+        transferred, and the simulated seconds spent waiting on the server.
+        '''
+        with self._lock:
+            return dict(self._stats)
+
+    def _round_trip(self, sent=0, rows=(), statements=0):
+        '''
+        Charge a round trip sending the given number of bytes and receiving
+        the given rows.
+        '''
+        received = sum(_row_width(row) for row in rows)
+        cost = self.latency + self.row_cost * len(rows) + self.byte_cost * (sent + received)
+        with self._lock:
+            self._stats['round_trips'] += 1
+            self._stats['statements'] += statements
+            self._stats['rows'] += len(rows)
+            self._stats['bytes_sent'] += sent
+            self._stats['bytes_received'] += received
+            self._stats['elapsed'] += cost
+        self.clock.advance(cost)
+
+    def _check_params(self, params):
+        '''
+        Raise an error if the parameters exceed the parameter limit.
+        '''
+        if self.max_params is not None and _param_count(params) > self.max_params:
+            raise OperationalError("too many SQL variables")
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def cursor(self):
+        return SimulatedCursor(self)
+
+    def commit(self):
+        self._round_trip()
+        self._conn.commit()
+
+    def rollback(self):
+        self._round_trip()
+        self._conn.rollback()
+
+    def interrupt(self):
+        self._conn.interrupt()
+
+    def close(self):
+        self._conn.close()
+
+
+class SimulatedCursor:
+    '''
+    A cursor of a SimulatedConnection.
+    '''
+
+    def __init__(self, conn):
+        self.connection = conn
+        self._cursor = conn._conn.cursor()
+        # Rows transferred but not yet fetched start at _buffer[_pos].
+        self._buffer = []
+        self._pos = 0
+        self._more = False
+        self.arraysize = 1
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _sent(self, operation, params):
+        '''
+        Return the number of bytes sent for the operation and parameters.
+        '''
+        if not params:
+            return len(operation)
+        values = params.values() if isinstance(params, dict) else params
+        return len(operation) + _row_width(values)
+
+    def _receive(self):
+        '''
+        Transfer the next part of the result set, returning the rows.
+        '''
+        size = self.connection.fetch_size
+        rows = self._cursor.fetchall() if size is None else self._cursor.fetchmany(size)
+        self._more = size is not None and len(rows) == size
+        return rows
+
+    def execute(self, operation, params=None):
+        conn = self.connection
+        conn._check_params(params)
+        sql = _to_sqlite(conn.paramstyle, operation) if params else operation
+        if params:
+            self._cursor.execute(sql, params)
+        else:
+            self._cursor.execute(sql)
+        # Results are returned with the execute round trip when fetching
+        # everything, otherwise the first fetch transfers the first rows.
+        self._buffer = []
+        self._pos = 0
+        self._more = self._cursor.description is not None
+        if self._more and conn.fetch_size is None:
+            self._buffer = self._receive()
+        conn._round_trip(self._sent(operation, params), self._buffer, 1)
+        return self
+
+    def executemany(self, operation, seq_of_params):
+        conn = self.connection
+        seq_of_params = list(seq_of_params)
+        for params in seq_of_params:
+            conn._check_params(params)
+        sql = _to_sqlite(conn.paramstyle, operation)
+        self._cursor.executemany(sql, seq_of_params)
+        self._buffer = []
+        self._pos = 0
+        self._more = False
+        if conn.native_executemany:
+            conn._round_trip(sum(self._sent(operation, params) for params in seq_of_params), (),
+                len(seq_of_params))
+        else:
+            for params in seq_of_params:
+                conn._round_trip(self._sent(operation, params), (), 1)
+        return self
+
+    def executescript(self, script):
+        self._cursor.executescript(script)
+        self._buffer = []
+        self._pos = 0
+        self._more = False
+        self.connection._round_trip(len(script), (), 1)
+        return self
+
+    def _fill(self, count):
+        '''
+        Transfer rows until count rows (all rows when None) are buffered or
+        the result is exhausted.
+        '''
+        while self._more and (count is None or len(self._buffer) - self._pos < count):
+            rows = self._receive()
+            self.connection._round_trip(0, rows)
+            self._buffer = self._buffer[self._pos:] + rows
+            self._pos = 0
+
+    def fetchone(self):
+        self._fill(1)
+        if self._pos >= len(self._buffer):
+            return None
+        self._pos += 1
+        return self._buffer[self._pos - 1]
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        self._fill(size)
+        rows = self._buffer[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        self._fill(None)
+        rows = self._buffer[self._pos:]
+        self._buffer = []
+        self._pos = 0
+        return rows
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+    def close(self):
+        self._cursor.close()
+
+
+class SimulatedDialect(SQLiteDialect):
+    '''
+    Dialect for simulated connections, using the parameter limit of the
+    connection.
+    '''
+
+    @classmethod
+    def for_connection(cls, conn):
+        dialect = cls()
+        if conn.max_params is not None:
+            dialect.max_params = conn.max_params
+        return dialect
+
+    def reset_cursor(self, cursor):
+        # Executing the next statement discards any result not fetched, so
+        # no round trip is spent on resetting the cursor.
+        return True
+
+
+def connect(database=':memory:', **kwargs):
+    '''
+    Return a SimulatedConnection, see SimulatedConnection for the arguments.
+    '''
+    return SimulatedConnection(database, **kwargs)
+
+
+register_dialect(__name__, SimulatedDialect)
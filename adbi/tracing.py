@@ -0,0 +1,111 @@
+'''
+Tracing hooks around database operations.
+
+A Tracer assigned to ADBI.tracer is called at the start and end of every
+execute, executemany, fetch, commit, rollback, executescript and update_schema
+call made through the ADBI object and its cursors. When no tracer is assigned
+no trace events are created.
+'''
+import threading
+import time
+
+from adbi import fingerprint
+
+
+class TraceEvent:
+    '''
+    Details of a single traced operation. The duration, rows and error
+    attributes are only set once the operation has ended.
+    '''
+    __slots__ = ('name', 'fingerprint', 'operation', 'paramstyle', 'start_time', 'duration', 'rows', 'error')
+
+    def __init__(self, name, source=None, operation=None, paramstyle=None):
+        '''
+        Create an event for the named operation.
+        :param source: the operation as given to adbi, used for the
+            fingerprint.
+        :param operation: the translated operation sent to the database.
+        '''
+        self.name = name
+        self.fingerprint = fingerprint(source) if source else None
+        self.operation = operation
+        self.paramstyle = paramstyle
+        self.start_time = None
+        self.duration = None
+        self.rows = None
+        self.error = None
+
+    def __repr__(self):
+        return '<TraceEvent {0} {1} rows={2} duration={3}>'.format(
+            self.name, self.fingerprint, self.rows, self.duration)
+
+
+class Tracer:
+    '''
+    Base class of tracers. Subclasses override start and end to export the
+    events to a tracing system.
+    '''
+
+    def start(self, event):
+        '''
+        Called before the operation runs. The return value (such as a span
+        object) is passed to end.
+        '''
+        return None
+
+    def end(self, event, span):
+        '''
+        Called after the operation has completed or failed. The event holds
+        the duration, row count and any error raised.
+        '''
+
+
+class InMemoryTracer(Tracer):
+    '''
+    A tracer keeping all ended events in memory, intended for tests.
+    '''
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def end(self, event, span):
+        with self._lock:
+            self.events.append(event)
+
+    def names(self):
+        '''
+        Return the names of the recorded events in order.
+        '''
+        return [event.name for event in self.events]
+
+    def clear(self):
+        '''
+        Forget all recorded events.
+        '''
+        with self._lock:
+            self.events = []
+
+
+class traced:
+    '''
+    Context manager timing an operation and reporting it to the tracer. The
+    event is returned on entry so the caller can fill in the row count.
+    '''
+    __slots__ = ('_tracer', '_event', '_span', '_start')
+
+    def __init__(self, tracer, name, source=None, operation=None, paramstyle=None):
+        self._tracer = tracer
+        self._event = TraceEvent(name, source, operation, paramstyle)
+
+    def __enter__(self):
+        self._event.start_time = time.time()
+        self._start = time.perf_counter()
+        self._span = self._tracer.start(self._event)
+        return self._event
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._event.duration = time.perf_counter() - self._start
+        self._event.error = exc
+        self._tracer.end(self._event, self._span)
+        return False
@@ -0,0 +1,132 @@
+'''
+Warming up connections from a manifest of hot statements.
+
+A StatementRecorder assigned to ADBI.statement_recorder counts the statements
+executed through the cursors of the ADBI object. The most frequent ones can
+be written to a manifest file, along with designated warming reads. A new
+process calls ADBI.warm_up with the manifest to translate those statements
+ahead of time, fill the cursor pool and run the warming reads (loading the
+driver's statement cache and the database's page cache), so that it starts
+at its steady state latency.
+'''
+from collections import Counter
+from pathlib import Path
+import json
+import threading
+
+from adbi import ADBICursor, _translation_key
+from adbi.catalog import placeholders
+
+
+MANIFEST_FORMAT = 1
+
+
+class StatementRecorder:
+    '''
+    Counts statements by operation and parameter shape.
+    '''
+
+    def __init__(self, max_statements=1000):
+        '''
+        :param max_statements: the number of distinct statements kept. Once
+            twice as many have been recorded, only the most frequent
+            max_statements are kept, so that statements built with literal
+            values do not grow the counts without bound.
+        '''
+        self.max_statements = max_statements
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, operation, shape):
+        '''
+        Count an execution of the given operation with parameters of the
+        given shape.
+        '''
+        key = (operation, shape)
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= 2 * self.max_statements:
+                self._counts = Counter(dict(self._counts.most_common(self.max_statements)))
+            self._counts[key] += 1
+
+    def top(self, count=100):
+        '''
+        Return the count most frequent (operation, shape, executions) tuples.
+        '''
+        with self._lock:
+            return [(operation, shape, executions)
+                for (operation, shape), executions in self._counts.most_common(count)]
+
+    def clear(self):
+        '''
+        Forget all recorded statements.
+        '''
+        with self._lock:
+            self._counts.clear()
+
+
+def save_manifest(recorder, path, top=100, reads=None):
+    '''
+    Write the top statements of the recorder to a manifest file at path.
+    :param reads: (operation, params) pairs run when warming up. The
+        parameters must be JSON serialisable.
+    '''
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'statements': [{'operation': operation, 'shape': shape, 'count': executions}
+            for operation, shape, executions in recorder.top(top)],
+        'reads': [{'operation': operation, 'params': params} for operation, params in reads or []],
+    }
+    Path(path).write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+def _sample_params(operation, shape):
+    '''
+    Return parameters of the given shape for the operation, or None if they
+    cannot be determined.
+    '''
+    if shape == 'mapping':
+        try:
+            names = placeholders(operation)
+        except ValueError:
+            return None
+        return {name: None for name in names} if isinstance(names, list) and names else None
+    return [None] * shape
+
+
+def warm_up(conn, manifest, reads=True):
+    '''
+    Warm up the given ADBI object from the manifest, a path or manifest data.
+    Returns the number of statements translated.
+    '''
+    if not isinstance(manifest, dict):
+        manifest = json.loads(Path(manifest).read_text())
+    if manifest.get('format') != MANIFEST_FORMAT:
+        raise ValueError("Unsupported warm up manifest format: {0}".format(manifest.get('format')))
+
+    paramstyle = conn.wrapped_db_param_style
+    translator = ADBICursor(None, paramstyle)
+    translated = 0
+    for statement in manifest['statements']:
+        params = _sample_params(statement['operation'], statement['shape'])
+        if params is None and statement['shape'] != 0:
+            continue
+        translation = translator._convert_operation_with_params(statement['operation'], params)
+        conn._prepared[_translation_key(paramstyle, statement['operation'], params)] = translation
+        translated += 1
+
+    # Fill the pool with driver cursors so the first requests do not pay for
+    # creating them.
+    connection = conn.connection
+    with conn._pool_lock:
+        missing = conn.cursor_pool_size - len(conn._idle_cursors)
+    for count in range(missing):
+        conn._release_cursor(conn._new_cursor(connection))
+
+    if reads and manifest.get('reads'):
+        in_transaction = conn.in_transaction
+        for read in manifest['reads']:
+            conn.query(read['operation'], read['params'])
+        if not in_transaction:
+            conn.rollback()
+    return translated
@@ -0,0 +1,16 @@
+-- name: create_users
+CREATE TABLE users (id INT NOT NULL PRIMARY KEY, name VARCHAR(64) NOT NULL);
+
+-- name: add_user
+-- Add a user.
+INSERT INTO users (id, name) VALUES (%(id)s, %(name)s);
+
+-- name: get_user
+-- Return the user with the given id.
+SELECT id, name FROM users WHERE id = %(id)s;
+
+-- name: users_between
+SELECT id FROM users WHERE id >= %s AND id <= %s ORDER BY id;
+
+-- name: users_like
+SELECT name FROM users WHERE name LIKE 'a%' ORDER BY id;
@@ -1,9 +1,33 @@
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
+import multiprocessing
+import os
+import io
+import json
 import sqlite3
+import tempfile
 import adbi
 from adbi import ADBI, ADBICursor
+from adbi.backfill import throttle_delay
+from adbi.bundle import split_statements
+from adbi.warmup import StatementRecorder
+from adbi.dialects import Dialect
+
+
+def worker_query(value):
+    # Run inside a process pool worker.
+    curs = adbi.worker_connection().cursor()
+    curs.execute("SELECT %s", (value,))
+    return os.getpid(), curs.fetchone()[0]
+
+
+def prepare_row(value):
+    # Run inside a process pool worker by parallel_load.
+    return {'id': value, 'name': 'row {0}'.format(value)}
 
 
 class TestADBI(TestCase):
@@ -134,6 +158,25 @@ class TestADBI(TestCase):
         curs.close()
         conn.close()
 
+    def test_set_schema_info_length(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        adbi_conn._validate_schema_table()
+        adbi_conn._set_schema_info('foo', 'x' * 128)
+        self.assertEqual(adbi_conn.query("SELECT value FROM _schema_info WHERE variable = 'foo'"), [('x' * 128,)],
+            "Stored the longest value")
+        with self.assertRaisesRegex(ValueError, 'longer than 128 characters'):
+            adbi_conn._set_schema_info('foo', 'x' * 129)
+        with self.assertRaisesRegex(ValueError, 'longer than 64 characters'):
+            adbi_conn._set_schema_info('x' * 65, 'bar')
+
+        # Backfill checkpoints are checked too.
+        adbi_conn.execute("CREATE TABLE foo (name TEXT, b INT)")
+        adbi_conn.execute("INSERT INTO foo VALUES (%s, NULL)", ('n' * 200,))
+        with self.assertRaisesRegex(ValueError, 'backfill:b'):
+            adbi_conn.backfill('b', 'foo', 'name', 'UPDATE foo SET b = 1 WHERE name BETWEEN %(start)s AND %(end)s')
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM _schema_info WHERE variable = 'backfill:b'"), [(0,)],
+            "No checkpoint written")
+
     def test_current_schema_version(self):
         conn = sqlite3.connect(':memory:')
         curs = conn.cursor()
@@ -221,3 +264,804 @@ class TestADBI(TestCase):
         # Database from previous version.
         adbi_conn.update_schema()
         self.validate_test_schema(curs)
+
+    def test_update_schema_current_only(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            Path(tmp_dir, 'schema-current.sql').write_text(Path('tests/sql/schema-current.sql').read_text())
+            conn = sqlite3.connect(':memory:')
+            adbi_conn = adbi.connect(conn)
+            adbi_conn.schema_dir = tmp_dir
+            adbi_conn.update_schema()
+            self.validate_test_schema(conn.cursor())
+            self.assertIsNone(adbi_conn.current_schema_version(), "No version recorded")
+
+    def build_import_db(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE vendor (id INT NOT NULL PRIMARY KEY, name VARCHAR(64))")
+        return conn, adbi.connect(conn)
+
+    def write_import_file(self, tmp_dir, name, text):
+        path = Path(tmp_dir, name)
+        path.write_text(text)
+        return path
+
+    def test_import_file_csv(self):
+        conn, adbi_conn = self.build_import_db()
+        lines = ['id,name'] + ['{0},"name {0}"'.format(idex) for idex in range(1, 24)]
+        lines[5] = '5,"multi\nline, value"'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_import_file(tmp_dir, 'vendor.csv', '\n'.join(lines) + '\n')
+            count = adbi_conn.import_file('vendor', path, batch_size=4, commit_every=2)
+        self.assertEqual(count, 23, "Got number of rows imported")
+        rows = conn.execute("SELECT id, name FROM vendor ORDER BY id").fetchall()
+        self.assertEqual(len(rows), 23, "All rows inserted")
+        self.assertEqual(rows[4], (5, 'multi\nline, value'), "Multi-line record kept whole")
+        self.assertEqual(rows[22], (23, 'name 23'), "Last row inserted")
+
+    def test_import_file_csv_header_order(self):
+        conn, adbi_conn = self.build_import_db()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_import_file(tmp_dir, 'vendor.csv', 'name,id\nalice,1\nbob,2\n')
+            count = adbi_conn.import_file('vendor', path, columns=['id', 'name'])
+            with self.assertRaises(ValueError):
+                adbi_conn.import_file('vendor', path, columns=['id', 'title'])
+        self.assertEqual(count, 2, "Got number of rows imported")
+        self.assertEqual(conn.execute("SELECT id, name FROM vendor ORDER BY id").fetchall(),
+            [(1, 'alice'), (2, 'bob')], "Values matched by header name")
+
+    def test_import_file_jsonl(self):
+        conn, adbi_conn = self.build_import_db()
+        lines = [json.dumps({'id': idex, 'name': 'name {0}'.format(idex)}) for idex in range(10)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_import_file(tmp_dir, 'vendor.jsonl', '\n'.join(lines) + '\n')
+            count = adbi_conn.import_file('vendor', path, format='jsonl', batch_size=3, rows_per_statement=2)
+        self.assertEqual(count, 10, "Got number of rows imported")
+        rows = conn.execute("SELECT id, name FROM vendor ORDER BY id").fetchall()
+        self.assertEqual(rows, [(idex, 'name {0}'.format(idex)) for idex in range(10)], "All rows inserted")
+
+        with self.assertRaises(ValueError):
+            adbi_conn.import_file('vendor', path, format='xml')
+
+    def test_import_file_workers(self):
+        conn, adbi_conn = self.build_import_db()
+        lines = ['{0},name {0}'.format(idex) for idex in range(100)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_import_file(tmp_dir, 'vendor.csv', '\n'.join(lines) + '\n')
+            count = adbi_conn.import_file('vendor', path, columns=['id', 'name'], header=False,
+                batch_size=7, workers=2)
+            with self.assertRaisesRegex(ValueError, 'columns are required'):
+                adbi_conn.import_file('vendor', path, header=False)
+        self.assertEqual(count, 100, "Got number of rows imported")
+        rows = conn.execute("SELECT COUNT(*), SUM(id) FROM vendor").fetchone()
+        self.assertEqual(rows, (100, 4950), "All rows inserted once")
+
+    def test_import_file_checkpoint(self):
+        conn, adbi_conn = self.build_import_db()
+        lines = ['id,name'] + ['{0},name {0}'.format(idex) for idex in range(20)]
+        lines[16] = '0,duplicate'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_import_file(tmp_dir, 'vendor.csv', '\n'.join(lines) + '\n')
+            checkpoint = Path(tmp_dir, 'vendor.checkpoint')
+            # Fails on the fourth batch, after the second commit.
+            with self.assertRaises(sqlite3.Error):
+                adbi_conn.import_file('vendor', path, batch_size=4, commit_every=1, checkpoint=checkpoint)
+            self.assertFalse(conn.in_transaction, "Uncommitted batch rolled back")
+            self.assertEqual(json.loads(checkpoint.read_text())['rows'], 12, "Progress recorded")
+
+            # Fix the file and resume.
+            lines[16] = '15,name 15'
+            path.write_text('\n'.join(lines) + '\n')
+            count = adbi_conn.import_file('vendor', path, batch_size=4, commit_every=1, checkpoint=checkpoint)
+            self.assertFalse(checkpoint.exists(), "Checkpoint removed once complete")
+        self.assertEqual(count, 20, "Got total number of rows imported")
+        rows = conn.execute("SELECT COUNT(*), SUM(id) FROM vendor").fetchone()
+        self.assertEqual(rows, (20, 190), "Every row inserted exactly once")
+
+    def build_blob_db(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE payload (id INTEGER PRIMARY KEY, data BLOB)")
+        conn.execute("INSERT INTO payload (id, data) VALUES (1, ?)", (bytes(range(256)) * 10,))
+        conn.commit()
+        return conn
+
+    def test_open_blob(self):
+        conn = self.build_blob_db()
+        adbi_conn = adbi.connect(conn)
+
+        with adbi_conn.open_blob('payload', 'data', 1) as blob:
+            self.assertEqual(len(blob), 2560, "Got length of the blob")
+            blob.seek(250)
+            self.assertEqual(blob.read(10), bytes([250, 251, 252, 253, 254, 255, 0, 1, 2, 3]),
+                "Read from an offset")
+
+        with adbi_conn.open_blob('payload', 'data', 1, readonly=False) as blob:
+            blob.write(b'new data')
+        row = conn.execute("SELECT SUBSTR(data, 1, 8) FROM payload").fetchone()
+        self.assertEqual(row[0], b'new data', "Data written incrementally")
+
+    def test_open_blob_chunked(self):
+        conn = self.build_blob_db()
+        adbi_conn = adbi.connect(conn)
+        expected = bytes(range(256)) * 10
+
+        # Identifying the row by another column uses the chunked fallback.
+        blob = adbi_conn.open_blob('payload', 'data', 1, key_column='id', chunk_size=100)
+        self.assertIsInstance(blob, adbi.blob.ChunkedBlob, "Got the chunked fallback")
+        self.assertEqual(len(blob), 2560, "Got length of the blob")
+        self.assertEqual(blob.read(150), expected[:100], "Reads are limited to one chunk")
+        blob.seek(-60, io.SEEK_END)
+        self.assertEqual(blob.read(), expected[-60:], "Read to the end")
+        blob.seek(0)
+        self.assertEqual(blob.read(), expected, "Read the whole value")
+        self.assertEqual(blob.tell(), 2560, "Position at the end")
+        self.assertEqual(blob.read(10), b'', "Nothing left to read")
+        blob.close()
+
+        with self.assertRaises(SystemError):
+            adbi_conn.open_blob('payload', 'data', 1, readonly=False, key_column='id')
+        with self.assertRaises(SystemError):
+            adbi_conn.open_blob('payload', 'data', 2, key_column='id')
+
+    def test_blob_parameters(self):
+        mock_db = Mock()
+        adbi_conn = ADBI(mock_db, 'qmark')
+        data = memoryview(bytearray(b'payload'))
+
+        adbi_conn.cursor().execute("INSERT INTO payload (data) VALUES (%(data)s)", {'data': data})
+        args = mock_db.cursor.return_value.execute.call_args[0]
+        self.assertIs(args[1][0], data, "Buffer passed to the driver without a copy")
+
+        conn = self.build_blob_db()
+        adbi.connect(conn).cursor().execute("UPDATE payload SET data = %s", (data,))
+        self.assertEqual(conn.execute("SELECT data FROM payload").fetchone()[0], b'payload',
+            "memoryview stored as a blob")
+
+    def test_fingerprint(self):
+        self.assertEqual(adbi.fingerprint("SELECT * FROM foo WHERE id = 1"),
+            adbi.fingerprint("SELECT *\n  FROM foo WHERE id = 22"), "Literals and whitespace ignored")
+        self.assertEqual(adbi.fingerprint("SELECT * FROM foo WHERE name = 'a'"),
+            adbi.fingerprint("SELECT * FROM foo WHERE name = 'it''s'"), "String literals ignored")
+        self.assertNotEqual(adbi.fingerprint("SELECT * FROM table_1"),
+            adbi.fingerprint("SELECT * FROM table_2"), "Identifiers are kept")
+
+    def test_factory(self):
+        conn = sqlite3.connect(':memory:')
+        factory = Mock(return_value=conn)
+        adbi_conn = adbi.connect(None, factory=factory)
+        self.assertEqual(adbi_conn.connection, conn, "Connection created by the factory")
+        self.assertEqual(adbi_conn.wrapped_db_param_style, sqlite3.paramstyle, "Got expected param style")
+
+        with self.assertRaises(ValueError):
+            ADBI(None)
+
+    @patch('adbi.os.getpid')
+    def test_reconnect_after_fork(self, mock_getpid):
+        mock_getpid.return_value = 100
+        parent_conn = Mock()
+        child_conn = Mock()
+        hook = Mock()
+        adbi_conn = ADBI(parent_conn, 'qmark', factory=Mock(return_value=child_conn))
+        adbi_conn.add_reconnect_hook(hook)
+        self.assertEqual(adbi_conn.connection, parent_conn, "Parent connection used in the parent")
+        hook.assert_not_called()
+
+        # Now in the child process.
+        mock_getpid.return_value = 200
+        adbi_conn.commit()
+        child_conn.commit.assert_called_with()
+        parent_conn.commit.assert_not_called()
+        parent_conn.close.assert_not_called()
+        hook.assert_called_once_with(adbi_conn)
+        self.assertEqual(adbi_conn.connection, child_conn, "Child connection is kept")
+
+        # Without a factory the inherited connection cannot be used.
+        mock_getpid.return_value = 100
+        adbi_conn = ADBI(parent_conn, 'qmark')
+        mock_getpid.return_value = 200
+        with self.assertRaises(SystemError):
+            adbi_conn.cursor()
+
+    def test_init_worker(self):
+        with patch('adbi._worker_adbi', None):
+            with self.assertRaises(SystemError):
+                adbi.worker_connection()
+
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(2, mp_context=context, initializer=adbi.init_worker,
+                initargs=(partial(sqlite3.connect, ':memory:'),)) as executor:
+            results = list(executor.map(worker_query, range(4)))
+        self.assertEqual([result[1] for result in results], [0, 1, 2, 3], "Queries ran in the workers")
+        self.assertNotIn(os.getpid(), [result[0] for result in results], "Workers are separate processes")
+
+    def test_in_transaction(self):
+        mock_db = Mock(spec=['cursor', 'commit', 'rollback'])
+        adbi_conn = ADBI(mock_db, 'qmark')
+        self.assertFalse(adbi_conn.in_transaction, "No transaction to start with")
+        adbi_conn.cursor().execute("SELECT 1")
+        self.assertFalse(adbi_conn.in_transaction, "Reads do not open a transaction")
+        adbi_conn.cursor().execute("DELETE FROM foo")
+        self.assertTrue(adbi_conn.in_transaction, "Writes open a transaction")
+        adbi_conn.commit()
+        self.assertFalse(adbi_conn.in_transaction, "Commit ends the transaction")
+        adbi_conn.cursor().executescript("DELETE FROM foo")
+        self.assertTrue(adbi_conn.in_transaction, "Scripts open a transaction")
+        adbi_conn.rollback()
+        self.assertFalse(adbi_conn.in_transaction, "Rollback ends the transaction")
+
+        # The driver is asked when possible.
+        conn = sqlite3.connect(':memory:')
+        adbi_conn = adbi.connect(conn)
+        conn.execute("CREATE TABLE foo (id INT)")
+        conn.execute("INSERT INTO foo VALUES (1)")
+        self.assertTrue(adbi_conn.in_transaction, "Got driver transaction state")
+
+    def test_run_in_transaction(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INT)")
+        adbi_conn = adbi.connect(conn)
+
+        def unit(db, value):
+            db.cursor().execute("INSERT INTO foo VALUES (%s)", (value,))
+            return value
+        self.assertEqual(adbi_conn.run_in_transaction(unit, 1), 1, "Got result of the unit of work")
+        self.assertFalse(conn.in_transaction, "Unit of work committed")
+
+        def failing(db):
+            db.cursor().execute("INSERT INTO foo VALUES (2)")
+            raise ValueError("failed")
+        with self.assertRaises(ValueError):
+            adbi_conn.run_in_transaction(failing)
+        self.assertEqual(conn.execute("SELECT id FROM foo").fetchall(), [(1,)], "Failed unit rolled back")
+
+    def test_cursor_pool(self):
+        mock_db = Mock()
+        mock_db.cursor.side_effect = lambda: Mock()
+        adbi_conn = ADBI(mock_db, 'qmark')
+        adbi_conn.cursor_pool_size = 1
+
+        curs_one = adbi_conn.cursor()
+        curs_two = adbi_conn.cursor()
+        driver_one = curs_one._cursor
+        driver_two = curs_two._cursor
+        curs_one.close()
+        curs_two.close()
+        driver_one.close.assert_not_called()
+        driver_two.close.assert_called_with()
+        self.assertIsNone(curs_one._cursor, "Closed cursor detached from the driver cursor")
+        curs_one.close()
+
+        curs = adbi_conn.cursor()
+        self.assertIs(curs._cursor, driver_one, "Idle driver cursor reused")
+        self.assertEqual(mock_db.cursor.call_count, 2, "No new driver cursor created")
+        curs.close()
+
+        # Cursors that cannot be reset are closed.
+        adbi_conn.dialect = Mock()
+        adbi_conn.dialect.reset_cursor.return_value = False
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT 1")
+        curs.close()
+        driver_one.close.assert_called_with()
+
+        # Closing the connection closes idle cursors.
+        adbi_conn.dialect.reset_cursor.return_value = True
+        curs = adbi_conn.cursor()
+        driver = curs._cursor
+        curs.close()
+        adbi_conn.close()
+        driver.close.assert_called_with()
+
+    def test_cursor_pool_reset(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        with patch.object(adbi_conn.dialect, 'reset_cursor', wraps=adbi_conn.dialect.reset_cursor) as reset:
+            self.assertEqual(adbi_conn.query("SELECT 1 UNION ALL SELECT 2"), [(1,), (2,)], "Got rows")
+            adbi_conn.execute("CREATE TABLE foo (id INTEGER)")
+            curs = adbi_conn.cursor()
+            curs.execute("SELECT 1 UNION ALL SELECT 2")
+            while curs.fetchone() is not None:
+                pass
+            curs.close()
+            curs = adbi_conn.cursor()
+            curs.execute("SELECT 1 UNION ALL SELECT 2")
+            self.assertEqual(curs.fetchmany(5), [(1,), (2,)], "Got every row")
+            curs.close()
+            self.assertEqual(reset.call_count, 0, "Exhausted cursors pooled without a reset")
+
+            curs = adbi_conn.cursor()
+            curs.execute("SELECT 1 UNION ALL SELECT 2")
+            self.assertEqual(curs.fetchmany(1), [(1,)], "Got the first row")
+            curs.close()
+            self.assertEqual(reset.call_count, 1, "Partly fetched cursor reset")
+            self.assertEqual(len(adbi_conn._idle_cursors), 1, "Cursor pooled")
+
+        curs = adbi_conn.cursor()
+        curs.arraysize = 50
+        curs.close()
+        self.assertEqual(adbi_conn.cursor().arraysize, 1, "Arraysize restored on release")
+
+    @patch('adbi.os.getpid')
+    def test_cursor_pool_reconnect(self, mock_getpid):
+        mock_getpid.return_value = 100
+        child_db = Mock()
+        adbi_conn = ADBI(Mock(), 'qmark', factory=Mock(return_value=child_db))
+        adbi_conn.cursor().close()
+
+        mock_getpid.return_value = 200
+        curs = adbi_conn.cursor()
+        self.assertEqual(curs._cursor, child_db.cursor.return_value, "Cursor from the new connection")
+
+    def test_execute_query(self):
+        conn = sqlite3.connect(':memory:')
+        adbi_conn = adbi.connect(conn)
+        adbi_conn.execute("CREATE TABLE foo (id INT)")
+        self.assertEqual(adbi_conn.execute("INSERT INTO foo VALUES (%s)", (1,)), 1, "Got rowcount")
+        adbi_conn.execute("INSERT INTO foo VALUES (%(id)s)", {'id': 2})
+        self.assertEqual(adbi_conn.query("SELECT id FROM foo WHERE id > %s ORDER BY id", (0,)), [(1,), (2,)],
+            "Got query results")
+        self.assertEqual(len(adbi_conn._idle_cursors), 1, "Single cursor reused for every call")
+
+    def build_bulk_conn(self, rows=50):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INT PRIMARY KEY, name TEXT, value INT)")
+        conn.executemany("INSERT INTO foo VALUES (?, ?, ?)", [(idex, str(idex), 0) for idex in range(rows)])
+        conn.commit()
+        return adbi.connect(conn)
+
+    def test_parallel_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'load.db')
+            factory = partial(sqlite3.connect, path, timeout=30, check_same_thread=False)
+            conn = factory()
+            conn.execute("CREATE TABLE foo (id INT PRIMARY KEY, name TEXT)")
+            conn.commit()
+            adbi_conn = ADBI(conn, None, factory)
+
+            stats = adbi_conn.parallel_load("INSERT INTO foo (id, name) VALUES (%(id)s, %(name)s)", range(250),
+                connections=3, batch_size=20, commit_every=2, prepare=prepare_row, workers=2)
+            self.assertEqual((stats.rows, stats.batches, stats.errors), (250, 13, []), "Loaded every row")
+            self.assertEqual(adbi_conn.query("SELECT COUNT(*), MAX(name) FROM foo"), [(250, 'row 99')],
+                "Rows prepared and loaded")
+
+            # Batches holding duplicate keys fail, the others are all kept.
+            rows = [(idex, 'new') for idex in range(240, 300)]
+            stats = adbi.parallel_load(factory, "INSERT INTO foo (id, name) VALUES (%s, %s)", iter(rows),
+                connections=2, batch_size=10, commit_every=3, stop_on_error=False, queue_size=1)
+            self.assertEqual([index for index, error in stats.errors], [0], "Errors reported by batch")
+            self.assertIsInstance(stats.errors[0][1], sqlite3.IntegrityError, "Got the batch error")
+            self.assertEqual((stats.rows, stats.batches), (50, 5), "Other batches loaded")
+            self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo"), [(300,)], "Failed batch rolled back")
+            with self.assertRaises(sqlite3.IntegrityError, msg="First error raised"):
+                adbi.parallel_load(factory, "INSERT INTO foo (id, name) VALUES (%s, %s)", rows, connections=2,
+                    batch_size=10)
+
+        with self.assertRaises(SystemError, msg="Requires a factory"):
+            adbi.connect(sqlite3.connect(':memory:')).parallel_load("SELECT 1", [])
+
+    def test_bulk_delete(self):
+        adbi_conn = self.build_bulk_conn()
+        adbi_conn.dialect.max_params = 8
+        with patch.object(adbi_conn, 'commit', wraps=adbi_conn.commit) as mock_commit:
+            deleted = adbi_conn.bulk_delete('foo', 'id', (idex for idex in range(0, 40, 2)), commit_every=2)
+        self.assertEqual(deleted, 20, "Got rows deleted")
+        self.assertEqual(mock_commit.call_count, 2, "Committed every two chunks and at the end")
+        self.assertEqual(len(adbi_conn._translations), 2, "One translation per chunk size")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo"), [(30,)], "Rows deleted")
+
+        deleted = adbi_conn.bulk_delete('foo', 'id', range(40, 50), temp_table_threshold=5)
+        self.assertEqual(deleted, 10, "Got rows deleted through a temporary table")
+        self.assertEqual(adbi_conn.query("SELECT MAX(id) FROM foo"), [(39,)], "Rows deleted")
+        self.assertEqual(adbi_conn.bulk_delete('foo', 'id', []), 0, "Nothing to delete")
+
+    def test_bulk_update(self):
+        adbi_conn = self.build_bulk_conn()
+        adbi_conn.dialect.max_params = 10
+        updated = adbi_conn.bulk_update('foo', 'id', ({'id': idex, 'name': 'n', 'value': idex} for idex in range(7)))
+        self.assertEqual(updated, 7, "Got rows updated")
+        self.assertEqual(adbi_conn.query("SELECT name, value FROM foo WHERE id IN (0, 6, 7) ORDER BY id"),
+            [('n', 0), ('n', 6), ('7', 0)], "Rows updated")
+
+        updated = adbi_conn.bulk_update('foo', 'id', [(idex, -idex) for idex in range(10, 30)], columns=['value'],
+            temp_table_threshold=10)
+        self.assertEqual(updated, 20, "Got rows updated through a temporary table")
+        self.assertEqual(adbi_conn.query("SELECT SUM(value) FROM foo WHERE id >= 10"), [(-390,)], "Rows updated")
+
+        with self.assertRaises(ValueError):
+            adbi_conn.bulk_update('foo', 'id', [(1, 2)])
+        with self.assertRaises(ValueError):
+            adbi_conn.bulk_update('foo', 'id', [(1, 2, 3)], columns=['value'])
+
+    def test_bulk_upsert(self):
+        adbi_conn = self.build_bulk_conn(10)
+        adbi_conn.dialect.max_params = 9
+        with patch.object(adbi_conn, 'commit', wraps=adbi_conn.commit) as mock_commit:
+            count = adbi_conn.bulk_upsert('foo', 'id', ['name', 'value'],
+                ((idex, 'n', idex) for idex in range(5, 15)), commit_every=2)
+        self.assertEqual(count, 10, "Got rows upserted")
+        self.assertEqual(mock_commit.call_count, 3, "Committed every two chunks and at the end")
+        self.assertEqual(len(adbi_conn._translations), 2, "One translation per chunk size")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*), SUM(value) FROM foo"), [(15, sum(range(5, 15)))],
+            "Rows inserted and updated")
+        self.assertEqual(adbi_conn.query("SELECT name FROM foo WHERE id IN (4, 5) ORDER BY id"), [('4',), ('n',)],
+            "Only given rows updated")
+
+        # Dialects without a native upsert merge through a temporary table.
+        adbi_conn.dialect = Dialect()
+        count = adbi_conn.bulk_upsert('foo', ['id'], ['value'], [{'id': idex, 'value': -1} for idex in range(12, 20)])
+        self.assertEqual(count, 8, "Got rows upserted through a temporary table")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*), SUM(value) FROM foo WHERE id >= 12"), [(8, -8)],
+            "Rows merged")
+        self.assertEqual(adbi_conn.bulk_upsert('foo', ['id', 'name'], [], [(1, '1'), (30, 'x')]), 2,
+            "Missing rows only inserted")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo"), [(21,)], "Missing row inserted")
+
+        with self.assertRaises(ValueError):
+            adbi_conn.bulk_upsert('foo', 'id', ['value'], [(1, 2, 3)])
+
+    def test_incremental_query(self):
+        adbi_conn = self.build_bulk_conn(5)
+        adbi_conn.execute("UPDATE foo SET value = id")
+        adbi_conn.commit()
+        query = adbi_conn.incremental_query("SELECT id, name, value FROM foo WHERE id < %s", 'value', params=[100],
+            name='foo_sync', batch_size=2)
+        self.assertEqual(len(query.refresh()), 5, "Got every row")
+        self.assertEqual(query.last_watermark, 4, "Got watermark")
+        self.assertEqual(query.refresh(), [], "No changes")
+
+        adbi_conn.execute("UPDATE foo SET name = 'changed', value = 10 WHERE id = 1")
+        adbi_conn.execute("INSERT INTO foo VALUES (5, 'new', 10), (6, 'new', 11)")
+        adbi_conn.commit()
+        with patch.object(adbi_conn, 'query', wraps=adbi_conn.query) as mock_query:
+            changed = query.refresh()
+        self.assertEqual(changed, [(1, 'changed', 10), (5, 'new', 10), (6, 'new', 11)], "Got changed rows")
+        self.assertEqual(mock_query.call_count, 0, "Full query not run")
+        self.assertEqual((len(query), query[1], 6 in query), (7, (1, 'changed', 10), True), "Rows merged")
+        self.assertFalse(adbi_conn.in_transaction, "Position committed")
+
+        # A new object continues from the stored position.
+        query = adbi_conn.incremental_query("SELECT id, name, value FROM foo WHERE id < %s", 'value', params=[100],
+            name='foo_sync')
+        self.assertEqual(query.position, [11, 6], "Position loaded")
+        self.assertEqual(query.refresh(), [], "No changes since")
+        query.reset()
+        self.assertEqual(len(query.refresh()), 7, "Every row fetched after a reset")
+
+    def test_backfill(self):
+        adbi_conn = self.build_bulk_conn(25)
+        with patch('adbi.backfill.time.sleep') as mock_sleep:
+            count = adbi_conn.backfill('values', 'foo', 'id',
+                "UPDATE foo SET value = id * %(factor)s WHERE id BETWEEN %(start)s AND %(end)s",
+                params={'factor': 2}, batch_size=6, rows_per_sec=1000)
+        self.assertEqual(count, 25, "Got rows processed")
+        self.assertEqual(mock_sleep.call_count, 4, "Throttled between full batches")
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 0.006, 2, "Throttled to the row rate")
+        self.assertEqual(adbi_conn.query("SELECT SUM(value) FROM foo"), [(2 * sum(range(25)),)], "Rows updated")
+        self.assertEqual(adbi_conn.query("SELECT variable FROM _schema_info"), [], "Progress removed once done")
+
+        # Resume from a checkpoint left by an interrupted run.
+        batches = []
+
+        def fail(conn, rows):
+            batches.append(rows)
+            if len(batches) == 2:
+                raise ValueError("interrupted")
+            conn.execute("UPDATE foo SET name = %s WHERE id >= %s AND id <= %s", ('done', rows[0][0], rows[-1][0]))
+
+        with self.assertRaises(ValueError):
+            adbi_conn.backfill('names', 'foo', ['id'], function=fail, columns=['name'], batch_size=10)
+        self.assertEqual(adbi_conn.query("SELECT value FROM _schema_info WHERE variable = 'backfill:names'"),
+            [('[9]',)], "Progress recorded")
+        self.assertEqual(batches[0][0], (0, '0'), "Requested columns selected")
+        count = adbi_conn.backfill('names', 'foo', ['id'], function=lambda conn, rows: batches.append(rows),
+            batch_size=10)
+        self.assertEqual(count, 15, "Resumed after the last batch")
+        self.assertEqual(batches[2][0], (10,), "First batch after the checkpoint")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo WHERE name = 'done'"), [(10,)],
+            "Failed batch rolled back")
+
+        # Only the rows matching the where condition are given to functions.
+        adbi_conn.execute("UPDATE foo SET value = 0, name = CASE WHEN id IN (3, 4, 8) THEN 'skip' ELSE 'keep' END")
+        count = adbi_conn.backfill('where', 'foo', 'id', function=lambda conn, rows: [
+            conn.execute("UPDATE foo SET value = 1 WHERE id = %s", row) for row in rows],
+            where='name = %s', params=['keep'], batch_size=4)
+        self.assertEqual(count, 22, "Got rows processed")
+        self.assertEqual(adbi_conn.query("SELECT id FROM foo WHERE value = 0 ORDER BY id"), [(3,), (4,), (8,)],
+            "Rows excluded by the condition left alone")
+
+        operation = "UPDATE foo SET value = 1 WHERE id BETWEEN %(start)s AND %(end)s"
+        with self.assertRaises(ValueError, msg="Operation ranges would include excluded rows"):
+            adbi_conn.backfill('bad', 'foo', 'id', operation, where='name = %s', params=['keep'])
+        with self.assertRaises(ValueError, msg="Positional params cannot be given to an operation"):
+            adbi_conn.backfill('bad', 'foo', 'id', operation, params=['keep'])
+        with self.assertRaises(ValueError):
+            adbi_conn.backfill('bad', 'foo', 'id')
+        with self.assertRaises(ValueError):
+            adbi_conn.backfill('bad', 'foo', 'id', function=print, duty_cycle=2)
+
+    def test_backfill_timestamp_key(self):
+        conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("CREATE TABLE event (created TIMESTAMP, done INT)")
+        start = datetime(2024, 1, 1, 12, 0)
+        conn.executemany("INSERT INTO event VALUES (?, 0)", [(start + timedelta(minutes=idex),) for idex in range(10)])
+        adbi_conn = adbi.connect(conn)
+        batches = []
+
+        def mark(conn, rows):
+            batches.append(rows)
+            if len(batches) == 2:
+                raise ValueError("interrupted")
+            conn.execute("UPDATE event SET done = 1 WHERE created BETWEEN %s AND %s", (rows[0][0], rows[-1][0]))
+
+        with self.assertRaises(ValueError):
+            adbi_conn.backfill('events', 'event', 'created', function=mark, batch_size=4)
+        count = adbi_conn.backfill('events', 'event', 'created', function=mark, batch_size=4)
+        self.assertEqual(count, 6, "Resumed after the stored timestamp")
+        self.assertEqual(batches[2][0], (start + timedelta(minutes=4),), "Timestamp key restored")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM event WHERE done = 1"), [(10,)], "Every row done")
+
+    def test_throttle_delay(self):
+        self.assertEqual(throttle_delay(100, 0.5), 0, "No throttling")
+        self.assertEqual(throttle_delay(100, 0.5, rows_per_sec=100), 0.5, "Throttled to row rate")
+        self.assertEqual(throttle_delay(100, 0.5, duty_cycle=0.25), 1.5, "Throttled to duty cycle")
+
+    def test_update_schema_python_step(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ('schema-current.sql', 'schema-0.1.0.sql'):
+                Path(tmp_dir, name).write_text(Path('tests/sql', name).read_text())
+            Path(tmp_dir, 'schema-0.2.0.sql').write_text(Path('tests/sql/schema-0.2.0.sql').read_text()
+                + "ALTER TABLE table_one ADD COLUMN upper varchar(64);")
+            Path(tmp_dir, 'schema-0.2.0.py').write_text(
+                "def upgrade(conn):\n"
+                "    conn.backfill('upper', 'table_one', 'id',\n"
+                "        'UPDATE table_one SET upper = UPPER(value) WHERE id BETWEEN %(start)s AND %(end)s',\n"
+                "        batch_size=2)\n")
+            conn = sqlite3.connect(':memory:')
+            adbi_conn = adbi.connect(conn)
+            adbi_conn.schema_dir = tmp_dir
+            conn.executescript(Path(tmp_dir, 'schema-0.1.0.sql').read_text())
+            adbi_conn._validate_schema_table()
+            adbi_conn._set_schema_info('schema_version', '0.1.0')
+
+            schemas, version = adbi_conn._get_upgrade_path()
+            self.assertEqual([schema.name for schema in schemas], ['schema-0.2.0.sql', 'schema-0.2.0.py'],
+                "Python step applied after the SQL file")
+            adbi_conn.update_schema()
+            self.assertEqual(adbi_conn.query("SELECT upper FROM table_one ORDER BY id"),
+                [('FOO',), ('BAR',), ('BAZ',)], "Backfill applied")
+            self.assertEqual(adbi_conn.current_schema_version(), '0.2.0', "Version recorded")
+
+            # Fresh databases record their version.
+            fresh = adbi.connect(sqlite3.connect(':memory:'))
+            fresh.schema_dir = tmp_dir
+            fresh.update_schema()
+            self.assertEqual(fresh.current_schema_version(), '0.2.0', "Version recorded")
+
+            Path(tmp_dir, 'schema-0.3.0.py').write_text("value = 1\n")
+            with self.assertRaises(SystemError):
+                adbi_conn.update_schema()
+
+    def test_update_schema_resume_python_step(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            Path(tmp_dir, 'schema-0001.sql').write_text("CREATE TABLE foo (id INT, a INT);\n")
+            Path(tmp_dir, 'schema-0002.sql').write_text("ALTER TABLE foo ADD COLUMN b INT;\n")
+            Path(tmp_dir, 'schema-0002.py').write_text(
+                "from pathlib import Path\n"
+                "def fill(conn, rows):\n"
+                "    if rows[0][0] >= 10 and Path(__file__).with_name('crash').exists():\n"
+                "        raise RuntimeError('crashed')\n"
+                "    conn.execute('UPDATE foo SET b = a WHERE id BETWEEN %s AND %s', (rows[0][0], rows[-1][0]))\n"
+                "def upgrade(conn):\n"
+                "    conn.backfill('b', 'foo', 'id', function=fill, batch_size=10)\n")
+            Path(tmp_dir, 'crash').write_text('')
+            adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+            adbi_conn.schema_dir = tmp_dir
+            adbi_conn.execute("CREATE TABLE foo (id INT, a INT)")
+            adbi_conn.cursor().executemany("INSERT INTO foo VALUES (%s, %s)", [(idex, idex) for idex in range(25)])
+            adbi_conn._validate_schema_table()
+            adbi_conn._set_schema_info('schema_version', '0001')
+            adbi_conn.commit()
+
+            with self.assertRaises(RuntimeError):
+                adbi_conn.update_schema()
+            self.assertEqual(adbi_conn.current_schema_version(), '0001', "Version not recorded")
+            self.assertEqual(adbi_conn.query("SELECT value FROM _schema_info WHERE variable = 'backfill:b'"),
+                [('[9]',)], "Backfill checkpoint left")
+
+            Path(tmp_dir, 'crash').unlink()
+            adbi_conn.update_schema()
+            self.assertEqual(adbi_conn.current_schema_version(), '0002', "Upgrade completed")
+            self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo WHERE b = a"), [(25,)], "Backfill resumed")
+            self.assertEqual(adbi_conn.query("SELECT variable FROM _schema_info ORDER BY variable"),
+                [('schema_version',)], "Step marker and checkpoint removed")
+
+    def test_update_schema_format_without_suffix(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            Path(tmp_dir, 'schema-0001').write_text("CREATE TABLE foo (id INT, a INT);\n")
+            Path(tmp_dir, 'schema-0002').write_text("ALTER TABLE foo ADD COLUMN b INT;\n")
+            Path(tmp_dir, 'schema-0002.py').write_text(
+                "def upgrade(conn):\n"
+                "    conn.execute('UPDATE foo SET b = a')\n")
+            adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+            adbi_conn.schema_dir = tmp_dir
+            adbi_conn.schema_file_format = 'schema-{version}'
+            adbi_conn.execute("CREATE TABLE foo (id INT, a INT)")
+            adbi_conn.execute("INSERT INTO foo VALUES (1, 2)")
+            adbi_conn._validate_schema_table()
+            adbi_conn._set_schema_info('schema_version', '0001')
+
+            schemas, version = adbi_conn._get_upgrade_path()
+            self.assertEqual([schema.name for schema in schemas], ['schema-0002', 'schema-0002.py'],
+                "Python file matched as the Python step")
+            self.assertEqual(adbi_conn._schema_file_version(Path(tmp_dir, 'schema-0002.py')), '0002',
+                "Got the version of the Python file")
+            adbi_conn.update_schema()
+            self.assertEqual(adbi_conn.query("SELECT b FROM foo"), [(2,)], "Python step applied")
+            self.assertEqual(adbi_conn.current_schema_version(), '0002', "Version recorded")
+
+    def test_split_statements(self):
+        script = """
+            -- Leading comment; with a semicolon.
+            CREATE TABLE foo (id INT, value TEXT DEFAULT 'a;b');
+            /* block; comment */
+            INSERT INTO foo VALUES (1, 'it''s; here');
+            CREATE TRIGGER foo_trigger AFTER INSERT ON foo BEGIN
+                UPDATE foo SET value = 'x' WHERE id = new.id;
+                DELETE FROM foo WHERE id < 0;
+            END;
+            CREATE TRIGGER foo_case AFTER UPDATE ON foo BEGIN
+                UPDATE foo SET value = CASE WHEN new.id > 1 THEN 'big' ELSE 'small'
+                END;
+                UPDATE foo SET value = 'end;' WHERE id = -1;
+            END;
+            SELECT $$a;b$$
+        """
+        statements = split_statements(script)
+        self.assertEqual(len(statements), 5, "Got statements")
+        self.assertTrue(statements[0].endswith("DEFAULT 'a;b')"), "Semicolons in comments and strings kept")
+        self.assertEqual(statements[1], "/* block; comment */\n            INSERT INTO foo VALUES (1, 'it''s; here')",
+            "Escaped quotes handled")
+        self.assertTrue(statements[2].endswith('END'), "Trigger body kept whole")
+        self.assertTrue(statements[3].startswith('CREATE TRIGGER foo_case') and statements[3].endswith('END'),
+            "Trigger body with a CASE expression kept whole")
+        self.assertEqual(statements[4], 'SELECT $$a;b$$', "Dollar quotes handled")
+        self.assertEqual(split_statements("BEGIN; SELECT CASE WHEN 1 THEN 2 END; END"),
+            ['BEGIN', 'SELECT CASE WHEN 1 THEN 2 END', 'END'], "Transactions are not blocks")
+        with self.assertRaises(ValueError):
+            split_statements("SELECT 'unterminated")
+
+    def test_squash_schema_bundle(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ('schema-current.sql', 'schema-0.1.0.sql', 'schema-0.2.0.sql', 'schema-1.0.0.sql'):
+                Path(tmp_dir, name).write_text(Path('tests/sql', name).read_text())
+            adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+            adbi_conn.schema_dir = tmp_dir
+            with self.assertRaises(ValueError):
+                adbi_conn.squash_schema('0.1.0', '0.3.0')
+
+            path = adbi_conn.squash_schema('0.2.0', '1.0.0')
+            self.assertEqual(path, Path(tmp_dir, 'schema-1.0.0.sql'), "Squashed into the last version")
+            self.assertFalse(Path(tmp_dir, 'schema-0.2.0.sql').exists(), "Squashed files removed")
+            self.assertTrue(path.read_text().startswith('-- adbi squashed 0.2.0 1.0.0 sha256='), "Range recorded")
+
+            # Upgrade from the bundle, without reading the schema directory.
+            bundle_path = Path(tmp_dir, 'schema.json')
+            bundle = adbi_conn.build_schema_bundle(bundle_path)
+            self.assertEqual([entry['file'] for entry in bundle['entries']],
+                ['schema-0.1.0.sql', 'schema-1.0.0.sql', 'schema-current.sql'], "Got bundled files")
+            self.assertEqual(len(bundle['entries'][1]['statements']), 5, "Statements pre-split")
+            curs = adbi_conn.connection.cursor()
+            curs.executescript(Path('tests/sql/schema-0.1.0.sql').read_text())
+            adbi_conn._validate_schema_table()
+            adbi_conn._set_schema_info('schema_version', '0.1.0')
+            with patch('adbi.Path.iterdir') as mock_iterdir:
+                adbi_conn.update_schema(bundle_path)
+            mock_iterdir.assert_not_called()
+            self.validate_test_schema(curs)
+            self.assertEqual(adbi_conn.current_schema_version(), '1.0.0', "Version recorded")
+
+            # Databases within the squashed range cannot be upgraded.
+            adbi_conn._set_schema_info('schema_version', '0.2.0')
+            with self.assertRaises(SystemError):
+                adbi_conn.update_schema(bundle_path)
+            with self.assertRaises(SystemError, msg="Squashed range checked in the schema directory"):
+                adbi_conn.update_schema()
+
+            # Modified files and bundles are detected.
+            path.write_text(path.read_text().replace('foofoo', 'changed'))
+            with self.assertRaises(ValueError):
+                adbi_conn.build_schema_bundle(bundle_path)
+            bundle['entries'][0]['statements'][0] = 'DROP TABLE table_one'
+            bundle_path.write_text(json.dumps(bundle))
+            with self.assertRaises(ValueError):
+                adbi_conn.update_schema(bundle_path)
+
+    def test_load_queries(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        catalog = adbi_conn.load_queries('tests/queries')
+        self.assertIs(catalog, adbi_conn.queries, "Got query catalog")
+        self.assertEqual(catalog.names(), ['create_users', 'add_user', 'get_user', 'users_between', 'users_like'],
+            "Got loaded queries")
+        self.assertEqual(catalog.get_user.doc, 'Return the user with the given id.', "Got query description")
+        self.assertEqual(catalog.get_user.params, ['id'], "Got placeholder names")
+        self.assertEqual(len(adbi_conn._prepared), 5, "Queries translated when loaded")
+
+        catalog.create_users()
+        self.assertEqual(catalog.add_user(id=1, name='alice'), 1, "Writes return the rowcount")
+        catalog.add_user(id=2, name='bob')
+        self.assertEqual(catalog.get_user(id=2), [(2, 'bob')], "Reads return the rows")
+        self.assertEqual(catalog.users_between(1, 2), [(1,), (2,)], "Positional placeholders")
+        self.assertEqual(catalog.users_like(), [('alice',)], "Literal percent without placeholders")
+
+        with patch('adbi.ADBICursor._convert_operation_with_params') as mock_convert:
+            catalog.get_user(id=1)
+        mock_convert.assert_not_called()
+
+        with self.assertRaises(TypeError):
+            catalog.get_user(ident=1)
+        with self.assertRaises(TypeError):
+            catalog.users_between(1)
+        with self.assertRaises(AttributeError):
+            catalog.get_users
+        with self.assertRaises(ValueError):
+            catalog.load('tests/queries/users.sql')
+
+    def test_load_queries_invalid(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        invalid = [
+            "-- name: bad\nSELECT * FROM foo WHERE id = %(id)s AND name LIKE 'a%'",
+            "-- name: bad\nSELECT * FROM foo WHERE id = %(id)s AND name = %s",
+            "-- name: bad\nSELECT * FROM foo WHERE id = %(user id)s",
+            "-- name: names\nSELECT 1",
+            "-- name: empty\n",
+            "SELECT 1\n-- name: late\nSELECT 2",
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'queries.sql')
+            for text in invalid:
+                path.write_text(text)
+                with self.assertRaises(ValueError, msg=text):
+                    adbi_conn.load_queries(path)
+        self.assertEqual(len(adbi_conn.queries), 0, "Nothing loaded")
+
+    def test_warm_up(self):
+        adbi_conn = self.build_bulk_conn(5)
+        recorder = adbi_conn.record_statements()
+        for idex in range(3):
+            adbi_conn.query("SELECT name FROM foo WHERE id = %(id)s", {'id': idex})
+        adbi_conn.query("SELECT name FROM foo WHERE id IN (%s, %s)", (1, 2))
+        adbi_conn.query("SELECT COUNT(*) FROM foo")
+        self.assertEqual(recorder.top(2), [
+            ("SELECT name FROM foo WHERE id = %(id)s", 'mapping', 3),
+            ("SELECT name FROM foo WHERE id IN (%s, %s)", 2, 1),
+        ], "Got most frequent statements")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'manifest.json')
+            adbi_conn.save_manifest(path, reads=[("SELECT * FROM foo WHERE id > %s", [0])])
+
+            fresh = self.build_bulk_conn(5)
+            fresh.cursor_pool_size = 2
+            with patch.object(fresh, 'query', wraps=fresh.query) as mock_query:
+                self.assertEqual(fresh.warm_up(path), 3, "Statements translated")
+            mock_query.assert_called_once_with("SELECT * FROM foo WHERE id > %s", [0])
+            self.assertEqual(len(fresh._idle_cursors), 2, "Cursor pool filled")
+            with patch('adbi.ADBICursor._convert_operation_with_params') as mock_convert:
+                self.assertEqual(fresh.query("SELECT name FROM foo WHERE id = %(id)s", {'id': 4}), [('4',)],
+                    "Warmed statement executed")
+                fresh.query("SELECT name FROM foo WHERE id IN (%s, %s)", (3, 4))
+            mock_convert.assert_not_called()
+
+            fresh.warm_up(path, reads=False, on_reconnect=True)
+            self.assertEqual(len(fresh._reconnect_hooks), 1, "Warm up repeated on reconnect")
+
+        # Rarely executed statements are dropped to bound the counts.
+        recorder = StatementRecorder(max_statements=2)
+        for idex in range(10):
+            recorder.record("SELECT 1", 0)
+            recorder.record("SELECT {0} AS literal".format(idex), 0)
+        self.assertLessEqual(len(recorder._counts), 4, "Counts bounded")
+        self.assertEqual(recorder.top(1), [("SELECT 1", 0, 10)], "Frequent statement kept")
+
+        with self.assertRaises(ValueError):
+            fresh.warm_up({'format': 0})
+        with self.assertRaises(SystemError):
+            fresh.save_manifest('unused.json')
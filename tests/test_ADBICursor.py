@@ -1,8 +1,16 @@
 from unittest import TestCase
 from unittest.mock import Mock, patch
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 from pathlib import Path
+import gzip
+import io
+import json
 import sqlite3
 import sys
+import tempfile
+import threading
+import time
 import adbi
 from adbi import ADBI, ADBICursor
 
@@ -570,3 +578,192 @@ class TestADBICursor(TestCase):
         mock_curs.reset_mock()
         curs.executefile(str(exec_file))
         mock_curs.execute.assert_called_with(exec_data)
+
+    def build_export_cursor(self, rows=25):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE export (id INT NOT NULL, name VARCHAR(16))")
+        conn.executemany("INSERT INTO export VALUES (?, ?)", [(idex, 'name,{0}'.format(idex)) for idex in range(rows)])
+        curs = adbi.connect(conn).cursor()
+        curs.execute("SELECT id, name FROM export ORDER BY id")
+        return curs
+
+    def test_export_csv(self):
+        curs = self.build_export_cursor()
+        dest = io.StringIO()
+        with patch.object(curs, 'fetchmany', wraps=curs.fetchmany) as mock_fetch:
+            stats = curs.export(dest, batch_size=10)
+        self.assertEqual(mock_fetch.call_count, 4, "Rows fetched in batches")
+        mock_fetch.assert_called_with(10)
+
+        lines = dest.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id,name', "Header taken from the description")
+        self.assertEqual(lines[1], '0,"name,0"', "Values quoted as required")
+        self.assertEqual(len(lines), 26, "Every row written")
+        self.assertEqual(stats.rows, 25, "Got number of rows exported")
+        self.assertEqual(stats.bytes, len(dest.getvalue()), "Got number of bytes written")
+
+        # Without a header.
+        curs = self.build_export_cursor()
+        dest = io.StringIO()
+        curs.export(dest, header=False)
+        self.assertEqual(dest.getvalue().splitlines()[0], '0,"name,0"', "No header written")
+
+    def test_export_jsonl(self):
+        curs = self.build_export_cursor(3)
+        dest = io.BytesIO()
+        stats = curs.export(dest, format='jsonl')
+        lines = dest.getvalue().decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'id': 0, 'name': 'name,0'},
+            {'id': 1, 'name': 'name,1'},
+            {'id': 2, 'name': 'name,2'},
+        ], "Rows written as JSON objects")
+        self.assertEqual(stats.bytes, len(dest.getvalue()), "Got number of bytes written")
+
+    def test_export_compressed_path(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, 'export.csv.gz')
+            stats = self.build_export_cursor().export(path)
+            self.assertEqual(stats.bytes, path.stat().st_size, "Compressed size reported")
+            with gzip.open(path, 'rt') as export_file:
+                self.assertEqual(len(export_file.read().splitlines()), 26, "Compressed file readable")
+
+            writers = []
+
+            class CountingWriter(adbi.export._CountingWriter):
+                def __init__(self, fileobj):
+                    super().__init__(fileobj)
+                    writers.append(self)
+
+            with patch('adbi.export._CountingWriter', CountingWriter):
+                self.build_export_cursor().export(path)
+            self.assertTrue(writers[0].closed, "Counting writer closed with the file")
+
+            path = Path(tmp_dir, 'export.zip')
+            with self.assertRaises(ValueError):
+                self.build_export_cursor().export(path, compression='zip')
+            self.assertFalse(path.exists(), "Nothing written for an unknown compression")
+
+        with self.assertRaises(ValueError):
+            self.build_export_cursor().export(io.StringIO(), compression='gzip')
+        with self.assertRaises(ValueError):
+            self.build_export_cursor().export(io.BytesIO(), compression='zip')
+
+    def test_export_errors(self):
+        with self.assertRaises(ValueError):
+            self.build_export_cursor().export(io.StringIO(), format='parquet')
+
+        curs = adbi.connect(sqlite3.connect(':memory:')).cursor()
+        with self.assertRaises(SystemError):
+            curs.export(io.StringIO())
+
+    def test_fetchall_spill(self):
+        curs = self.build_export_cursor(25)
+        rows = curs.fetchall(spill_threshold=100, batch_size=4)
+        expected = [(idex, 'name,{0}'.format(idex)) for idex in range(25)]
+        self.assertTrue(rows.spilled, "Rows spilled to disk")
+        self.assertEqual(len(rows), 25, "Got number of rows")
+        self.assertEqual(rows[0], expected[0], "Got row held in memory")
+        self.assertEqual(rows[13], expected[13], "Got spilled row")
+        self.assertEqual(rows[-1], expected[-1], "Got last row")
+        self.assertEqual(rows[5:20:3], expected[5:20:3], "Got slice")
+        self.assertEqual(list(rows), expected, "Iterated rows")
+        with self.assertRaises(IndexError):
+            rows[25]
+        rows.close()
+
+        # Small results stay in memory.
+        with self.build_export_cursor(3).fetchall(spill_threshold=1 << 20) as rows:
+            self.assertFalse(rows.spilled, "Rows kept in memory")
+            self.assertEqual(list(rows), expected[:3], "Got rows")
+
+    def test_paginate(self):
+        curs = self.build_export_cursor(25)
+        expected = [(idex, 'name,{0}'.format(idex)) for idex in range(25)]
+        pages = list(curs.paginate("SELECT id, name FROM export WHERE id >= %s", (5,), 'id', 8))
+        self.assertEqual([len(page.rows) for page in pages], [8, 8, 4], "Got pages")
+        self.assertEqual([row for page in pages for row in page.rows], expected[5:], "Got every row in order")
+        self.assertIsNone(pages[-1].token, "No token on the last page")
+
+        # Resume from a token, with named parameters.
+        token = pages[0].token
+        pages = list(curs.paginate("SELECT id, name FROM export WHERE id >= %(min)s", {'min': 5}, ['id'], 8, token))
+        self.assertEqual(pages[0].rows, expected[13:21], "Resumed after the token")
+
+        # Literal percent signs without params.
+        pages = list(curs.paginate("SELECT id, name FROM export WHERE name LIKE 'name,%'", page_size=8))
+        self.assertEqual([row for page in pages for row in page.rows], expected, "Got every page")
+
+        # Descending with a compound key.
+        pages = curs.paginate("SELECT name, id FROM export", key_columns=['export.id', 'name'], page_size=10,
+            descending=True)
+        page = next(pages)
+        self.assertEqual(page.rows[0], ('name,24', 24), "Got first descending row")
+        self.assertEqual(next(pages).rows[0], ('name,14', 14), "Seeked past compound key")
+
+        with patch.object(curs, 'execute', wraps=curs.execute) as mock_execute:
+            list(curs.paginate("SELECT id FROM export", page_size=25))
+        self.assertIn('WHERE (id > %s)', mock_execute.call_args[0][0], "Keyset predicate used")
+        self.assertNotIn('OFFSET', mock_execute.call_args[0][0], "No offset used")
+
+        with self.assertRaises(ValueError):
+            list(curs.paginate("SELECT id FROM export", token='not a token'))
+        with self.assertRaises(ValueError):
+            list(curs.paginate("SELECT id FROM export", key_columns=['id', 'name'], token=token))
+
+    def test_paginate_typed_keys(self):
+        conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("CREATE TABLE event (created TIMESTAMP, name TEXT)")
+        start = datetime(2024, 1, 1, 12, 0)
+        conn.executemany("INSERT INTO event VALUES (?, ?)",
+            [(start + timedelta(minutes=idex), 'event {0}'.format(idex)) for idex in range(10)])
+        curs = adbi.connect(conn).cursor()
+        pages = curs.paginate("SELECT created, name FROM event", key_columns='created', page_size=4)
+        token = next(pages).token
+        self.assertEqual(adbi.paging.decode_token(token), [start + timedelta(minutes=3)], "Timestamp kept in token")
+        pages = list(curs.paginate("SELECT created, name FROM event", key_columns='created', page_size=4,
+            token=token))
+        self.assertEqual([row[1] for row in pages[0].rows], ['event {0}'.format(idex) for idex in range(4, 8)],
+            "Resumed after the timestamp")
+
+        key = [Decimal('1.10'), date(2024, 2, 29), 'name', 3, datetime(2024, 3, 1, 8, 30, 15, 250),
+            datetime(2024, 3, 1, 8, 30, tzinfo=timezone(timedelta(hours=-5)))]
+        self.assertEqual(adbi.paging.decode_token(adbi.paging.encode_token(key)), key, "Typed keys round trip")
+        with self.assertRaises(ValueError):
+            adbi.paging.decode_token(adbi.paging.encode_token([{'decimal': 'x'}]))
+
+    def test_execute_timeout(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:', check_same_thread=False))
+        slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+        curs = adbi_conn.cursor()
+        with self.assertRaises(TimeoutError, msg="Slow statement cancelled"):
+            curs.execute(slow, timeout=0.05)
+        curs.execute("SELECT %s", [1], timeout=5)
+        self.assertEqual(curs.fetchall(), [(1,)], "Connection usable after cancelling")
+
+        adbi_conn.statement_timeout = 0.05
+        with self.assertRaises(TimeoutError, msg="Default timeout applied"):
+            adbi_conn.query(slow)
+        self.assertEqual(adbi_conn.query("SELECT 1"), [(1,)], "Fast statements unaffected")
+        self.assertEqual([thread.name for thread in threading.enumerate()].count('adbi-deadlines'), 1,
+            "Deadlines share a timer thread")
+
+        # The deadline of query also covers fetching the rows.
+        adbi_conn.statement_timeout = None
+        many = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 3000000) SELECT i FROM n"
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError, msg="Slow fetch cancelled"):
+            adbi_conn.query(many, timeout=0.05)
+        adbi_conn.single_flight = adbi.SingleFlight()
+        with self.assertRaises(TimeoutError, msg="Slow shared fetch cancelled"):
+            adbi_conn.query(many, timeout=0.05)
+        self.assertLess(time.monotonic() - start, 2, "Fetches stopped at their deadline")
+        adbi_conn.single_flight = None
+
+        # Time spent waiting for the scheduler counts towards the deadline.
+        adbi_conn.scheduler = adbi.Scheduler(1)
+        adbi_conn.scheduler.acquire()
+        with self.assertRaises(TimeoutError, msg="Deadline passed while queued"):
+            adbi_conn.query("SELECT 1", timeout=0.01)
+        adbi_conn.scheduler.release()
+        self.assertEqual(adbi_conn.scheduler.stats()['classes']['interactive']['timeouts'], 1, "Queue timeout")
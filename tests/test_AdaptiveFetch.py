@@ -0,0 +1,55 @@
+from unittest import TestCase
+import sqlite3
+import adbi
+from adbi import AdaptiveFetch
+
+
+class TestAdaptiveFetch(TestCase):
+
+    def test_size_for(self):
+        adaptive = AdaptiveFetch(initial_size=50)
+        self.assertEqual(adaptive.size_for('unknown'), 50, "Initial size used for unseen statements")
+
+    def test_observe_memory_budget(self):
+        adaptive = AdaptiveFetch(target_bytes=1000, target_latency=10, initial_size=10)
+        rows = [('x' * 92, 1)] * 10
+        adaptive.observe('key', rows, 0.001)
+        self.assertEqual(adaptive.size_for('key'), 10, "Batch sized to the memory budget")
+
+        adaptive.observe('key', [], 0.001)
+        self.assertEqual(adaptive.size_for('key'), 10, "Empty fetches are ignored")
+
+        adaptive.observe('narrow', [(1,)] * 10, 0.0001)
+        self.assertEqual(adaptive.size_for('narrow'), 40, "Growth is limited per fetch")
+        for count in range(5):
+            adaptive.observe('narrow', [(1,)] * 10, 0.0001)
+        self.assertEqual(adaptive.size_for('narrow'), 125, "Grows up to the memory budget")
+        self.assertEqual(adaptive.sizes(), {'key': 10, 'narrow': 125}, "Got learned sizes")
+
+    def test_observe_latency(self):
+        adaptive = AdaptiveFetch(target_bytes=1 << 20, target_latency=0.1, initial_size=100, max_size=1000)
+        adaptive.observe('slow', [(1,)] * 100, 1.0)
+        self.assertEqual(adaptive.size_for('slow'), 10, "Batch sized to the latency target")
+
+        adaptive = AdaptiveFetch(target_bytes=1 << 20, target_latency=1, initial_size=100, max_size=150)
+        adaptive.observe('fast', [(1,)] * 100, 0.0)
+        self.assertEqual(adaptive.size_for('fast'), 150, "Batch size capped")
+
+    def test_cursor_fetchmany(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INT, value TEXT)")
+        conn.executemany("INSERT INTO foo VALUES (?, ?)", [(idex, 'x' * 92) for idex in range(100)])
+        adbi_conn = adbi.connect(conn)
+        adbi_conn.adaptive_fetch = AdaptiveFetch(target_bytes=2000, target_latency=10, initial_size=5)
+
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT id, value FROM foo WHERE id >= %s", (0,))
+        self.assertEqual(len(curs.fetchmany()), 5, "Initial size used")
+        self.assertEqual(len(curs.fetchmany()), 20, "Learned size used")
+        self.assertEqual(len(curs.fetchmany(3)), 3, "Explicit size respected")
+
+        # The size is shared with other cursors running the same statement.
+        other = adbi_conn.cursor()
+        other.execute("SELECT id, value FROM foo WHERE id >= %s", (50,))
+        self.assertEqual(len(other.fetchmany()), 20, "Learned size shared between cursors")
+        self.assertEqual(adbi_conn.adaptive_fetch.sizes(), {curs.fingerprint: 20}, "Size stored by fingerprint")
@@ -0,0 +1,150 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import sqlite3
+import tempfile
+from pathlib import Path
+import adbi
+from adbi import dialects
+from adbi.dialects import Dialect, SQLiteDialect, PostgreSQLDialect, MySQLDialect
+
+
+class TestDialect(TestCase):
+
+    def test_dialect_for(self):
+        self.assertIsInstance(dialects.dialect_for(sqlite3.connect(':memory:')), SQLiteDialect,
+            "Got dialect for sqlite3")
+        self.assertIsInstance(dialects.dialect_for(Mock()), Dialect, "Got generic dialect")
+
+        mock_conn = Mock()
+        mock_conn.__class__ = type('Connection', (), {'__module__': 'psycopg2.extensions'})
+        self.assertIsInstance(dialects.dialect_for(mock_conn), PostgreSQLDialect, "Parent module matched")
+
+    def test_register_dialect(self):
+        class TestingDialect(Dialect):
+            pass
+        mock_conn = Mock()
+        mock_conn.__class__ = type('Connection', (), {'__module__': 'test_driver'})
+        dialects.register_dialect('test_driver', TestingDialect)
+        self.addCleanup(dialects.DIALECTS.pop, 'test_driver')
+        self.assertIsInstance(dialects.dialect_for(mock_conn), TestingDialect, "Registered dialect used")
+
+    def test_adbi_dialect(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        self.assertIsInstance(adbi_conn.dialect, SQLiteDialect, "ADBI object has a dialect")
+
+    def test_generic(self):
+        dialect = Dialect()
+        self.assertIsNone(dialect.explain(Mock(), 'SELECT 1', None), "Plans not supported")
+        self.assertEqual(dialect.full_scans(['anything']), [], "No scans found")
+
+        mock_curs = Mock()
+        mock_curs.fetchone.return_value = (12,)
+        self.assertEqual(dialect.table_rows(mock_curs, 'foo'), 12, "Got table rows")
+        mock_curs.execute.assert_called_with('SELECT COUNT(*) FROM foo')
+
+    def test_sqlite(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INTEGER PRIMARY KEY, value INT)")
+        dialect = SQLiteDialect()
+        plan = dialect.explain(conn.cursor(), 'SELECT * FROM foo WHERE value = ?', [1])
+        self.assertEqual(plan, ['SCAN foo'], "Got plan")
+        self.assertEqual(dialect.full_scans(plan + ['SEARCH foo USING INTEGER PRIMARY KEY (rowid=?)']),
+            ['foo'], "Got full scans")
+        self.assertEqual(dialect.full_scans(['SCAN TABLE foo', 'SEARCH TABLE bar USING INTEGER PRIMARY KEY (rowid=?)']),
+            ['foo'], "Got full scans from plans of sqlite before 3.36")
+
+    def test_postgresql(self):
+        mock_curs = Mock()
+        mock_curs.fetchall.return_value = [('Seq Scan on foo f  (cost=0.00..1.00 rows=1 width=4)',),
+            ('  ->  Index Scan using bar_pkey on bar',), ('Seq Scan on baz  (cost=0.00..1.00)',)]
+        dialect = PostgreSQLDialect()
+        plan = dialect.explain(mock_curs, 'SELECT 1', None)
+        mock_curs.execute.assert_called_with('EXPLAIN SELECT 1')
+        self.assertEqual(dialect.full_scans(plan), ['f', 'baz'], "Got full scans")
+
+    def test_mysql(self):
+        mock_curs = Mock()
+        mock_curs.description = [('id',), ('table',), ('type',)]
+        mock_curs.fetchall.return_value = [(1, 'foo', 'ALL'), (1, 'bar', 'ref')]
+        dialect = MySQLDialect()
+        plan = dialect.explain(mock_curs, 'SELECT 1 FROM foo WHERE id = %s', [1])
+        mock_curs.execute.assert_called_with('EXPLAIN SELECT 1 FROM foo WHERE id = %s', [1])
+        self.assertEqual(plan, ['foo: ALL', 'bar: ref'], "Got plan")
+        self.assertEqual(dialect.full_scans(plan), ['foo'], "Got full scans")
+
+    def test_is_retryable(self):
+        self.assertTrue(Dialect().is_retryable(Exception('Deadlock found')), "Generic message matched")
+        self.assertFalse(Dialect().is_retryable(Exception('syntax error')), "Other errors not retried")
+
+        self.assertTrue(SQLiteDialect().is_retryable(sqlite3.OperationalError('database is locked')),
+            "sqlite lock retried")
+        self.assertFalse(SQLiteDialect().is_retryable(sqlite3.OperationalError('no such table: foo')),
+            "sqlite error not retried")
+
+        error = Exception('could not serialize')
+        error.pgcode = '40001'
+        self.assertTrue(PostgreSQLDialect().is_retryable(error), "PostgreSQL serialization failure retried")
+        error.pgcode = '42P01'
+        self.assertFalse(PostgreSQLDialect().is_retryable(error), "PostgreSQL error not retried")
+
+        self.assertTrue(MySQLDialect().is_retryable(Exception(1213, 'Deadlock')), "MySQL deadlock retried")
+        self.assertFalse(MySQLDialect().is_retryable(Exception(1146, 'No table')), "MySQL error not retried")
+
+    def test_reset_cursor(self):
+        self.assertTrue(Dialect().reset_cursor(Mock()), "Generic cursors are reusable")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir, 'reset.db'))
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE foo (id INT)")
+            conn.executemany("INSERT INTO foo VALUES (?)", [(1,), (2,)])
+            conn.commit()
+            curs = conn.cursor()
+            curs.execute("SELECT id FROM foo")
+            curs.fetchone()
+
+            writer = sqlite3.connect(path, timeout=0)
+            self.assertTrue(SQLiteDialect().reset_cursor(curs), "sqlite cursors are reusable")
+            writer.execute("INSERT INTO foo VALUES (3)")
+            writer.commit()
+            writer.close()
+            conn.close()
+
+    def test_upsert_operation(self):
+        self.assertIsNone(Dialect().upsert_operation('foo', ['id'], ['value'], 1), "No generic upsert")
+        self.assertEqual(PostgreSQLDialect().upsert_operation('foo', ['a', 'b'], ['value'], 2),
+            "INSERT INTO foo (a, b, value) VALUES (%s, %s, %s), (%s, %s, %s) "
+            "ON CONFLICT (a, b) DO UPDATE SET value = excluded.value", "Got PostgreSQL upsert")
+        self.assertEqual(SQLiteDialect().upsert_operation('foo', ['id'], [], 1),
+            "INSERT INTO foo (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", "Got sqlite insert of missing rows")
+        self.assertEqual(MySQLDialect().upsert_operation('foo', ['id'], ['name', 'value'], 1),
+            "INSERT INTO foo (id, name, value) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE name = VALUES(name), value = VALUES(value)", "Got MySQL upsert")
+
+    def test_temp_update_operation(self):
+        self.assertEqual(Dialect().temp_update_operation('foo', 'tmp', ['id'], ['value']),
+            "UPDATE foo SET value = (SELECT value FROM tmp WHERE tmp.id = foo.id) "
+            "WHERE EXISTS (SELECT 1 FROM tmp WHERE tmp.id = foo.id)", "Got generic update")
+        operation = MySQLDialect().temp_update_operation('foo', 'tmp', ['a', 'b'], ['name', 'value'])
+        self.assertEqual(operation, "UPDATE foo JOIN tmp ON tmp.a = foo.a AND tmp.b = foo.b "
+            "SET foo.name = tmp.name, foo.value = tmp.value", "Got MySQL joined update")
+        self.assertEqual(operation.count('tmp '), 1, "Temporary table opened once")
+
+    def test_temp_upsert_operations(self):
+        operations = Dialect().temp_upsert_operations('foo', 'tmp', ['id'], [])
+        self.assertEqual(operations, ["INSERT INTO foo (id) SELECT id FROM tmp "
+            "WHERE NOT EXISTS (SELECT 1 FROM foo WHERE foo.id = tmp.id)"], "Missing rows inserted")
+        self.assertEqual(len(Dialect().temp_upsert_operations('foo', 'tmp', ['id'], ['value'])), 2,
+            "Existing rows updated first")
+        self.assertEqual(MySQLDialect().temp_upsert_operations('foo', 'tmp', ['id'], ['name', 'value']),
+            ["INSERT INTO foo (id, name, value) SELECT id, name, value FROM tmp "
+             "ON DUPLICATE KEY UPDATE name = VALUES(name), value = VALUES(value)"],
+            "Temporary table opened once on MySQL")
+
+    def test_cancel(self):
+        mock_conn = Mock()
+        self.assertTrue(SQLiteDialect().cancel(mock_conn), "sqlite statements interrupted")
+        mock_conn.interrupt.assert_called_once_with()
+        self.assertTrue(PostgreSQLDialect().cancel(mock_conn), "Driver cancel used")
+        mock_conn.cancel.assert_called_once_with()
+        self.assertFalse(Dialect().cancel(object()), "Cancelling not supported")
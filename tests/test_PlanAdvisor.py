@@ -0,0 +1,86 @@
+from unittest import TestCase
+from unittest.mock import patch
+import sqlite3
+import time
+import adbi
+from adbi import PlanAdvisor
+
+
+class TestPlanAdvisor(TestCase):
+
+    def build_adbi(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE customer (id INTEGER PRIMARY KEY, name VARCHAR(64), age INT)")
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INT, total INT)")
+        conn.execute("CREATE TABLE tiny (id INT)")
+        conn.executemany("INSERT INTO customer (name, age) VALUES (?, ?)", [('name', idex) for idex in range(20)])
+        conn.executemany("INSERT INTO orders (customer_id, total) VALUES (?, ?)", [(idex, idex) for idex in range(20)])
+        adbi_conn = adbi.connect(conn)
+        adbi_conn.enable_plan_capture(large_table_rows=10)
+        return adbi_conn
+
+    def test_enable_plan_capture(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        self.assertIsNone(adbi_conn.plan_advisor, "Plan capture is disabled by default")
+        advisor = adbi_conn.enable_plan_capture()
+        self.assertIsInstance(advisor, PlanAdvisor, "Got the advisor")
+        self.assertIs(adbi_conn.plan_advisor, advisor, "Advisor stored on the connection")
+        adbi_conn.disable_plan_capture()
+        self.assertIsNone(adbi_conn.plan_advisor, "Plan capture disabled")
+
+    def test_capture_once_per_fingerprint(self):
+        adbi_conn = self.build_adbi()
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT * FROM customer WHERE id = %s", (1,))
+        curs.execute("SELECT *  FROM customer WHERE id = %s", (2,))
+        curs.execute("SELECT * FROM customer WHERE id = 3")
+        curs.execute("SELECT * FROM customer WHERE id = 4")
+
+        plans = adbi_conn.plan_advisor.plans
+        self.assertEqual(len(plans), 1, "One plan per distinct statement")
+        entry = plans[adbi.fingerprint("SELECT * FROM customer WHERE id = ?")]
+        self.assertEqual(entry.full_scans, [], "Primary key lookup not flagged")
+        self.assertEqual(curs.fetchall(), [(4, 'name', 3)], "Statement still executed")
+
+    def test_full_scan_flagged(self):
+        adbi_conn = self.build_adbi()
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT * FROM customer c JOIN orders o ON o.customer_id = c.id "
+            "WHERE c.age > %(age)s AND o.total < %(total)s ORDER BY c.name", {'age': 1, 'total': 5})
+        curs.execute("SELECT * FROM tiny WHERE id = %s", (1,))
+        curs.execute("UPDATE customer SET age = 1 WHERE name = %s AND age < %s", ('name', 3))
+
+        findings = adbi_conn.plan_advisor.findings()
+        self.assertEqual(len(findings), 2, "Small table scans are not flagged")
+        self.assertEqual(findings[0].suggestions, [
+            'CREATE INDEX ix_orders_total ON orders (total)',
+        ], "Index suggested for the scanned alias")
+        self.assertEqual(findings[1].full_scans, ['customer'], "Full scan of a large table flagged")
+        self.assertEqual(findings[1].suggestions, [
+            'CREATE INDEX ix_customer_name_age ON customer (name, age)',
+        ], "Index suggested on the WHERE columns")
+
+        report = adbi_conn.plan_advisor.report()
+        self.assertIn('full scan of: customer', report, "Report lists the scanned tables")
+        self.assertIn('suggested: CREATE INDEX ix_orders_total ON orders (total)', report,
+            "Report lists the suggestions")
+
+    def test_unexplainable_statement(self):
+        adbi_conn = self.build_adbi()
+        curs = adbi_conn.cursor()
+        with self.assertRaises(sqlite3.OperationalError):
+            curs.execute("SELECT * FROM missing")
+        entry = list(adbi_conn.plan_advisor.plans.values())[0]
+        self.assertIsNone(entry.plan, "No plan captured")
+
+        # The plan is captured once the table exists and the failure expired.
+        adbi_conn.execute("CREATE TABLE missing (id INT)")
+        curs.executemany("INSERT INTO missing (id) VALUES (%s)", [(idex,) for idex in range(10)])
+        curs.execute("SELECT * FROM missing")
+        self.assertIsNone(adbi_conn.plan_advisor.plans[entry.fingerprint].plan, "Failure kept for a while")
+        with patch('adbi.plans.time') as mock_time:
+            mock_time.monotonic.return_value = time.monotonic() + 60
+            curs.execute("SELECT * FROM missing")
+        entry = adbi_conn.plan_advisor.plans[entry.fingerprint]
+        self.assertIsNotNone(entry.plan, "Plan captured once the failure expired")
+        self.assertEqual(entry.full_scans, ['missing'], "Full scan flagged")
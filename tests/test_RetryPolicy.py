@@ -0,0 +1,139 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sqlite3
+import tempfile
+import adbi
+from adbi import ADBI, RetryPolicy
+
+
+def is_retryable(error):
+    return isinstance(error, sqlite3.OperationalError)
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_initialization(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(attempts=0)
+        with self.assertRaises(ValueError):
+            RetryPolicy(jitter=2)
+
+    @patch('adbi.retry.random.random')
+    def test_delay(self, mock_random):
+        mock_random.return_value = 0.5
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, jitter=0)
+        self.assertEqual([policy.delay(attempt) for attempt in range(1, 5)], [0.1, 0.2, 0.4, 0.5],
+            "Delay doubles up to the maximum")
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, jitter=0.5)
+        self.assertAlmostEqual(policy.delay(2), 0.15, msg="Jitter removes part of the delay")
+
+    @patch('adbi.retry.time.sleep')
+    def test_run(self, mock_sleep):
+        policy = RetryPolicy(attempts=3)
+        func = Mock(side_effect=[sqlite3.OperationalError('locked'), 'done'])
+        before_retry = Mock()
+        self.assertEqual(policy.run(func, is_retryable, before_retry), 'done', "Got result after retrying")
+        self.assertEqual(func.call_count, 2, "Function retried")
+        before_retry.assert_called_once_with()
+        self.assertEqual(mock_sleep.call_count, 1, "Waited before retrying")
+        self.assertEqual(policy.stats(), {'retries': 1, 'recovered': 1, 'exhausted': 0}, "Got counters")
+
+        # Errors that cannot be retried are raised immediately.
+        func = Mock(side_effect=ValueError('bad'))
+        with self.assertRaises(ValueError):
+            policy.run(func, is_retryable)
+        self.assertEqual(func.call_count, 1, "Function not retried")
+
+        # Giving up after the allowed attempts.
+        func = Mock(side_effect=sqlite3.OperationalError('locked'))
+        with self.assertRaises(sqlite3.OperationalError):
+            policy.run(func, is_retryable)
+        self.assertEqual(func.call_count, 3, "Function attempted three times")
+        self.assertEqual(policy.stats(), {'retries': 3, 'recovered': 1, 'exhausted': 1}, "Got counters")
+
+    @patch('adbi.retry.time')
+    def test_run_deadline(self, mock_time):
+        mock_time.monotonic.side_effect = [0, 0.5, 1.5]
+        policy = RetryPolicy(attempts=10, base_delay=0.4, jitter=0, deadline=1)
+        func = Mock(side_effect=sqlite3.OperationalError('locked'))
+        with self.assertRaises(sqlite3.OperationalError):
+            policy.run(func, is_retryable)
+        self.assertEqual(func.call_count, 2, "Stopped once the deadline would be passed")
+
+    @patch('adbi.retry.time.sleep')
+    def test_cursor_retry(self, mock_sleep):
+        mock_db = Mock(spec=['cursor', 'commit', 'rollback'])
+        mock_curs = mock_db.cursor.return_value
+        mock_curs.execute.side_effect = [sqlite3.OperationalError('database is locked'), None]
+        adbi_conn = ADBI(mock_db, 'qmark')
+        adbi_conn.retry_policy = RetryPolicy()
+
+        adbi_conn.cursor().execute("UPDATE foo SET bar = %s", (1,))
+        self.assertEqual(mock_curs.execute.call_count, 2, "Statement retried")
+        mock_curs.execute.assert_called_with("UPDATE foo SET bar = ?", [1])
+        mock_db.rollback.assert_called_once_with()
+        self.assertTrue(adbi_conn.in_transaction, "Write is still pending")
+
+        # Inside a transaction, statements are not retried.
+        mock_curs.execute.reset_mock()
+        mock_curs.execute.side_effect = [sqlite3.OperationalError('database is locked'), None]
+        with self.assertRaises(sqlite3.OperationalError):
+            adbi_conn.cursor().execute("UPDATE foo SET bar = %s", (1,))
+        self.assertEqual(mock_curs.execute.call_count, 1, "Statement not retried")
+
+        # executemany is retried with the translated parameters.
+        adbi_conn.rollback()
+        mock_curs.executemany.side_effect = [sqlite3.OperationalError('database is locked'), None]
+        adbi_conn.cursor().executemany("INSERT INTO foo VALUES (%(a)s)", [{'a': 1}, {'a': 2}])
+        mock_curs.executemany.assert_called_with("INSERT INTO foo VALUES (?)", [[1], [2]])
+        self.assertEqual(mock_curs.executemany.call_count, 2, "executemany retried")
+
+    @patch('adbi.retry.time.sleep')
+    def test_unit_retry(self, mock_sleep):
+        mock_db = Mock(spec=['cursor', 'commit', 'rollback'])
+        mock_curs = mock_db.cursor.return_value
+        mock_curs.execute.side_effect = sqlite3.OperationalError('database is locked')
+        adbi_conn = ADBI(mock_db, 'qmark')
+        adbi_conn.retry_policy = RetryPolicy(attempts=3)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            adbi_conn.run_in_transaction(lambda db: db.cursor().execute("UPDATE foo SET bar = %s", (1,)))
+        self.assertEqual(mock_curs.execute.call_count, 3, "Only the unit is retried")
+        self.assertEqual(adbi_conn.retry_policy.stats(), {'retries': 2, 'recovered': 0, 'exhausted': 1},
+            "Got counters")
+
+        # Statements outside of a unit are retried again.
+        mock_curs.execute.reset_mock()
+        mock_curs.execute.side_effect = [sqlite3.OperationalError('database is locked'), None]
+        adbi_conn.cursor().execute("UPDATE foo SET bar = %s", (1,))
+        self.assertEqual(mock_curs.execute.call_count, 2, "Statement retried")
+
+    def test_read_detection(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:'))
+        with patch('adbi._is_read_operation', wraps=adbi._is_read_operation) as mock_is_read:
+            adbi_conn.query("SELECT 1")
+            self.assertEqual(mock_is_read.call_count, 0, "Not needed without a retry policy")
+            adbi_conn.retry_policy = RetryPolicy()
+            adbi_conn.query("SELECT 1")
+            self.assertEqual(mock_is_read.call_count, 1, "Needed with a retry policy")
+
+    def test_sqlite_contention(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir, 'locked.db'))
+            holder = sqlite3.connect(path, timeout=0)
+            holder.execute("CREATE TABLE foo (id INT)")
+            holder.commit()
+            holder.execute("INSERT INTO foo VALUES (1)")
+
+            conn = sqlite3.connect(path, timeout=0)
+            adbi_conn = adbi.connect(conn)
+            adbi_conn.retry_policy = RetryPolicy()
+            # The lock is released while waiting to retry.
+            with patch('adbi.retry.time.sleep', side_effect=lambda delay: holder.commit()):
+                adbi_conn.run_in_transaction(lambda db: db.cursor().execute("INSERT INTO foo VALUES (%s)", (2,)))
+            self.assertEqual(conn.execute("SELECT id FROM foo ORDER BY id").fetchall(), [(1,), (2,)],
+                "Write completed after the lock was released")
+            self.assertEqual(adbi_conn.retry_policy.stats()['recovered'], 1, "Got recovered counter")
+            holder.close()
+            conn.close()
@@ -0,0 +1,161 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from pathlib import Path
+import sqlite3
+import tempfile
+import adbi
+from adbi import RoutingADBI, RoutingADBICursor
+
+
+class TestRoutingADBI(TestCase):
+
+    def build_db(self, name):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE source (name VARCHAR(16) NOT NULL)")
+        conn.execute("INSERT INTO source (name) VALUES (?)", (name,))
+        conn.commit()
+        return conn
+
+    def build_routing(self, **kwargs):
+        writer = self.build_db('writer')
+        readers = [self.build_db('reader1'), self.build_db('reader2')]
+        return RoutingADBI(writer, readers, **kwargs)
+
+    def selected_source(self, curs):
+        curs.execute("SELECT name FROM source")
+        return curs.fetchone()[0]
+
+    def test_initialization(self):
+        writer = sqlite3.connect(':memory:')
+        reader = sqlite3.connect(':memory:')
+        adbi_conn = RoutingADBI(writer, [reader])
+
+        self.assertEqual(adbi_conn.connection, writer, "Writer saved as the connection")
+        self.assertEqual(adbi_conn.readers, [reader], "Readers have been saved")
+        self.assertEqual(adbi_conn.wrapped_db_param_style, sqlite3.paramstyle, "Got expected param style")
+        self.assertEqual(adbi_conn.policy, 'round_robin', "Default policy is round robin")
+
+        with self.assertRaises(ValueError):
+            RoutingADBI(writer, [reader], policy='random')
+
+    def test_is_read_operation(self):
+        self.assertTrue(adbi._is_read_operation("SELECT 1"), "Plain select is a read")
+        self.assertTrue(adbi._is_read_operation(" -- comment\n (select * from foo)"), "Comments are skipped")
+        self.assertTrue(adbi._is_read_operation("WITH a AS (SELECT 1) SELECT * FROM a"), "CTE is a read")
+        self.assertFalse(adbi._is_read_operation("SELECT * FROM foo FOR UPDATE"), "Locking select is a write")
+        self.assertFalse(adbi._is_read_operation("SELECT * INTO bar FROM foo"), "Select into is a write")
+        self.assertFalse(adbi._is_read_operation("INSERT INTO foo VALUES (1)"), "Insert is a write")
+        self.assertFalse(adbi._is_read_operation("PRAGMA foo = 1"), "Unknown keywords are writes")
+
+    def test_cursor(self):
+        adbi_conn = self.build_routing()
+        curs = adbi_conn.cursor()
+        self.assertIsInstance(curs, RoutingADBICursor, "Got a routing cursor")
+
+    def test_round_robin(self):
+        adbi_conn = self.build_routing()
+        curs = adbi_conn.cursor()
+
+        self.assertEqual(self.selected_source(curs), 'reader1', "First read to first reader")
+        self.assertEqual(self.selected_source(curs), 'reader2', "Second read to second reader")
+        self.assertEqual(self.selected_source(curs), 'reader1', "Third read wraps around")
+
+    def test_least_busy(self):
+        adbi_conn = self.build_routing(policy='least_busy')
+        curs_one = adbi_conn.cursor()
+        curs_two = adbi_conn.cursor()
+
+        self.assertEqual(self.selected_source(curs_one), 'reader1', "First cursor on first reader")
+        self.assertEqual(self.selected_source(curs_two), 'reader2', "Busy reader avoided")
+        curs_two.close()
+        self.assertEqual(self.selected_source(curs_one), 'reader2', "Least busy reader chosen")
+
+    def test_least_busy_exhausted(self):
+        adbi_conn = self.build_routing(policy='least_busy')
+        curs_one = adbi_conn.cursor()
+        curs_two = adbi_conn.cursor()
+
+        curs_one.execute("SELECT name FROM source")
+        self.assertEqual(adbi_conn._reader_load, [1, 0], "Reader busy until fetched")
+        self.assertEqual(curs_one.fetchall(), [('reader1',)], "Got the rows of the first reader")
+        self.assertEqual(adbi_conn._reader_load, [0, 0], "Reader idle once the result is fetched")
+        self.assertEqual(self.selected_source(curs_two), 'reader2', "Next reader chosen when loads are equal")
+        self.assertEqual(curs_two.fetchone(), None, "Result exhausted")
+        self.assertEqual(adbi_conn._reader_load, [0, 0], "No reader busy")
+        curs_one.close()
+        curs_two.close()
+        self.assertEqual(adbi_conn._reader_load, [0, 0], "Closing does not release readers twice")
+
+    def test_schema_on_writer(self):
+        adbi_conn = self.build_routing()
+        with tempfile.TemporaryDirectory() as schema_dir:
+            Path(schema_dir, 'schema-current.sql').write_text("CREATE TABLE foo (id INTEGER);\n")
+            Path(schema_dir, 'schema-0001.sql').write_text("CREATE TABLE foo (id INTEGER);\n")
+            Path(schema_dir, 'schema-0002.sql').write_text("CREATE TABLE bar (id INTEGER);\n")
+            adbi_conn.schema_dir = schema_dir
+            adbi_conn.update_schema()
+            self.assertEqual(adbi_conn.current_schema_version(), '0002', "Version read from the writer")
+            adbi_conn.connection.execute("UPDATE _schema_info SET value = '0001'")
+            adbi_conn.commit()
+            adbi_conn.update_schema()
+        tables = adbi_conn.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        self.assertIn(('bar',), tables, "Upgrade applied to the writer")
+        self.assertEqual(adbi_conn._reader_load, [0, 0], "Readers not used")
+        self.assertEqual(self.selected_source(adbi_conn.cursor()), 'reader1', "Reads use the readers again")
+
+    def test_writes_and_transactions(self):
+        adbi_conn = self.build_routing()
+        curs = adbi_conn.cursor()
+
+        curs.execute("UPDATE source SET name = %s", ('written',))
+        self.assertTrue(adbi_conn.in_transaction, "Write started a transaction")
+        self.assertEqual(self.selected_source(curs), 'written', "Reads in a transaction use the writer")
+        self.assertEqual(self.selected_source(curs), 'written', "Reads stay on the writer")
+
+        adbi_conn.commit()
+        self.assertFalse(adbi_conn.in_transaction, "Transaction has ended")
+        self.assertEqual(self.selected_source(curs), 'reader1', "Reads go back to the readers")
+
+        curs.executemany("INSERT INTO source (name) VALUES (%s)", [('one',), ('two',)])
+        self.assertTrue(adbi_conn.in_transaction, "executemany started a transaction")
+        adbi_conn.rollback()
+        self.assertFalse(adbi_conn.in_transaction, "Rollback ended the transaction")
+
+    @patch('adbi.routing.time')
+    def test_read_your_writes(self, mock_time):
+        mock_time.monotonic.return_value = 100
+        adbi_conn = self.build_routing(read_your_writes=5)
+        curs = adbi_conn.cursor()
+
+        curs.execute("UPDATE source SET name = %s", ('written',))
+        adbi_conn.commit()
+        mock_time.monotonic.return_value = 104
+        self.assertEqual(self.selected_source(curs), 'written', "Read inside the window uses the writer")
+        mock_time.monotonic.return_value = 105
+        self.assertEqual(self.selected_source(curs), 'reader1', "Read after the window uses a reader")
+
+    def test_no_readers(self):
+        adbi_conn = RoutingADBI(self.build_db('writer'), [])
+        curs = adbi_conn.cursor()
+        self.assertEqual(self.selected_source(curs), 'writer', "Reads use the writer without readers")
+
+    def test_close(self):
+        writer = Mock()
+        reader = Mock()
+        adbi_conn = RoutingADBI(writer, [reader], 'qmark')
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT 1")
+        curs.close()
+        curs.close()
+        writer.cursor.return_value.close.assert_not_called()
+        reader.cursor.return_value.close.assert_called_with()
+        self.assertEqual(adbi_conn._idle_cursors, [writer.cursor.return_value], "Writer cursor pooled")
+
+        curs = adbi_conn.cursor()
+        self.assertEqual(writer.cursor.call_count, 1, "Pooled writer cursor reused")
+        curs.close()
+
+        adbi_conn.close()
+        writer.cursor.return_value.close.assert_called_with()
+        writer.close.assert_called_with()
+        reader.close.assert_called_with()
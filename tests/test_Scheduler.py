@@ -0,0 +1,73 @@
+from unittest import TestCase
+import sqlite3
+import threading
+import time
+import adbi
+from adbi import Scheduler
+
+
+class TestScheduler(TestCase):
+
+    def queue_waiters(self, scheduler, priorities):
+        # Queue a thread per priority behind a held slot, returning the order
+        # in which they are admitted once it is released.
+        order = []
+        threads = []
+        for priority in priorities:
+            def work(priority=priority):
+                with scheduler.admit(priority):
+                    order.append(priority)
+            threads.append(threading.Thread(target=work))
+            threads[-1].start()
+            while scheduler.stats()['queued'] < len(threads):
+                time.sleep(0.001)
+        scheduler.release()
+        for thread in threads:
+            thread.join()
+        return order
+
+    def test_weighted_fair(self):
+        scheduler = Scheduler(1, weights={'interactive': 3, 'batch': 1})
+        scheduler.acquire('batch')
+        order = self.queue_waiters(scheduler, ['batch'] * 4 + ['interactive'] * 6)
+        # The held batch slot counts against the batch class.
+        self.assertEqual(order[:8], ['interactive'] * 4 + ['batch'] + ['interactive'] * 2 + ['batch'],
+            "Slots shared by weight")
+
+        stats = scheduler.stats()
+        self.assertEqual((stats['running'], stats['queued']), (0, 0), "Nothing left running")
+        self.assertEqual(stats['classes']['batch']['admitted'], 5, "Got admissions")
+        self.assertGreater(stats['classes']['batch']['wait_max'], 0, "Got wait time")
+
+        with self.assertRaises(ValueError):
+            scheduler.acquire('unknown')
+        with self.assertRaises(ValueError):
+            Scheduler(weights={'batch': 1})
+
+    def test_queue_timeout(self):
+        scheduler = Scheduler(1, queue_timeout=0.01)
+        scheduler.acquire()
+        with self.assertRaises(TimeoutError, msg="Timed out in the queue"):
+            scheduler.acquire('batch')
+        stats = scheduler.stats()
+        self.assertEqual((stats['queued'], stats['classes']['batch']['timeouts']), (0, 1), "Timeout recorded")
+        scheduler.release()
+        self.assertEqual(scheduler.acquire('batch', timeout=0), 0.0, "Admitted once free")
+
+    def test_adbi_scheduler(self):
+        adbi_conn = adbi.connect(sqlite3.connect(':memory:', check_same_thread=False))
+        adbi_conn.scheduler = Scheduler(1, queue_timeout=0.01)
+        self.assertEqual(adbi_conn.query("SELECT 1"), [(1,)], "Statement admitted")
+
+        curs = adbi_conn.cursor()
+        curs.priority = 'batch'
+        adbi_conn.scheduler.acquire()
+        with self.assertRaises(TimeoutError, msg="Statement queued while the slot is taken"):
+            curs.execute("SELECT 1")
+        adbi_conn.scheduler.release()
+        curs.execute("SELECT 1")
+        with adbi_conn.scheduler.priority('batch'):
+            adbi_conn.query("SELECT 1")
+        classes = adbi_conn.scheduler.stats()['classes']
+        self.assertEqual((classes['interactive']['admitted'], classes['batch']['admitted']), (2, 2),
+            "Cursor and thread priorities used")
@@ -0,0 +1,121 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import sqlite3
+import adbi
+from adbi import ShardedADBI
+
+
+class TestShardedADBI(TestCase):
+
+    def build_sharded(self, count=3, **kwargs):
+        shards = []
+        for idex in range(count):
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+            conn.execute("CREATE TABLE customer (id INT NOT NULL PRIMARY KEY, shard INT NOT NULL)")
+            conn.commit()
+            shards.append(adbi.connect(conn))
+        sharded = ShardedADBI(shards, **kwargs)
+        self.addCleanup(sharded.close)
+        return sharded
+
+    def load_customers(self, sharded, count=30):
+        for cust_id in range(count):
+            shard = sharded.shards.index(sharded.shard_for(cust_id))
+            sharded.execute(cust_id, "INSERT INTO customer (id, shard) VALUES (%s, %s)", (cust_id, shard))
+        sharded.commit()
+
+    def test_initialization(self):
+        with self.assertRaises(ValueError):
+            ShardedADBI([])
+
+    def test_shard_for(self):
+        sharded = self.build_sharded()
+        self.assertIs(sharded.shard_for(4), sharded.shards[1], "Integer keys are placed by modulus")
+        self.assertIs(sharded.shard_for('abc'), sharded.shard_for('abc'), "String keys are stable")
+
+        sharded = self.build_sharded(shard_key=lambda key: key['customer'])
+        self.assertIs(sharded.shard_for({'customer': 5}), sharded.shards[2], "Shard key function used")
+
+    def test_execute(self):
+        sharded = self.build_sharded()
+        self.load_customers(sharded)
+
+        curs = sharded.execute(7, "SELECT shard FROM customer WHERE id = %(id)s", {'id': 7})
+        self.assertEqual(curs.fetchone(), (1,), "Row found on its own shard")
+        curs = sharded.shards[0].cursor()
+        curs.execute("SELECT COUNT(*) FROM customer WHERE id = 7")
+        self.assertEqual(curs.fetchone(), (0,), "Row not stored on other shards")
+
+    def test_query_concatenate(self):
+        sharded = self.build_sharded()
+        self.load_customers(sharded)
+
+        rows = list(sharded.query("SELECT id, shard FROM customer ORDER BY id", batch_size=2))
+        self.assertEqual(len(rows), 30, "All rows returned")
+        self.assertEqual([row[1] for row in rows], sorted(row[1] for row in rows),
+            "Shards concatenated in order")
+
+    def test_query_ordered(self):
+        sharded = self.build_sharded()
+        self.load_customers(sharded)
+
+        rows = list(sharded.query("SELECT id FROM customer ORDER BY id", order_by=[0], batch_size=4))
+        self.assertEqual(rows, [(cust_id,) for cust_id in range(30)], "Rows merged in order")
+
+        rows = list(sharded.query("SELECT id FROM customer ORDER BY id DESC",
+            order_by=lambda row: row[0], reverse=True))
+        self.assertEqual(rows, [(cust_id,) for cust_id in reversed(range(30))], "Rows merged in reverse")
+
+    def test_query_ordered_few_workers(self):
+        sharded = self.build_sharded(max_workers=2)
+        self.load_customers(sharded, 90)
+
+        first = sharded.query("SELECT id FROM customer ORDER BY id", order_by=[0], batch_size=5, queue_size=2)
+        self.assertEqual(next(first), (0,), "First query started")
+        rows = list(sharded.query("SELECT id FROM customer ORDER BY id", order_by=[0], batch_size=5, queue_size=2))
+        self.assertEqual(rows, [(cust_id,) for cust_id in range(90)], "Every shard produced rows")
+        self.assertEqual(len(list(first)), 89, "Concurrent query completed")
+
+    def test_query_early_exit(self):
+        sharded = self.build_sharded()
+        self.load_customers(sharded, 300)
+
+        stream = sharded.query("SELECT id FROM customer", batch_size=1, queue_size=1)
+        self.assertEqual(len(next(stream)), 1, "Got first row")
+        stream.close()
+        self.assertEqual(len(list(sharded.query("SELECT id FROM customer"))), 300,
+            "Pool still available after abandoned query")
+
+    def test_query_error(self):
+        sharded = self.build_sharded()
+        with self.assertRaises(sqlite3.OperationalError):
+            list(sharded.query("SELECT * FROM missing_table"))
+
+    def test_execute_all(self):
+        sharded = self.build_sharded()
+        self.load_customers(sharded)
+
+        counts = sharded.execute_all("DELETE FROM customer WHERE id < %s", (6,))
+        self.assertEqual(counts, [2, 2, 2], "Got the rowcount from every shard")
+
+    def test_update_schema(self):
+        sharded = self.build_sharded()
+        sharded.schema_dir = 'tests/sql'
+        self.assertEqual(sharded.schema_file_format, 'schema-{version}.sql', "Got shard schema format")
+
+        sharded.update_schema()
+        for shard in sharded.shards:
+            curs = shard.cursor()
+            curs.execute("SELECT COUNT(*) FROM table_one")
+            self.assertEqual(curs.fetchone(), (3,), "Schema applied to shard")
+
+    def test_commit_rollback(self):
+        shards = [Mock(), Mock()]
+        sharded = ShardedADBI(shards)
+        sharded.commit()
+        sharded.rollback()
+        sharded.close()
+        for shard in shards:
+            shard.commit.assert_called_with()
+            shard.rollback.assert_called_with()
+            shard.close.assert_called_with()
@@ -0,0 +1,85 @@
+from unittest import TestCase
+import adbi
+from adbi import testing
+from adbi.testing import SimulatedConnection, VirtualClock
+
+
+class TestSimulatedConnection(TestCase):
+
+    def build_conn(self, **kwargs):
+        conn = testing.connect(**kwargs)
+        conn._conn.execute("CREATE TABLE foo (id INT, name TEXT)")
+        conn._conn.executemany("INSERT INTO foo VALUES (?, ?)", [(idex, 'name') for idex in range(10)])
+        return conn
+
+    def test_round_trips(self):
+        conn = self.build_conn(latency=0.01, row_cost=0.001)
+        curs = conn.cursor()
+        curs.execute("SELECT id FROM foo WHERE id < ?", (5,))
+        self.assertEqual(curs.fetchone(), (0,), "Got first row")
+        self.assertEqual(len(curs.fetchall()), 4, "Got remaining rows")
+        conn.commit()
+        stats = conn.stats()
+        self.assertEqual(stats['round_trips'], 2, "Result sent with the execute round trip")
+        self.assertEqual(stats['rows'], 5, "Got rows transferred")
+        self.assertEqual(stats['bytes_received'], 40, "Got bytes received")
+        self.assertAlmostEqual(stats['elapsed'], 0.025, msg="Latency and row costs charged")
+        self.assertAlmostEqual(conn.clock.now, 0.025, msg="Virtual clock advanced")
+
+        conn.reset_stats()
+        self.assertEqual(conn.stats()['round_trips'], 0, "Stats reset")
+
+    def test_fetch_size(self):
+        conn = self.build_conn(fetch_size=4)
+        curs = conn.cursor()
+        curs.execute("SELECT id FROM foo")
+        self.assertEqual(conn.stats()['round_trips'], 1, "No rows sent with execute")
+        self.assertEqual(curs.fetchmany(2), [(0,), (1,)], "Got rows")
+        self.assertEqual(conn.stats()['round_trips'], 2, "First batch fetched")
+        self.assertEqual(len(curs.fetchall()), 8, "Got remaining rows")
+        self.assertEqual(conn.stats()['round_trips'], 4, "Remaining batches fetched")
+        self.assertIsNone(curs.fetchone(), "No more rows")
+
+    def test_executemany(self):
+        conn = self.build_conn(native_executemany=False)
+        curs = conn.cursor()
+        curs.executemany("INSERT INTO foo VALUES (?, ?)", [(1, 'a'), (2, 'b'), (3, 'c')])
+        self.assertEqual(conn.stats()['round_trips'], 3, "One round trip per parameter set")
+
+        conn = self.build_conn()
+        conn.cursor().executemany("INSERT INTO foo VALUES (?, ?)", [(1, 'a'), (2, 'b'), (3, 'c')])
+        self.assertEqual(conn.stats()['round_trips'], 1, "Single round trip")
+        self.assertEqual(conn.stats()['statements'], 3, "Got statements")
+
+    def test_max_params(self):
+        conn = self.build_conn(max_params=2)
+        curs = conn.cursor()
+        curs.execute("SELECT id FROM foo WHERE id IN (?, ?)", (1, 2))
+        with self.assertRaises(testing.OperationalError):
+            curs.execute("SELECT id FROM foo WHERE id IN (?, ?, ?)", (1, 2, 3))
+
+    def test_paramstyles(self):
+        for style in ('qmark', 'numeric', 'named', 'format', 'pyformat'):
+            conn = self.build_conn(paramstyle=style)
+            adbi_conn = adbi.connect(conn, style)
+            rows = adbi_conn.query("SELECT id, '%%s' FROM foo WHERE id = %(id)s OR id = %(other)s ORDER BY id",
+                {'id': 3, 'other': 4})
+            self.assertEqual(rows, [(3, '%s'), (4, '%s')], "Got rows using {0}".format(style))
+            self.assertEqual(adbi_conn.dialect.name, 'sqlite', "sqlite dialect used")
+
+        with self.assertRaises(ValueError):
+            SimulatedConnection(paramstyle='other')
+
+    def test_adbi_benchmark(self):
+        clock = VirtualClock()
+        conn = self.build_conn(latency=0.005, max_params=4, clock=clock)
+        adbi_conn = adbi.connect(conn)
+        self.assertEqual(adbi_conn.dialect.max_params, 4, "Parameter limit of the connection used")
+        conn.reset_stats()
+        adbi_conn.bulk_delete('foo', 'id', range(10))
+        self.assertEqual(conn.stats()['round_trips'], 4, "Three chunked deletes and a commit")
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT id FROM foo")
+        curs.close()
+        self.assertEqual(conn.stats()['round_trips'], 5, "Unfetched cursor pooled without a reset")
+        self.assertEqual(adbi_conn.query("SELECT COUNT(*) FROM foo"), [(0,)], "Rows deleted")
@@ -0,0 +1,96 @@
+from unittest import TestCase
+import sqlite3
+import threading
+import adbi
+from adbi import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+
+    def test_key(self):
+        self.assertEqual(SingleFlight.key('SELECT ?', [1]), ('SELECT ?', (1,)), "Sequence params in key")
+        self.assertEqual(SingleFlight.key('SELECT :b, :a', {'b': 2, 'a': 1}),
+            ('SELECT :b, :a', (('a', 1), ('b', 2))), "Mapping params in key")
+        self.assertEqual(SingleFlight.key('SELECT 1', None), ('SELECT 1', None), "No params in key")
+        self.assertIsNone(SingleFlight.key('SELECT ?', [[1]]), "Unhashable params have no key")
+
+    def test_do_concurrent(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', work)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for idex in range(3)]
+        for thread in followers:
+            thread.start()
+        while flight.stats()['shared'] < 3:
+            pass
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(calls, [1], "Executed once")
+        self.assertEqual(results, ['result'] * 4, "Result shared")
+        self.assertEqual(flight.stats(), {'executed': 1, 'shared': 3}, "Got stats")
+
+        # Without staleness, a later call executes again.
+        release.set()
+        flight.do('key', work)
+        self.assertEqual(len(calls), 2, "Completed results not reused")
+
+    def test_do_staleness(self):
+        flight = SingleFlight(max_staleness=60)
+        calls = []
+        flight.do('key', lambda: calls.append(1))
+        flight.do('key', lambda: calls.append(1))
+        flight.do('other', lambda: calls.append(1))
+        self.assertEqual(len(calls), 2, "Fresh result reused")
+        self.assertEqual(flight.stats(), {'executed': 2, 'shared': 1}, "Got stats")
+
+    def test_do_error(self):
+        flight = SingleFlight(max_staleness=60)
+
+        def fail():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError, msg="Error raised"):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok', "Errors not kept")
+
+    def test_cursor(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INT, value TEXT)")
+        conn.executemany("INSERT INTO foo VALUES (?, ?)", [(idex, str(idex)) for idex in range(5)])
+        conn.commit()
+        adbi_conn = adbi.connect(conn)
+        adbi_conn.single_flight = SingleFlight(max_staleness=60)
+
+        first = adbi_conn.cursor()
+        first.execute("SELECT id, value FROM foo WHERE id >= %s ORDER BY id", (1,))
+        second = adbi_conn.cursor()
+        second.execute("SELECT id, value FROM foo WHERE id >= %s ORDER BY id", (1,))
+        self.assertEqual(adbi_conn.single_flight.stats(), {'executed': 1, 'shared': 1}, "Read shared")
+        self.assertEqual([column[0] for column in second.description], ['id', 'value'], "Got description")
+        self.assertEqual(second.fetchone(), (1, '1'), "Got first row")
+        self.assertEqual(second.fetchmany(2), [(2, '2'), (3, '3')], "Got next rows")
+        self.assertEqual(second.fetchall(), [(4, '4')], "Got remaining rows")
+        self.assertIsNone(second.fetchone(), "No more rows")
+        self.assertEqual(len(first.fetchall()), 4, "Cursors fetch independently")
+
+        # Writes and reads inside a transaction are not coalesced.
+        first.execute("UPDATE foo SET value = %s WHERE id = %s", ('x', 1))
+        second.execute("SELECT id, value FROM foo WHERE id >= %s ORDER BY id", (1,))
+        self.assertEqual(second.fetchone(), (1, 'x'), "Transaction reads see own writes")
+        self.assertEqual(adbi_conn.single_flight.stats(), {'executed': 1, 'shared': 1}, "Not coalesced")
+        first.close()
+        second.close()
+        adbi_conn.close()
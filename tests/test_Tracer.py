@@ -0,0 +1,86 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import sqlite3
+import adbi
+from adbi import ADBICursor, InMemoryTracer, Tracer, TraceEvent
+
+
+class TestTracer(TestCase):
+
+    def build_adbi(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE foo (id INT)")
+        adbi_conn = adbi.connect(conn)
+        adbi_conn.tracer = InMemoryTracer()
+        return adbi_conn
+
+    def test_trace_event(self):
+        event = TraceEvent('execute', 'SELECT * FROM foo WHERE id = 1', 'SELECT * FROM foo WHERE id = 1', 'qmark')
+        self.assertEqual(event.fingerprint, adbi.fingerprint('SELECT * FROM foo WHERE id = 2'), "Got fingerprint")
+        self.assertIsNone(TraceEvent('commit').fingerprint, "No fingerprint without an operation")
+
+    def test_cursor_operations(self):
+        adbi_conn = self.build_adbi()
+        curs = adbi_conn.cursor()
+        curs.executemany("INSERT INTO foo (id) VALUES (%s)", [(1,), (2,), (3,)])
+        curs.execute("SELECT id FROM foo WHERE id > %(id)s ORDER BY id", {'id': 0})
+        curs.fetchone()
+        curs.fetchmany(1)
+        curs.fetchall()
+        curs.executescript("DELETE FROM foo;")
+        adbi_conn.rollback()
+        adbi_conn.commit()
+
+        tracer = adbi_conn.tracer
+        self.assertEqual(tracer.names(), ['executemany', 'execute', 'fetchone', 'fetchmany', 'fetchall',
+            'executescript', 'rollback', 'commit'], "Every operation traced")
+        executemany, execute = tracer.events[:2]
+        self.assertEqual(executemany.rows, 3, "Got executemany row count")
+        self.assertEqual(execute.operation, "SELECT id FROM foo WHERE id > ? ORDER BY id", "Got translated SQL")
+        self.assertEqual(execute.paramstyle, 'qmark', "Got paramstyle")
+        self.assertEqual(execute.fingerprint, adbi.fingerprint("SELECT id FROM foo WHERE id > %(id)s ORDER BY id"),
+            "Fingerprint taken from the original operation")
+        self.assertIsNotNone(execute.start_time, "Got start time")
+        self.assertGreaterEqual(execute.duration, 0, "Got duration")
+        self.assertEqual([event.rows for event in tracer.events[2:5]], [1, 1, 1], "Got rows fetched")
+
+    def test_errors(self):
+        adbi_conn = self.build_adbi()
+        with self.assertRaises(sqlite3.OperationalError):
+            adbi_conn.cursor().execute("SELECT * FROM missing")
+        event = adbi_conn.tracer.events[0]
+        self.assertIsInstance(event.error, sqlite3.OperationalError, "Error recorded")
+
+    def test_update_schema(self):
+        adbi_conn = self.build_adbi()
+        adbi_conn.schema_dir = 'tests/sql'
+        adbi_conn.update_schema()
+        names = adbi_conn.tracer.names()
+        self.assertEqual(names[-1], 'update_schema', "update_schema traced")
+        self.assertIn('executescript', names, "Schema scripts traced")
+
+    def test_start_end(self):
+        adbi_conn = self.build_adbi()
+        tracer = Mock(spec=Tracer)
+        tracer.start.return_value = 'span'
+        adbi_conn.tracer = tracer
+        adbi_conn.commit()
+        event = tracer.start.call_args[0][0]
+        tracer.end.assert_called_once_with(event, 'span')
+        self.assertEqual(event.name, 'commit', "Got event name")
+
+    @patch('adbi.tracing.TraceEvent')
+    def test_no_tracer(self, mock_event):
+        conn = sqlite3.connect(':memory:')
+        adbi_conn = adbi.connect(conn)
+        curs = adbi_conn.cursor()
+        curs.execute("SELECT 1")
+        curs.fetchall()
+        adbi_conn.commit()
+        ADBICursor(conn.cursor(), 'qmark').execute("SELECT 1")
+        mock_event.assert_not_called()
+
+        tracer = InMemoryTracer()
+        tracer.events.append('event')
+        tracer.clear()
+        self.assertEqual(tracer.events, [], "Events cleared")